@@ -1,6 +1,27 @@
 from django import forms
 from django.contrib import admin
 
-from .models import AIAPI
+from .models import AIAPI, GeneratedImage, SmartJob, SmartMetric
 
 admin.site.register(AIAPI)
+admin.site.register(SmartJob)
+admin.site.register(GeneratedImage)
+
+
+@admin.register(SmartMetric)
+class SmartMetricAdmin(admin.ModelAdmin):
+    list_display = (
+        "created_at",
+        "kind",
+        "label",
+        "task",
+        "model",
+        "latency",
+        "retries",
+        "prompt_tokens",
+        "completion_tokens",
+        "outcome",
+    )
+    list_filter = ("kind", "outcome", "provider", "task")
+    search_fields = ("label", "model")
+    date_hierarchy = "created_at"
@@ -1,4 +1,15 @@
-from .audio import transcribe_audio, translate_audio
-from .image import generate_thumbnail
-from .text import (emojify_text, generate_title, spell_correct_text,
+from ._clients import deadline
+from ._language import build_language_profiles, detect_language
+from ._limits import CircuitOpenError
+from ._metrics import DatabaseCollector, MetricsCollector
+from ._providers import register_backend
+from .audio import (atranscribe_audio, atranslate_audio, transcribe_audio,
+                    translate_audio)
+from .image import (agenerate_thumbnail, agenerate_thumbnails,
+                    generate_thumbnail, generate_thumbnails, get_thumbnail_key)
+from .text import (aemojify_text, agenerate_title, aprocess_text_pipeline,
+                   aspell_correct_text, astream_text, astream_text_pipeline,
+                   asummarize_text, atranslate_text, emojify_text,
+                   generate_title, process_text_pipeline, process_texts,
+                   spell_correct_text, stream_text, stream_text_pipeline,
                    summarize_text, translate_text)
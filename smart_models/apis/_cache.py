@@ -0,0 +1,167 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Union
+
+from django.conf import settings
+from django.core.cache import caches
+
+from ._metrics import arecord_cache_lookup, record_cache_lookup
+
+DEFAULT_TIMEOUT = 60 * 60 * 24  # seconds
+DEFAULT_MAX_ENTRIES = 1024
+
+_MISSING = object()
+
+
+class _LocalLRUCache:
+    """
+    Size bounded, process local fallback used when no Django cache alias is configured
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, timeout: int = None) -> None:
+        expires_at = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class ResultCache:
+    """
+    Content addressed cache of provider results.
+    Entries are keyed on task, provider, model and a digest of the compiled prompt (which
+    embeds the input text), so the same text processed for the same task is only sent once.
+    """
+
+    def __init__(
+        self,
+        alias: str = None,
+        timeout: int = DEFAULT_TIMEOUT,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        key_prefix: str = "smart_models",
+    ):
+        # Django cache backends handle their own eviction (LocMemCache is LRU bounded by
+        # MAX_ENTRIES, DatabaseCache culls its dedicated table)
+        self.backend = caches[alias] if alias else _LocalLRUCache(max_entries)
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def make_key(self, task: str, provider: str, model: str, *parts: str) -> str:
+        digest = hashlib.sha256(
+            json.dumps(parts, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        return f"{self.key_prefix}:{provider}:{model}:{task}:{digest}"
+
+    def _unwrap(self, entry: Any) -> Any:
+        # Results are wrapped so that a cached None can be told apart from a miss
+        with self._lock:
+            if entry is _MISSING or not isinstance(entry, dict):
+                self.misses += 1
+                return _MISSING
+            self.hits += 1
+        return entry["result"]
+
+    def _parse_key(self, key: str) -> tuple[str, str, str]:
+        # Model names may contain ":" themselves (e.g. fine-tuned models)
+        parts = key[len(self.key_prefix) + 1 :].split(":")
+        return parts[0], ":".join(parts[1:-2]), parts[-2]
+
+    def get(self, key: str) -> Any:
+        result = self._unwrap(self.backend.get(key, _MISSING))
+        record_cache_lookup(*self._parse_key(key), hit=not is_cache_miss(result))
+        return result
+
+    def peek(self, key: str) -> Any:
+        # Reads without counting a hit or miss, e.g. while waiting for another process
+        entry = self.backend.get(key, _MISSING)
+        return entry["result"] if isinstance(entry, dict) else _MISSING
+
+    def set(self, key: str, result: Any) -> None:
+        self.backend.set(key, {"result": result}, self.timeout)
+
+    async def aget(self, key: str) -> Any:
+        if isinstance(self.backend, _LocalLRUCache):
+            result = self._unwrap(self.backend.get(key, _MISSING))
+        else:
+            result = self._unwrap(await self.backend.aget(key, _MISSING))
+        await arecord_cache_lookup(*self._parse_key(key), hit=not is_cache_miss(result))
+        return result
+
+    async def apeek(self, key: str) -> Any:
+        if isinstance(self.backend, _LocalLRUCache):
+            return self.peek(key)
+        entry = await self.backend.aget(key, _MISSING)
+        return entry["result"] if isinstance(entry, dict) else _MISSING
+
+    async def aset(self, key: str, result: Any) -> None:
+        if isinstance(self.backend, _LocalLRUCache):
+            return self.set(key, result)
+        await self.backend.aset(key, {"result": result}, self.timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def clear(self) -> None:
+        self.backend.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> Union[ResultCache, None]:
+    global _result_cache
+    cache_settings = getattr(settings, "AI_API_SETTINGS", {}).get("result_cache", {})
+    if not cache_settings.get("enabled", True):
+        return None
+
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache(
+                    alias=cache_settings.get("alias"),
+                    timeout=cache_settings.get("timeout", DEFAULT_TIMEOUT),
+                    max_entries=cache_settings.get("max_entries", DEFAULT_MAX_ENTRIES),
+                )
+    return _result_cache
+
+
+def cache_miss() -> Any:
+    # Returned by lookups of single_flight() while no result was published
+    return _MISSING
+
+
+def is_cache_miss(value: Any) -> bool:
+    return value is _MISSING
@@ -0,0 +1,262 @@
+import asyncio
+import itertools
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Union
+
+import aiohttp
+import grpc
+import openai
+import requests
+from django.conf import settings
+from openai import api_requestor
+from stability_sdk import client
+from stability_sdk.interfaces.gooseai.generation import \
+    generation_pb2_grpc as generation_grpc
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 5.0  # seconds
+DEFAULT_READ_TIMEOUT = 120.0  # seconds
+
+_deadline = ContextVar("smart_models_deadline", default=None)
+_openai_task = ContextVar("smart_models_openai_task", default=None)
+
+
+def _get_openai_settings() -> dict:
+    return getattr(settings, "AI_API_SETTINGS", {}).get("openai", {})
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """
+    Bounds the total time of all provider calls made inside the block, nested deadlines
+    can only shorten the outer one
+    """
+    current_deadline = _deadline.get()
+    new_deadline = time.monotonic() + seconds
+    if current_deadline is not None:
+        new_deadline = min(new_deadline, current_deadline)
+    token = _deadline.set(new_deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def openai_task(task: str) -> Iterator[None]:
+    token = _openai_task.set(task)
+    try:
+        yield
+    finally:
+        _openai_task.reset(token)
+
+
+def get_remaining_deadline() -> Union[float, None]:
+    current_deadline = _deadline.get()
+    if current_deadline is None:
+        return None
+    return current_deadline - time.monotonic()
+
+
+def get_openai_timeout(task: str = None) -> tuple[float, float]:
+    """
+    (connect, read) timeout of a call, from AI_API_SETTINGS["openai"] "connect_timeout",
+    "read_timeout" and per task "task_timeouts", capped by the remaining deadline
+    """
+    openai_settings = _get_openai_settings()
+    task = task or _openai_task.get()
+    connect_timeout = openai_settings.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT)
+    read_timeout = openai_settings.get("task_timeouts", {}).get(
+        task, openai_settings.get("read_timeout", DEFAULT_READ_TIMEOUT)
+    )
+
+    remaining = get_remaining_deadline()
+    if remaining is not None:
+        if remaining <= 0:
+            raise openai.error.Timeout(f"Deadline exceeded before calling {task}")
+        connect_timeout = min(connect_timeout, remaining)
+        read_timeout = min(read_timeout, remaining)
+
+    return connect_timeout, read_timeout
+
+
+class _OpenAISession(requests.Session):
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        # openai falls back to a fixed 600s timeout for calls without request_timeout
+        # (e.g. Audio.transcribe), apply the configured timeouts instead
+        if kwargs.get("timeout") in (None, api_requestor.TIMEOUT_SECS):
+            kwargs["timeout"] = get_openai_timeout()
+        return super().request(method, url, **kwargs)
+
+    def close(self) -> None:
+        # openai recycles its per thread sessions every few minutes, the pool is shared
+        # between threads and stays open for the lifetime of the process
+        pass
+
+
+_openai_session = None
+_openai_session_lock = threading.Lock()
+_openai_aiosessions = weakref.WeakKeyDictionary()
+
+
+def get_openai_session() -> requests.Session:
+    """
+    Process wide keep-alive session shared by all threads, sized with
+    AI_API_SETTINGS["openai"]["pool_size"]
+    """
+    global _openai_session
+    if _openai_session is None:
+        with _openai_session_lock:
+            if _openai_session is None:
+                pool_size = _get_openai_settings().get("pool_size", DEFAULT_POOL_SIZE)
+                session = _OpenAISession()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=pool_size, pool_maxsize=pool_size
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _openai_session = session
+    return _openai_session
+
+
+def get_openai_aiosession() -> aiohttp.ClientSession:
+    # aiohttp sessions are bound to an event loop, keep one pool per loop
+    loop = asyncio.get_running_loop()
+    session = _openai_aiosessions.get(loop)
+    if session is None or session.closed:
+        pool_size = _get_openai_settings().get("pool_size", DEFAULT_POOL_SIZE)
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=pool_size))
+        _openai_aiosessions[loop] = session
+    return session
+
+
+async def arun_openai_call(coroutine: Any, task: str = None) -> Any:
+    """
+    Runs an openai coroutine on the pooled aiohttp session, bounded by the task timeout
+    """
+    openai.aiosession.set(get_openai_aiosession())
+    connect_timeout, read_timeout = get_openai_timeout(task)
+    return await asyncio.wait_for(coroutine, timeout=connect_timeout + read_timeout)
+
+
+def configure_openai() -> None:
+    openai.api_key = settings.AI_API_SETTINGS["openai"]["key"]
+    if "api_base" in settings.AI_API_SETTINGS["openai"]:
+        # e.g. a proxy or the stand-in server of smart_models.benchmarks
+        openai.api_base = settings.AI_API_SETTINGS["openai"]["api_base"]
+    openai.requestssession = get_openai_session
+
+
+DEFAULT_STABILITY_AI_HOST = "grpc.stability.ai:443"
+DEFAULT_STABILITY_AI_TIMEOUT = 120.0  # seconds
+STABILITY_AI_CHANNEL_OPTIONS = [
+    ("grpc.max_send_message_length", 10 * 1024 * 1024),
+    ("grpc.max_receive_message_length", 10 * 1024 * 1024),
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+]
+
+# (engine, host) -> [clients], used round robin
+_stability_clients = {}
+_stability_clients_counter = itertools.count()
+_stability_clients_lock = threading.Lock()
+
+
+def _get_stability_ai_settings() -> dict:
+    return getattr(settings, "AI_API_SETTINGS", {}).get("stability_ai", {})
+
+
+def get_stability_ai_timeout() -> float:
+    """
+    Timeout of a generation, AI_API_SETTINGS["stability_ai"]["timeout"] capped by the
+    remaining deadline
+    """
+    timeout = _get_stability_ai_settings().get("timeout", DEFAULT_STABILITY_AI_TIMEOUT)
+    remaining = get_remaining_deadline()
+    if remaining is not None:
+        # An exceeded deadline fails the call at once with DEADLINE_EXCEEDED
+        timeout = min(timeout, max(remaining, 0))
+    return timeout
+
+
+class _GenerationStub:
+    # The SDK calls Generate without a timeout, a hung upstream would block forever
+
+    def __init__(self, channel: grpc.Channel) -> None:
+        self._stub = generation_grpc.GenerationServiceStub(channel)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stub, name)
+
+    def Generate(self, request: Any, **kwargs) -> Any:
+        kwargs.setdefault("timeout", get_stability_ai_timeout())
+        return self._stub.Generate(request, **kwargs)
+
+
+def _create_stability_client(engine: str, host: str) -> client.StabilityInference:
+    stability_ai_settings = _get_stability_ai_settings()
+    key = stability_ai_settings["key"]
+    # StabilityInference.__init__ opens a channel without keepalive which could not be
+    # closed once replaced, set up the client around a channel that keeps idle
+    # connections alive between generations instead
+    stability_client = client.StabilityInference.__new__(client.StabilityInference)
+    stability_client.verbose = stability_ai_settings.get("verbose", False)
+    stability_client.engine = engine
+    stability_client.upscale_engine = "esrgan-v1-x2plus"
+    stability_client.grpc_args = {"wait_for_ready": True}
+    if host.endswith("443"):
+        channel = grpc.secure_channel(
+            host,
+            grpc.composite_channel_credentials(
+                grpc.ssl_channel_credentials(),
+                grpc.access_token_call_credentials(key),
+            ),
+            options=STABILITY_AI_CHANNEL_OPTIONS,
+        )
+    else:
+        channel = grpc.insecure_channel(host, options=STABILITY_AI_CHANNEL_OPTIONS)
+    stability_client.stub = _GenerationStub(channel)
+    return stability_client
+
+
+def get_stability_client(engine: str) -> client.StabilityInference:
+    """
+    Returns a pooled client for the engine. AI_API_SETTINGS["stability_ai"]["pool_size"]
+    channels are opened per (engine, host) and handed out round robin.
+    """
+    stability_ai_settings = _get_stability_ai_settings()
+    host = stability_ai_settings.get("host", DEFAULT_STABILITY_AI_HOST)
+    clients = _stability_clients.get((engine, host))
+    if clients is None:
+        with _stability_clients_lock:
+            clients = _stability_clients.get((engine, host))
+            if clients is None:
+                clients = [
+                    _create_stability_client(engine, host)
+                    for _ in range(stability_ai_settings.get("pool_size", 1))
+                ]
+                _stability_clients[(engine, host)] = clients
+    return clients[next(_stability_clients_counter) % len(clients)]
+
+
+def _reset_after_fork() -> None:
+    # Sockets and gRPC channels of the parent process must not be shared with forked workers
+    global _openai_session, _openai_session_lock, _openai_aiosessions
+    global _stability_clients, _stability_clients_lock
+    _openai_session = None
+    _openai_session_lock = threading.Lock()
+    # aiohttp sessions are bound to the loops and sockets of the parent
+    _openai_aiosessions = weakref.WeakKeyDictionary()
+    _stability_clients = {}
+    _stability_clients_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,22 +1,150 @@
+import json
+import os
+import threading
 from typing import Any
 
+from asgiref.sync import sync_to_async
 from django.apps import apps
-from django.db.models import Q
+from django.conf import settings
+from django.core.cache import caches
 
 from ..fields import APIProviders
 
+CONFIGS_VERSION_CACHE_KEY = "smart_models:aiapi_configs_version"
+API_CONFIGS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api_configurations"
+)
+
+# (name, provider, configurations) of the bundled JSON files, parsed on first use
+_file_configs = None
+_file_configs_lock = threading.Lock()
+
+# (provider, model type, task) -> AIAPI instance, loaded on first use
+_configs_registry = None
+_configs_registry_version = None
+_configs_registry_lock = threading.Lock()
+
+
+def _get_configs_settings() -> dict:
+    return getattr(settings, "AI_API_SETTINGS", {}).get("configs_cache", {})
+
+
+def get_file_configs() -> list[tuple[str, str, dict]]:
+    """
+    (name, provider, configurations) of every configuration of the providers listed in
+    api_configurations/configs.json, parsed once per process
+    """
+    global _file_configs
+    if _file_configs is None:
+        with _file_configs_lock:
+            if _file_configs is None:
+                with open(
+                    os.path.join(API_CONFIGS_DIR, "configs.json"), encoding="utf-8"
+                ) as f:
+                    providers = json.load(f)
+
+                file_configs = []
+                for api_provider, api_name in APIProviders.choices:
+                    if providers.get(api_provider, {}) == {}:
+                        continue
+                    with open(
+                        os.path.join(
+                            API_CONFIGS_DIR, providers[api_provider]["configs"]
+                        ),
+                        encoding="utf-8",
+                    ) as f:
+                        api_configs = json.load(f)
+                    for key, val in api_configs.items():
+                        file_configs.append((f"{key}-{api_name}", api_provider, val))
+                _file_configs = file_configs
+    return _file_configs
+
+
+def _get_shared_cache() -> Any:
+    # Optional cache shared across workers, used only to broadcast a version key so that
+    # every process reloads its registry after AIAPI changes
+    alias = _get_configs_settings().get("alias")
+    return caches[alias] if alias else None
+
+
+def _get_shared_version() -> Any:
+    shared_cache = _get_shared_cache()
+    if shared_cache is None:
+        return None
+    return shared_cache.get(CONFIGS_VERSION_CACHE_KEY, 0)
+
+
+def _load_configs_registry() -> dict:
+    aiapi = apps.get_model("smart_models.AIAPI")
+    aiapi_objs = list(aiapi.objects.order_by("pk"))
+    if _get_configs_settings().get("file_fallback", True):
+        # Tasks without an AIAPI row are served by unsaved instances of the bundled
+        # configurations, so that a database without init_smart_models works as well
+        aiapi_objs += [
+            aiapi(name=name, provider=provider, configurations=configurations)
+            for name, provider, configurations in get_file_configs()
+        ]
+
+    registry = {}
+    for aiapi_obj in aiapi_objs:
+        configurations = aiapi_obj.configurations
+        if not isinstance(configurations, dict):
+            continue
+        for task in configurations.get("tasks", {}):
+            registry.setdefault(
+                (aiapi_obj.provider, configurations.get("type"), task), aiapi_obj
+            )
+
+    return registry
+
+
+def _get_configs_registry() -> dict:
+    global _configs_registry, _configs_registry_version
+    shared_version = _get_shared_version()
+    registry = _configs_registry
+    if registry is not None and shared_version == _configs_registry_version:
+        return registry
+
+    with _configs_registry_lock:
+        if _configs_registry is None or shared_version != _configs_registry_version:
+            _configs_registry = _load_configs_registry()
+            _configs_registry_version = shared_version
+        return _configs_registry
+
+
+def invalidate_task_configs(**kwargs) -> None:
+    """
+    Drops the process local registry (and bumps the shared version key when configured).
+    Connected to post_save/post_delete of AIAPI, call it manually after queryset updates.
+    """
+    global _configs_registry
+    with _configs_registry_lock:
+        _configs_registry = None
+
+    shared_cache = _get_shared_cache()
+    if shared_cache is not None:
+        try:
+            shared_cache.incr(CONFIGS_VERSION_CACHE_KEY)
+        except ValueError:
+            shared_cache.set(CONFIGS_VERSION_CACHE_KEY, 1, None)
+
 
 def get_task_configs(
     task: str, model_type: str, api_provider: APIProviders = APIProviders.OPENAI
 ) -> Any:
     # TODO: Add exceptions and better way to handle circular imports
     aiapi = apps.get_model("smart_models.AIAPI")
-    configs = None
+    configs = _get_configs_registry().get((api_provider, model_type, task))
 
-    # TODO: If no instance is created, read from json file
-    configs = aiapi.objects.get(
-        Q(configurations__tasks__has_key=task) & Q(configurations__type=model_type),
-        provider=api_provider,
-    )
+    if configs is None:
+        raise aiapi.DoesNotExist(
+            f"AIAPI configuration for task '{task}' of type '{model_type}' and provider {api_provider} does not exist"
+        )
 
     return configs
+
+
+async def aget_task_configs(
+    task: str, model_type: str, api_provider: APIProviders = APIProviders.OPENAI
+) -> Any:
+    return await sync_to_async(get_task_configs)(task, model_type, api_provider)
@@ -0,0 +1,310 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Union
+
+from django.conf import settings
+
+from ._cache import _LocalLRUCache, cache_miss, is_cache_miss
+
+DEFAULT_LANGUAGE = "english"
+PROFILE_SIZE = 300
+# Characters of a text looked at, enough to tell languages apart
+SAMPLE_LENGTH = 2048
+MIN_LETTERS = 20
+# Out of place distance of the best profile, divided by its maximum, above which a text
+# is in none of the profiled languages
+DEFAULT_MAX_DISTANCE = 0.65
+# Normalized distance between the best two profiles below which a text is ambiguous,
+# and below which it is not trusted to skip a translation
+DEFAULT_MIN_MARGIN = 0.05
+DEFAULT_TRANSLATION_MIN_MARGIN = 0.07
+# Share of the letters of a text allowed from alphabets of other profiled languages, a
+# single one is always, e.g. "é" of "Café" in a German text
+MAX_FOREIGN_LETTERS = 0.01
+PROFILES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "api_configurations",
+    "language_profiles.json",
+)
+
+# Scripts used by a single language are identified without n-grams
+_SCRIPT_LANGUAGES = {
+    "HANGUL": "korean",
+    "HIRAGANA": "japanese",
+    "KATAKANA": "japanese",
+    "CJK": "chinese",
+    "ARABIC": "arabic",
+    "DEVANAGARI": "hindi",
+    "GREEK": "greek",
+    "HEBREW": "hebrew",
+    "THAI": "thai",
+}
+_LANGUAGE_CODES = {
+    "en": "english",
+    "fr": "french",
+    "de": "german",
+    "es": "spanish",
+    "it": "italian",
+    "pt": "portuguese",
+    "nl": "dutch",
+    "sv": "swedish",
+    "pl": "polish",
+    "tr": "turkish",
+    "ru": "russian",
+    "ko": "korean",
+    "ja": "japanese",
+    "zh": "chinese",
+    "ar": "arabic",
+    "hi": "hindi",
+    "el": "greek",
+    "he": "hebrew",
+    "th": "thai",
+}
+# Languages by their name in the language, folded by _fold_language()
+_LANGUAGE_NAMES = {
+    "français": "french",
+    "deutsch": "german",
+    "español": "spanish",
+    "castellano": "spanish",
+    "italiano": "italian",
+    "português": "portuguese",
+    "nederlands": "dutch",
+    "svenska": "swedish",
+    "polski": "polish",
+    "türkçe": "turkish",
+    "русский": "russian",
+    "한국어": "korean",
+    "日本語": "japanese",
+    "中文": "chinese",
+    "汉语": "chinese",
+    "漢語": "chinese",
+    "العربية": "arabic",
+    "हिन्दी": "hindi",
+    "हिंदी": "hindi",
+    "ελληνικά": "greek",
+    "עברית": "hebrew",
+    "ไทย": "thai",
+}
+_WORD_PATTERN = re.compile(r"[^\W\d_]+")
+
+
+def _get_language_settings() -> dict:
+    return getattr(settings, "AI_API_SETTINGS", {}).get("language_detection", {})
+
+
+def _fold_language(language: str) -> str:
+    # Case and accents are left out, "Français" and "francais" are the same name
+    return "".join(
+        char
+        for char in unicodedata.normalize("NFKD", language.strip().lower())
+        if unicodedata.category(char) != "Mn"
+    )
+
+
+_FOLDED_LANGUAGE_NAMES = {
+    _fold_language(name): language for name, language in _LANGUAGE_NAMES.items()
+}
+
+
+def normalize_language(language: str) -> str:
+    """
+    English name of a language given by its name, native name or code, e.g.
+    "Français", "fr" or "fr-CA" are "french"
+    """
+    folded = _fold_language(language)
+    code = folded.replace("_", "-").split("-")[0]
+    return (
+        _LANGUAGE_CODES.get(folded)
+        or _LANGUAGE_CODES.get(code)
+        or _FOLDED_LANGUAGE_NAMES.get(folded, folded)
+    )
+
+
+def _get_ngrams(text: str) -> Counter:
+    ngrams = Counter()
+    for word in _WORD_PATTERN.findall(text.lower()):
+        word = f"_{word}_"
+        for n in (1, 2, 3):
+            for i in range(len(word) - n + 1):
+                ngrams[word[i : i + n]] += 1
+    del ngrams["_"]
+    return ngrams
+
+
+def _rank(ngrams: Counter, size: int = PROFILE_SIZE) -> list[str]:
+    # Ties are broken alphabetically, so that profiles are reproducible
+    return [
+        ngram
+        for ngram, _ in sorted(ngrams.items(), key=lambda item: (-item[1], item[0]))[
+            :size
+        ]
+    ]
+
+
+def build_language_profiles(samples: dict[str, str], size: int = PROFILE_SIZE) -> dict:
+    """
+    Ranked character 1-3 grams and the alphabet of a sample text per language, in the
+    format of AI_API_SETTINGS["language_detection"]["profiles"]
+    """
+    return {
+        "size": size,
+        "profiles": {
+            language: _rank(_get_ngrams(text), size)
+            for language, text in sorted(samples.items())
+        },
+        "alphabets": {
+            language: "".join(sorted({char for char in text.lower() if char.isalpha()}))
+            for language, text in sorted(samples.items())
+        },
+    }
+
+
+_profiles = None
+_profiles_lock = threading.Lock()
+_detected_languages = _LocalLRUCache(4096)
+
+
+def _get_profiles() -> tuple[int, dict[str, dict[str, int]], dict[str, set[str]]]:
+    global _profiles
+    if _profiles is None:
+        with _profiles_lock:
+            if _profiles is None:
+                path = _get_language_settings().get("profiles", PROFILES_PATH)
+                with open(path, encoding="utf-8") as f:
+                    table = json.load(f)
+                # Alphabets are optional, profiles built before they were added lack them
+                alphabets = {
+                    language: set(alphabet)
+                    for language, alphabet in table.get("alphabets", {}).items()
+                }
+                # Letters of any profiled language
+                alphabets["*"] = set().union(*alphabets.values())
+                _profiles = (
+                    table["size"],
+                    {
+                        language: {ngram: rank for rank, ngram in enumerate(ngrams)}
+                        for language, ngrams in table["profiles"].items()
+                    },
+                    alphabets,
+                )
+    return _profiles
+
+
+def _get_script_language(text: str) -> Union[str, None]:
+    scripts = Counter()
+    for char in text:
+        if char.isalpha():
+            try:
+                scripts[unicodedata.name(char).split(" ")[0]] += 1
+            except ValueError:
+                continue
+    if len(scripts) == 0:
+        return None
+    # Japanese mixes kana with kanji
+    if scripts["HIRAGANA"] + scripts["KATAKANA"] != 0:
+        return "japanese"
+    return _SCRIPT_LANGUAGES.get(scripts.most_common(1)[0][0])
+
+
+def _detect_language(sample: str) -> tuple[Union[str, None], float]:
+    # Returns the language and the margin to the next closest one, normalized like
+    # the distances
+    letters = [char for char in sample.lower() if char.isalpha()]
+    if len(letters) < MIN_LETTERS:
+        return None, 0.0
+    script_language = _get_script_language(sample)
+    if script_language is not None:
+        return script_language, 1.0
+
+    # Out of place distance of the ranked n-grams (Cavnar & Trenkle), divided by its
+    # maximum so that thresholds do not depend on the length of the text
+    size, profiles, alphabets = _get_profiles()
+    ranks = _rank(_get_ngrams(sample), size)
+    distances = sorted(
+        (
+            sum(
+                abs(profile[ngram] - rank) if ngram in profile else size
+                for rank, ngram in enumerate(ranks)
+            )
+            / (len(ranks) * size),
+            language,
+        )
+        for language, profile in profiles.items()
+    )
+    if len(distances) == 0:
+        return None, 0.0
+
+    language_settings = _get_language_settings()
+    distance, language = distances[0]
+    margin = distances[1][0] - distance if len(distances) > 1 else 1.0
+    if distance > language_settings.get("max_distance", DEFAULT_MAX_DISTANCE):
+        # Closest to a profiled language, but written in another one
+        return None, 0.0
+    if margin < language_settings.get("min_margin", DEFAULT_MIN_MARGIN):
+        # Too close to tell, e.g. a list of names or a related language
+        return None, 0.0
+    alphabet = alphabets.get(language)
+    if alphabet is not None:
+        foreign_letters = [char for char in letters if char not in alphabet]
+        if any(char not in alphabets["*"] for char in foreign_letters) or len(
+            foreign_letters
+        ) > max(1, len(letters) * MAX_FOREIGN_LETTERS):
+            # Letters of no profiled language, e.g. Ukrainian "і" or Romanian "ș", are
+            # of a related language
+            return None, 0.0
+    return language, margin
+
+
+def _detect_cached(text: str) -> tuple[Union[str, None], float]:
+    sample = text[:SAMPLE_LENGTH]
+    key = hashlib.blake2b(sample.encode("utf-8"), digest_size=16).hexdigest()
+    detected = _detected_languages.get(key, cache_miss())
+    if is_cache_miss(detected):
+        detected = _detect_language(sample)
+        _detected_languages.set(key, detected)
+    return detected
+
+
+def detect_language(text: str) -> Union[str, None]:
+    """
+    Language of a text, e.g. "english", or None when it is too short, ambiguous or
+    in none of the profiled languages. Results are cached per digest of the text.
+    """
+    return _detect_cached(text)[0]
+
+
+def get_original_language(text: str) -> str:
+    """
+    Language the prompts name as the language of the text
+    """
+    language_settings = _get_language_settings()
+    language = None
+    if language_settings.get("enabled", True):
+        language = detect_language(text)
+    return language or language_settings.get("default", DEFAULT_LANGUAGE)
+
+
+def is_target_language(text: str, target_language: str) -> bool:
+    """
+    Whether a text is already written in the target language of a translation, the
+    target given by its name, native name or code
+    """
+    language_settings = _get_language_settings()
+    if not language_settings.get("enabled", True) or target_language is None:
+        return False
+    language, margin = _detect_cached(text)
+    # Skipping a translation by mistake is worse than a provider call, so only a
+    # confident detection counts
+    return (
+        language is not None
+        and language == normalize_language(target_language)
+        and margin
+        >= language_settings.get(
+            "translation_min_margin", DEFAULT_TRANSLATION_MIN_MARGIN
+        )
+    )
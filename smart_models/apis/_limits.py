@@ -0,0 +1,444 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Union
+
+import grpc
+import openai
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from ..fields import APIProviders
+from ._clients import get_remaining_deadline
+from ._metrics import arecord_call, record_call
+from ._tokens import count_tokens
+
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BACKOFF_BASE = 1.0  # seconds
+DEFAULT_BACKOFF_MAX = 60.0  # seconds
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RECOVERY_TIMEOUT = 30.0  # seconds
+HALF_OPEN_TIMEOUT = 3600  # seconds a half open circuit waits for a probe call
+WINDOW = 60  # seconds, budgets are per minute
+
+RETRYABLE_GRPC_CODES = (
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+)
+
+PROVIDER_SETTINGS_KEYS = {
+    APIProviders.OPENAI: "openai",
+    APIProviders.STABILITYAI: "stability_ai",
+}
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def _get_rate_limiter_settings() -> dict:
+    return getattr(settings, "AI_API_SETTINGS", {}).get("rate_limiter", {})
+
+
+_local_state = None
+_local_state_lock = threading.Lock()
+
+
+def _get_state_cache() -> Any:
+    # Counters live in a cache shared by all workers when an alias is configured, with
+    # a process local cache otherwise
+    global _local_state
+    alias = _get_rate_limiter_settings().get("alias")
+    if alias:
+        return caches[alias]
+    if _local_state is None:
+        with _local_state_lock:
+            if _local_state is None:
+                _local_state = LocMemCache("smart_models_rate_limiter", {})
+    return _local_state
+
+
+def estimate_tokens(*texts: str) -> int:
+    # Corrected from response.usage once the call returns
+    return sum(count_tokens(text) for text in texts) + 1
+
+
+def get_retry_after(error: Exception) -> Union[float, None]:
+    """
+    Seconds the provider asked to wait before retrying, from the Retry-After header or
+    gRPC trailing metadata
+    """
+    retry_after = None
+    headers = getattr(error, "headers", None)
+    if headers:
+        retry_after = headers.get("retry-after") or headers.get("Retry-After")
+    elif isinstance(error, grpc.Call):
+        for key, value in error.trailing_metadata() or ():
+            if key.lower() == "retry-after":
+                retry_after = value
+    if retry_after is None:
+        return None
+
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        try:
+            return max(
+                parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0
+            )
+        except (TypeError, ValueError):
+            return None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(
+        error,
+        (
+            openai.error.RateLimitError,
+            openai.error.ServiceUnavailableError,
+            openai.error.APIConnectionError,
+            openai.error.TryAgain,
+            openai.error.Timeout,
+        ),
+    ):
+        return True
+    if isinstance(error, openai.error.APIError):
+        return (error.http_status or 0) >= 500
+    if isinstance(error, grpc.RpcError) and isinstance(error, grpc.Call):
+        return error.code() in RETRYABLE_GRPC_CODES
+    return False
+
+
+class RateLimiter:
+    """
+    Requests and tokens per minute budget plus circuit breaker of a (provider, model).
+    The Django cache API has no compare-and-set, so budgets are per minute windows
+    counted with atomic incr(), which every cache backend shared by workers provides.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        model: str,
+        rpm: int = None,
+        tpm: int = None,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        recovery_timeout: float = DEFAULT_RECOVERY_TIMEOUT,
+    ) -> None:
+        self.provider = provider
+        self.model = model
+        self.rpm = rpm
+        self.tpm = tpm
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.key_prefix = f"smart_models:rate_limiter:{provider}:{model}"
+
+    def _incr(self, key: str, delta: int) -> int:
+        state = _get_state_cache()
+        state.add(key, 0, WINDOW * 2)
+        try:
+            return state.incr(key, delta)
+        except ValueError:
+            # Expired between add() and incr()
+            state.add(key, delta, WINDOW * 2)
+            return delta
+
+    def reserve(self, tokens: int = 0) -> float:
+        """
+        Takes one request and `tokens` tokens from the budget of the current window.
+        Returns 0 on success, otherwise the seconds left until the next window.
+        """
+        now = time.time()
+        window = int(now // WINDOW)
+        wait = WINDOW - now % WINDOW
+        taken = []
+        for kind, limit, amount in (("rpm", self.rpm, 1), ("tpm", self.tpm, tokens)):
+            if limit is None or amount <= 0:
+                continue
+            key = f"{self.key_prefix}:{kind}:{window}"
+            taken.append((key, amount))
+            # A single call larger than the whole budget is let through alone
+            used = self._incr(key, amount)
+            if used > limit and used != amount:
+                for key, amount in taken:
+                    self._incr(key, -amount)
+                return wait
+        return 0.0
+
+    def adjust(self, tokens: int) -> None:
+        # Corrects the estimated tokens of a call with the actual usage
+        if self.tpm is not None and tokens != 0:
+            self._incr(f"{self.key_prefix}:tpm:{int(time.time() // WINDOW)}", tokens)
+
+    def check_circuit(self) -> bool:
+        """
+        Raises CircuitOpenError while the circuit is open. After recovery_timeout it is
+        half open and lets a single probe call through, returns True for that call.
+        """
+        state = _get_state_cache()
+        open_until = state.get(f"{self.key_prefix}:open_until")
+        if open_until is None:
+            return False
+        if open_until > time.time():
+            raise CircuitOpenError(
+                f"Circuit of {self.provider} {self.model} is open for another {open_until - time.time():.1f}s"
+            )
+        # The probe expires with recovery_timeout, in case its worker died
+        if not state.add(f"{self.key_prefix}:probe", 1, self.recovery_timeout):
+            raise CircuitOpenError(
+                f"Circuit of {self.provider} {self.model} is half open, waiting for a probe call"
+            )
+        return True
+
+    def record_success(self) -> None:
+        # Closes the circuit
+        _get_state_cache().delete_many(
+            [
+                f"{self.key_prefix}:failures",
+                f"{self.key_prefix}:open_until",
+                f"{self.key_prefix}:probe",
+            ]
+        )
+
+    def _open_circuit(self, state: Any) -> None:
+        # open_until outlives recovery_timeout, the circuit is half open meanwhile
+        state.set(
+            f"{self.key_prefix}:open_until",
+            time.time() + self.recovery_timeout,
+            self.recovery_timeout + HALF_OPEN_TIMEOUT,
+        )
+        state.delete_many([f"{self.key_prefix}:failures", f"{self.key_prefix}:probe"])
+
+    def record_failure(self) -> None:
+        state = _get_state_cache()
+        open_until = state.get(f"{self.key_prefix}:open_until")
+        if open_until is not None:
+            # A single failure of a half open circuit opens it again, failures of calls
+            # started before it opened are ignored
+            if open_until <= time.time():
+                self._open_circuit(state)
+            return
+
+        # Failures expire after recovery_timeout
+        key = f"{self.key_prefix}:failures"
+        state.add(key, 0, self.recovery_timeout)
+        try:
+            failures = state.incr(key)
+        except ValueError:
+            failures = 1
+        if failures >= self.failure_threshold:
+            self._open_circuit(state)
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, model: str) -> RateLimiter:
+    """
+    Budgets are read from AI_API_SETTINGS[<provider>]["rate_limits"][<model>], e.g.
+    {"gpt-3.5-turbo": {"rpm": 3500, "tpm": 90000}}
+    """
+    rate_limiter = _rate_limiters.get((provider, model))
+    if rate_limiter is None:
+        with _rate_limiters_lock:
+            rate_limiter = _rate_limiters.get((provider, model))
+            if rate_limiter is None:
+                rate_limiter_settings = _get_rate_limiter_settings()
+                limits = (
+                    getattr(settings, "AI_API_SETTINGS", {})
+                    .get(PROVIDER_SETTINGS_KEYS.get(provider, provider), {})
+                    .get("rate_limits", {})
+                    .get(model, {})
+                )
+                rate_limiter = RateLimiter(
+                    provider,
+                    model,
+                    rpm=limits.get("rpm"),
+                    tpm=limits.get("tpm"),
+                    failure_threshold=rate_limiter_settings.get(
+                        "failure_threshold", DEFAULT_FAILURE_THRESHOLD
+                    ),
+                    recovery_timeout=rate_limiter_settings.get(
+                        "recovery_timeout", DEFAULT_RECOVERY_TIMEOUT
+                    ),
+                )
+                _rate_limiters[(provider, model)] = rate_limiter
+    return rate_limiter
+
+
+def _get_backoff(attempt: int, error: Exception = None) -> float:
+    # Full jitter, so that workers throttled together do not retry together
+    rate_limiter_settings = _get_rate_limiter_settings()
+    backoff = random.uniform(
+        0,
+        min(
+            rate_limiter_settings.get("backoff_max", DEFAULT_BACKOFF_MAX),
+            rate_limiter_settings.get("backoff_base", DEFAULT_BACKOFF_BASE)
+            * 2**attempt,
+        ),
+    )
+    retry_after = get_retry_after(error) if error is not None else None
+    if retry_after is not None:
+        backoff = retry_after + backoff / 2
+    return backoff
+
+
+def _check_wait(wait: float, error: Exception = None) -> None:
+    remaining = get_remaining_deadline()
+    if remaining is not None and wait >= remaining:
+        if error is not None:
+            raise error
+        raise openai.error.Timeout("Deadline exceeded while waiting for rate limit")
+
+
+def _get_outcome(error: Exception) -> str:
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(error, (openai.error.RateLimitError, openai.error.Timeout)):
+        return error.__class__.__name__.lower().replace("error", "")
+    return "error"
+
+
+def _get_used_tokens(response: Any) -> Union[int, None]:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+
+def call_with_limits(
+    provider: str, model: str, fn: Callable, tokens: int = 0, task: str = None
+) -> Any:
+    """
+    Calls fn within the rate limits of the (provider, model), retrying throttled and
+    transient errors with exponential backoff. Raises CircuitOpenError when the
+    provider keeps failing.
+    """
+    rate_limiter = get_rate_limiter(provider, model)
+    max_retries = _get_rate_limiter_settings().get("max_retries", DEFAULT_MAX_RETRIES)
+    attempt = 0
+    probing = False
+    start = time.perf_counter()
+    try:
+        while True:
+            if not probing:
+                probing = rate_limiter.check_circuit()
+            wait = rate_limiter.reserve(tokens)
+            if wait > 0:
+                wait += random.uniform(0, 1)
+                _check_wait(wait)
+                time.sleep(wait)
+                continue
+
+            try:
+                response = fn()
+            except Exception as e:
+                if not is_retryable(e):
+                    if probing:
+                        # The provider answered, the circuit can close
+                        rate_limiter.record_success()
+                    raise
+                rate_limiter.record_failure()
+                probing = False
+                if attempt >= max_retries:
+                    raise
+                backoff = _get_backoff(attempt, e)
+                _check_wait(backoff, e)
+                time.sleep(backoff)
+                attempt += 1
+                continue
+            break
+    except Exception as e:
+        record_call(
+            provider,
+            model,
+            task,
+            time.perf_counter() - start,
+            attempt,
+            outcome=_get_outcome(e),
+        )
+        raise
+
+    rate_limiter.record_success()
+    used_tokens = _get_used_tokens(response)
+    if used_tokens is not None:
+        rate_limiter.adjust(used_tokens - tokens)
+    record_call(
+        provider, model, task, time.perf_counter() - start, attempt, response=response
+    )
+    return response
+
+
+async def acall_with_limits(
+    provider: str, model: str, fn: Callable, tokens: int = 0, task: str = None
+) -> Any:
+    """
+    Async counterpart of call_with_limits(), fn returns a coroutine
+    """
+    rate_limiter = get_rate_limiter(provider, model)
+    max_retries = _get_rate_limiter_settings().get("max_retries", DEFAULT_MAX_RETRIES)
+    attempt = 0
+    probing = False
+    start = time.perf_counter()
+    try:
+        while True:
+            if not probing:
+                probing = await sync_to_async(rate_limiter.check_circuit)()
+            wait = await sync_to_async(rate_limiter.reserve)(tokens)
+            if wait > 0:
+                wait += random.uniform(0, 1)
+                _check_wait(wait)
+                await asyncio.sleep(wait)
+                continue
+
+            try:
+                response = await fn()
+            except Exception as e:
+                if not is_retryable(e):
+                    if probing:
+                        await sync_to_async(rate_limiter.record_success)()
+                    raise
+                await sync_to_async(rate_limiter.record_failure)()
+                probing = False
+                if attempt >= max_retries:
+                    raise
+                backoff = _get_backoff(attempt, e)
+                _check_wait(backoff, e)
+                await asyncio.sleep(backoff)
+                attempt += 1
+                continue
+            break
+    except Exception as e:
+        await arecord_call(
+            provider,
+            model,
+            task,
+            time.perf_counter() - start,
+            attempt,
+            outcome=_get_outcome(e),
+        )
+        raise
+
+    await sync_to_async(rate_limiter.record_success)()
+    used_tokens = _get_used_tokens(response)
+    if used_tokens is not None:
+        await sync_to_async(rate_limiter.adjust)(used_tokens - tokens)
+    await arecord_call(
+        provider, model, task, time.perf_counter() - start, attempt, response=response
+    )
+    return response
+
+
+def _reset_after_fork() -> None:
+    global _local_state, _local_state_lock, _rate_limiters_lock
+    _local_state = None
+    _local_state_lock = threading.Lock()
+    _rate_limiters_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,265 @@
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Iterator
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.dispatch import Signal
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Sent after every provider call (including its retries):
+# provider, model, task, field, latency, retries, prompt_tokens, completion_tokens, outcome
+provider_call_finished = Signal()
+# Sent after every lookup in the result cache: provider, model, task, field, hit
+result_cache_lookup = Signal()
+# Sent after smart fields were processed by save()/asave() (span="save") and after
+# every single field (span="field"): model, field, latency, outcome
+smart_span_finished = Signal()
+
+_smart_field = ContextVar("smart_models_field", default="")
+
+
+class MetricsCollector:
+    """
+    Receives the same events as the signals above. Subclass it to forward metrics to
+    Prometheus, StatsD, etc. and list it in AI_API_SETTINGS["metrics"]["collectors"].
+    """
+
+    def record_call(
+        self,
+        provider: str,
+        model: str,
+        task: str,
+        field: str,
+        latency: float,
+        retries: int,
+        prompt_tokens: int,
+        completion_tokens: int,
+        outcome: str,
+    ) -> None:
+        pass
+
+    def record_cache_lookup(
+        self, provider: str, model: str, task: str, field: str, hit: bool
+    ) -> None:
+        pass
+
+    def record_span(
+        self, span: str, model: str, field: str, latency: float, outcome: str
+    ) -> None:
+        pass
+
+
+class DatabaseCollector(MetricsCollector):
+    """
+    Stores every event in the SmartMetric table, summarized by
+    `python manage.py smart_models_report`
+    """
+
+    def _create(self, **kwargs) -> None:
+        apps.get_model("smart_models.SmartMetric").objects.create(**kwargs)
+
+    def record_call(
+        self,
+        provider: str,
+        model: str,
+        task: str,
+        field: str,
+        latency: float,
+        retries: int,
+        prompt_tokens: int,
+        completion_tokens: int,
+        outcome: str,
+    ) -> None:
+        self._create(
+            kind="call",
+            provider=provider,
+            model=model,
+            task=task,
+            label=field,
+            latency=latency,
+            retries=retries,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            outcome=outcome,
+        )
+
+    def record_cache_lookup(
+        self, provider: str, model: str, task: str, field: str, hit: bool
+    ) -> None:
+        self._create(
+            kind="cache",
+            provider=provider,
+            model=model,
+            task=task,
+            label=field,
+            outcome="hit" if hit else "miss",
+        )
+
+    def record_span(
+        self, span: str, model: str, field: str, latency: float, outcome: str
+    ) -> None:
+        self._create(
+            kind=span,
+            label=f"{model}.{field}" if field else model,
+            latency=latency,
+            outcome=outcome,
+        )
+
+
+_collectors = None
+_collectors_lock = threading.Lock()
+
+
+def get_collectors() -> list[MetricsCollector]:
+    global _collectors
+    if _collectors is None:
+        with _collectors_lock:
+            if _collectors is None:
+                _collectors = [
+                    import_string(collector)()
+                    for collector in getattr(settings, "AI_API_SETTINGS", {})
+                    .get("metrics", {})
+                    .get("collectors", [])
+                ]
+    return _collectors
+
+
+def _has_listeners(signal: Signal) -> bool:
+    return signal.has_listeners() or len(get_collectors()) != 0
+
+
+def _emit(signal: Signal, method: str, sender: Any, **event) -> None:
+    if not _has_listeners(signal):
+        return
+    signal.send(sender=sender, **event)
+    for collector in get_collectors():
+        # Metrics must never fail the save() they measure
+        try:
+            getattr(collector, method)(**event)
+        except Exception:
+            logger.exception("%s.%s failed", collector.__class__.__name__, method)
+
+
+def record_call(
+    provider: str,
+    model: str,
+    task: str,
+    latency: float,
+    retries: int,
+    response: Any = None,
+    outcome: str = "success",
+) -> None:
+    usage = getattr(response, "usage", None)
+    _emit(
+        provider_call_finished,
+        "record_call",
+        provider,
+        provider=provider,
+        model=model,
+        task=task or "",
+        field=_smart_field.get(),
+        latency=latency,
+        retries=retries,
+        prompt_tokens=getattr(usage, "prompt_tokens", None) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", None) or 0,
+        outcome=outcome,
+    )
+
+
+def record_cache_lookup(provider: str, model: str, task: str, hit: bool) -> None:
+    _emit(
+        result_cache_lookup,
+        "record_cache_lookup",
+        provider,
+        provider=provider,
+        model=model,
+        task=task,
+        field=_smart_field.get(),
+        hit=hit,
+    )
+
+
+async def arecord_call(
+    provider: str,
+    model: str,
+    task: str,
+    latency: float,
+    retries: int,
+    response: Any = None,
+    outcome: str = "success",
+) -> None:
+    # Receivers and collectors may access the database, which is not allowed in async code
+    if _has_listeners(provider_call_finished):
+        await sync_to_async(record_call)(
+            provider, model, task, latency, retries, response=response, outcome=outcome
+        )
+
+
+async def arecord_cache_lookup(provider: str, model: str, task: str, hit: bool) -> None:
+    if _has_listeners(result_cache_lookup):
+        await sync_to_async(record_cache_lookup)(provider, model, task, hit)
+
+
+@contextmanager
+def smart_span(instance: Any, field: Any = None) -> Iterator[None]:
+    """
+    Measures the processing of all smart fields of a save() (field=None) or of a single
+    field, provider calls made inside are attributed to the field
+    """
+    model = instance._meta.label
+    token = _smart_field.set(f"{model}.{field.name}") if field is not None else None
+    outcome = "error"
+    start = time.perf_counter()
+    try:
+        yield
+        outcome = "success"
+    finally:
+        latency = time.perf_counter() - start
+        if token is not None:
+            _smart_field.reset(token)
+        _emit(
+            smart_span_finished,
+            "record_span",
+            instance.__class__,
+            span="field" if field is not None else "save",
+            model=model,
+            field=field.name if field is not None else "",
+            latency=latency,
+            outcome=outcome,
+        )
+
+
+@asynccontextmanager
+async def asmart_span(instance: Any, field: Any = None) -> AsyncIterator[None]:
+    """
+    Async counterpart of smart_span()
+    """
+    model = instance._meta.label
+    token = _smart_field.set(f"{model}.{field.name}") if field is not None else None
+    outcome = "error"
+    start = time.perf_counter()
+    try:
+        yield
+        outcome = "success"
+    finally:
+        latency = time.perf_counter() - start
+        if token is not None:
+            _smart_field.reset(token)
+        if _has_listeners(smart_span_finished):
+            await sync_to_async(_emit)(
+                smart_span_finished,
+                "record_span",
+                instance.__class__,
+                span="field" if field is not None else "save",
+                model=model,
+                field=field.name if field is not None else "",
+                latency=latency,
+                outcome=outcome,
+            )
@@ -0,0 +1,329 @@
+import asyncio
+import contextvars
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, NamedTuple, Union
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+
+from ..fields import APIProviders
+from ._configs import get_task_configs
+
+DEFAULT_HEDGE_PERCENTILE = 95
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+DEFAULT_HEDGE_WORKERS = 16
+LATENCY_WINDOW = 200  # latest successful calls per backend
+
+logger = logging.getLogger(__name__)
+
+
+class Backend(NamedTuple):
+    provider: str
+    configs: Any
+    fn: Callable
+    afn: Union[Callable, None]
+
+
+# (model type, task, provider) -> (fn, afn)
+_backends = {}
+
+
+def register_backend(
+    model_type: str,
+    task: str,
+    provider: APIProviders,
+    fn: Callable,
+    afn: Callable = None,
+) -> None:
+    """
+    Makes a provider available for a task. fn(configs, *args, **kwargs) returns the
+    result of the task, e.g. fn(configs, original_text, target_language="french") for
+    "translate" of type "text", where configs is the AIAPI instance of the provider.
+    afn is its async counterpart, fn runs in a thread when it is not given.
+    """
+    _backends[(model_type, task, provider)] = (fn, afn)
+
+
+def _get_providers_settings() -> dict:
+    return getattr(settings, "AI_API_SETTINGS", {}).get("providers", {})
+
+
+def get_task_providers(
+    model_type: str, task: str, api_provider: APIProviders
+) -> list[str]:
+    """
+    Providers tried for a task in order: api_provider, then the providers of
+    AI_API_SETTINGS["providers"]["backends"][model_type][task]
+    """
+    providers = [api_provider]
+    for provider in (
+        _get_providers_settings().get("backends", {}).get(model_type, {}).get(task, [])
+    ):
+        if provider not in providers:
+            providers.append(provider)
+    return providers
+
+
+def _get_backends(
+    model_type: str, task: str, api_provider: APIProviders
+) -> list[Backend]:
+    aiapi = apps.get_model("smart_models.AIAPI")
+    backends = []
+    for provider in get_task_providers(model_type, task, api_provider):
+        try:
+            configs = get_task_configs(task, model_type, provider)
+        except aiapi.DoesNotExist:
+            # Fallbacks without a configuration are skipped
+            if provider == api_provider:
+                raise
+            continue
+        if (model_type, task, provider) in _backends:
+            backends.append(
+                Backend(provider, configs, *_backends[(model_type, task, provider)])
+            )
+    return backends
+
+
+_latencies = {}
+_latencies_lock = threading.Lock()
+
+
+def _record_latency(
+    backend: Backend, model_type: str, task: str, latency: float
+) -> None:
+    key = (backend.provider, model_type, task)
+    with _latencies_lock:
+        latencies = _latencies.get(key)
+        if latencies is None:
+            latencies = _latencies[key] = deque(maxlen=LATENCY_WINDOW)
+        latencies.append(latency)
+
+
+def get_hedge_delay(
+    provider: APIProviders, model_type: str, task: str
+) -> Union[float, None]:
+    """
+    Observed latency percentile of a provider after which a hedged request is sent to
+    the next backend, None until enough calls were observed
+    """
+    providers_settings = _get_providers_settings()
+    with _latencies_lock:
+        latencies = sorted(_latencies.get((provider, model_type, task), ()))
+    if len(latencies) < providers_settings.get(
+        "hedge_min_samples", DEFAULT_HEDGE_MIN_SAMPLES
+    ):
+        return None
+    percentile = providers_settings.get("hedge_percentile", DEFAULT_HEDGE_PERCENTILE)
+    return latencies[max(math.ceil(len(latencies) * percentile / 100) - 1, 0)]
+
+
+def _log_failure(backend: Backend, model_type: str, task: str, error: Exception):
+    logger.warning(
+        "%s %s of %s failed, failing over: %r",
+        model_type,
+        task,
+        backend.provider,
+        error,
+    )
+
+
+def _call_backend(
+    backend: Backend, model_type: str, task: str, args: tuple, kwargs: dict
+) -> Any:
+    start = time.perf_counter()
+    result = backend.fn(backend.configs, *args, **kwargs)
+    _record_latency(backend, model_type, task, time.perf_counter() - start)
+    return result
+
+
+_hedge_executor = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _hedge_executor_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(
+                    max_workers=_get_providers_settings().get(
+                        "hedge_workers", DEFAULT_HEDGE_WORKERS
+                    ),
+                    thread_name_prefix="smart_models_hedge",
+                )
+    return _hedge_executor
+
+
+def _call_hedged(
+    backends: list[Backend], model_type: str, task: str, args: tuple, kwargs: dict
+) -> Any:
+    def call(backend: Backend) -> Any:
+        try:
+            return _call_backend(backend, model_type, task, args, kwargs)
+        finally:
+            # Every thread holds its own connection, e.g. of a DatabaseCache
+            connections.close_all()
+
+    executor = _get_hedge_executor()
+    futures = {}
+    error = None
+    started, started_at = 0, None
+
+    def start_next() -> None:
+        nonlocal started, started_at
+        backend = backends[started]
+        # Deadline and task context vars are not inherited by pool threads
+        futures[executor.submit(contextvars.copy_context().run, call, backend)] = (
+            backend
+        )
+        started, started_at = started + 1, time.perf_counter()
+
+    start_next()
+    while len(futures) != 0:
+        timeout = None
+        if started < len(backends):
+            delay = get_hedge_delay(backends[started - 1].provider, model_type, task)
+            if delay is not None:
+                timeout = max(delay - (time.perf_counter() - started_at), 0)
+        done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+        if len(done) == 0:
+            # Slower than usual, the calls still running are not cancelled and the
+            # first result wins
+            start_next()
+            continue
+        for future in done:
+            backend = futures.pop(future)
+            try:
+                return future.result()
+            except Exception as e:
+                _log_failure(backend, model_type, task, e)
+                error = e
+        if len(futures) == 0 and started < len(backends):
+            start_next()
+    raise error
+
+
+def call_backends(
+    model_type: str, task: str, api_provider: APIProviders, *args, **kwargs
+) -> Any:
+    """
+    Runs a task with the backend of api_provider, failing over to the next backends of
+    the task on errors, e.g. an open circuit. With AI_API_SETTINGS["providers"]["hedge"]
+    a request slower than the observed latency percentile of its provider is sent to
+    the next backend as well and the first result is used.
+    Returns None when no backend supports the provider.
+    """
+    backends = _get_backends(model_type, task, api_provider)
+    if len(backends) == 0:
+        return None
+    if len(backends) > 1 and _get_providers_settings().get("hedge", False):
+        return _call_hedged(backends, model_type, task, args, kwargs)
+
+    for i, backend in enumerate(backends):
+        try:
+            return _call_backend(backend, model_type, task, args, kwargs)
+        except Exception as e:
+            if i == len(backends) - 1:
+                raise
+            _log_failure(backend, model_type, task, e)
+
+
+async def _acall_backend(
+    backend: Backend, model_type: str, task: str, args: tuple, kwargs: dict
+) -> Any:
+    start = time.perf_counter()
+    if backend.afn is not None:
+        result = await backend.afn(backend.configs, *args, **kwargs)
+    else:
+        result = await asyncio.to_thread(backend.fn, backend.configs, *args, **kwargs)
+    _record_latency(backend, model_type, task, time.perf_counter() - start)
+    return result
+
+
+async def _acall_hedged(
+    backends: list[Backend], model_type: str, task: str, args: tuple, kwargs: dict
+) -> Any:
+    tasks = {}
+    error = None
+    started, started_at = 0, None
+
+    def start_next() -> None:
+        nonlocal started, started_at
+        backend = backends[started]
+        tasks[
+            asyncio.ensure_future(
+                _acall_backend(backend, model_type, task, args, kwargs)
+            )
+        ] = backend
+        started, started_at = started + 1, time.perf_counter()
+
+    start_next()
+    try:
+        while len(tasks) != 0:
+            timeout = None
+            if started < len(backends):
+                delay = get_hedge_delay(
+                    backends[started - 1].provider, model_type, task
+                )
+                if delay is not None:
+                    timeout = max(delay - (time.perf_counter() - started_at), 0)
+            done, _ = await asyncio.wait(
+                tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if len(done) == 0:
+                start_next()
+                continue
+            for done_task in done:
+                backend = tasks.pop(done_task)
+                try:
+                    return done_task.result()
+                except Exception as e:
+                    _log_failure(backend, model_type, task, e)
+                    error = e
+            if len(tasks) == 0 and started < len(backends):
+                start_next()
+        raise error
+    finally:
+        # Unlike threads, the slower requests can be cancelled
+        for pending_task in tasks:
+            pending_task.cancel()
+
+
+async def acall_backends(
+    model_type: str, task: str, api_provider: APIProviders, *args, **kwargs
+) -> Any:
+    """
+    Async counterpart of call_backends()
+    """
+    backends = await sync_to_async(_get_backends)(model_type, task, api_provider)
+    if len(backends) == 0:
+        return None
+    if len(backends) > 1 and _get_providers_settings().get("hedge", False):
+        return await _acall_hedged(backends, model_type, task, args, kwargs)
+
+    for i, backend in enumerate(backends):
+        try:
+            return await _acall_backend(backend, model_type, task, args, kwargs)
+        except Exception as e:
+            if i == len(backends) - 1:
+                raise
+            _log_failure(backend, model_type, task, e)
+
+
+def _reset_after_fork() -> None:
+    global _hedge_executor, _hedge_executor_lock, _latencies_lock
+    _hedge_executor = None
+    _hedge_executor_lock = threading.Lock()
+    _latencies_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,93 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+DEFAULT_RENDITION_WORKERS = 4
+
+# format -> Pillow format and default save parameters
+RENDITION_FORMATS = {
+    "png": ("PNG", {"optimize": True}),
+    "jpeg": ("JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+    "jpg": ("JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "avif": ("AVIF", {"quality": 60}),
+}
+
+
+def _get_renditions_settings() -> dict:
+    return getattr(settings, "AI_API_SETTINGS", {}).get("renditions", {})
+
+
+def is_rendition_format_supported(image_format: str) -> bool:
+    """
+    Whether the installed Pillow can write a format, e.g. AVIF needs Pillow 11.2 or
+    the pillow-avif-plugin package
+    """
+    if image_format.lower() not in RENDITION_FORMATS:
+        return False
+    Image.init()
+    return RENDITION_FORMATS[image_format.lower()][0] in Image.SAVE
+
+
+def _get_size(
+    image: Image.Image, width: Union[int, None], height: Union[int, None]
+) -> tuple[int, int]:
+    if width is None:
+        width = max(round(image.width * height / image.height), 1)
+    elif height is None:
+        height = max(round(image.height * width / image.width), 1)
+    return width, height
+
+
+def render_image(image: Image.Image, options: dict, default_format: str) -> bytes:
+    """
+    Encodes a rendition of an image. options: "width" and/or "height" (both crop to
+    the exact size, one keeps the aspect ratio), "format" (png, jpeg, webp or avif,
+    defaults to default_format) and "quality"
+    """
+    width, height = options.get("width"), options.get("height")
+    if width is not None and height is not None:
+        image = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+    elif width is not None or height is not None:
+        image = image.resize(_get_size(image, width, height), Image.Resampling.LANCZOS)
+
+    pil_format, params = RENDITION_FORMATS[
+        (options.get("format") or default_format).lower()
+    ]
+    params = dict(params)
+    if "quality" in options:
+        params["quality"] = options["quality"]
+    if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    output = io.BytesIO()
+    image.save(output, pil_format, **params)
+    return output.getvalue()
+
+
+def derive_renditions(
+    master: bytes, renditions: dict[str, dict], default_format: str = "png"
+) -> dict[str, bytes]:
+    """
+    Renditions of a generated image by name, derived locally in a thread pool. Pillow
+    releases the GIL while resizing and encoding, so renditions are derived in parallel.
+    """
+    if len(renditions) == 0:
+        return {}
+
+    image = Image.open(io.BytesIO(master))
+    image.load()
+    with ThreadPoolExecutor(
+        max_workers=min(
+            _get_renditions_settings().get("workers", DEFAULT_RENDITION_WORKERS),
+            len(renditions),
+        )
+    ) as executor:
+        futures = {
+            name: executor.submit(render_image, image, options, default_format)
+            for name, options in renditions.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
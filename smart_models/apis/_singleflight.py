@@ -0,0 +1,239 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import uuid
+import weakref
+from typing import Any, Callable
+
+from django.conf import settings
+from django.core.cache import caches
+
+from ._cache import cache_miss, is_cache_miss
+from ._clients import get_remaining_deadline
+
+DEFAULT_LOCK_TIMEOUT = 300  # seconds
+DEFAULT_POLL_INTERVAL = 0.1  # seconds
+DEFAULT_RESULT_TIMEOUT = 10  # seconds
+
+
+def _get_single_flight_settings() -> dict:
+    return getattr(settings, "AI_API_SETTINGS", {}).get("single_flight", {})
+
+
+def make_flight_key(task: str, provider: str, model: str, *parts: Any) -> str:
+    digest = hashlib.sha256(
+        json.dumps(parts, ensure_ascii=False, default=str).encode("utf-8")
+    ).hexdigest()
+    return f"{provider}:{model}:{task}:{digest}"
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# key -> in-flight call of this process
+_flights = {}
+_flights_lock = threading.Lock()
+# event loop -> {key -> future}
+_aflights = weakref.WeakKeyDictionary()
+
+
+def _get_shared_lock_cache() -> Any:
+    alias = _get_single_flight_settings().get("alias")
+    return caches[alias] if alias else None
+
+
+def _lock_key(key: str) -> str:
+    return f"smart_models:single_flight:{key}"
+
+
+def _result_key(key: str) -> str:
+    return f"smart_models:single_flight:result:{key}"
+
+
+def _get_published(shared_cache: Any, key: str, lookup: Callable = None) -> Any:
+    # Without lookup, the leader publishes its result in the shared cache
+    if lookup is not None:
+        return lookup()
+    published = shared_cache.get(_result_key(key))
+    return published[0] if published is not None else cache_miss()
+
+
+def _publish(shared_cache: Any, key: str, result: Any) -> None:
+    # Wrapped, so that a None result is not read as a miss
+    shared_cache.set(
+        _result_key(key),
+        (result,),
+        _get_single_flight_settings().get("result_timeout", DEFAULT_RESULT_TIMEOUT),
+    )
+
+
+def _run_across_processes(key: str, fn: Callable, lookup: Callable = None) -> Any:
+    """
+    Runs fn while holding a lock in the shared cache. Other processes wait for the lock
+    and read the published result with lookup, or take over when the holder failed.
+    """
+    shared_cache = _get_shared_lock_cache()
+    if shared_cache is None:
+        return fn()
+
+    single_flight_settings = _get_single_flight_settings()
+    lock_timeout = single_flight_settings.get("lock_timeout", DEFAULT_LOCK_TIMEOUT)
+    poll_interval = single_flight_settings.get("poll_interval", DEFAULT_POLL_INTERVAL)
+    lock_key = _lock_key(key)
+    token = uuid.uuid4().hex
+    while True:
+        if shared_cache.add(lock_key, token, lock_timeout):
+            try:
+                # The previous holder may have published since the last poll
+                result = _get_published(shared_cache, key, lookup)
+                if not is_cache_miss(result):
+                    return result
+                result = fn()
+                if lookup is None:
+                    _publish(shared_cache, key, result)
+                return result
+            finally:
+                if shared_cache.get(lock_key) == token:
+                    shared_cache.delete(lock_key)
+
+        remaining = get_remaining_deadline()
+        if remaining is not None and remaining <= poll_interval:
+            # Rather make the call than fail waiting for another process
+            return fn()
+        time.sleep(poll_interval)
+        result = _get_published(shared_cache, key, lookup)
+        if not is_cache_miss(result):
+            return result
+
+
+def single_flight(key: str, fn: Callable, lookup: Callable = None) -> Any:
+    """
+    Concurrent calls with the same key share one call of fn. Threads of this process
+    wait for its result, other processes wait on a lock in the cache named by
+    AI_API_SETTINGS["single_flight"]["alias"] and then read the result with lookup,
+    which returns cache_miss() while no result was published. Without lookup, the
+    result is published in that cache for "result_timeout" seconds.
+    """
+    if not _get_single_flight_settings().get("enabled", True):
+        return fn()
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        flight.done.wait(timeout=get_remaining_deadline())
+        if not flight.done.is_set():
+            return fn()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = _run_across_processes(key, fn, lookup)
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+
+async def _aget_published(shared_cache: Any, key: str, lookup: Callable = None) -> Any:
+    if lookup is not None:
+        return await lookup()
+    published = await shared_cache.aget(_result_key(key))
+    return published[0] if published is not None else cache_miss()
+
+
+async def _apublish(shared_cache: Any, key: str, result: Any) -> None:
+    await shared_cache.aset(
+        _result_key(key),
+        (result,),
+        _get_single_flight_settings().get("result_timeout", DEFAULT_RESULT_TIMEOUT),
+    )
+
+
+async def _arun_across_processes(
+    key: str, fn: Callable, lookup: Callable = None
+) -> Any:
+    shared_cache = _get_shared_lock_cache()
+    if shared_cache is None:
+        return await fn()
+
+    single_flight_settings = _get_single_flight_settings()
+    lock_timeout = single_flight_settings.get("lock_timeout", DEFAULT_LOCK_TIMEOUT)
+    poll_interval = single_flight_settings.get("poll_interval", DEFAULT_POLL_INTERVAL)
+    lock_key = _lock_key(key)
+    token = uuid.uuid4().hex
+    while True:
+        if await shared_cache.aadd(lock_key, token, lock_timeout):
+            try:
+                result = await _aget_published(shared_cache, key, lookup)
+                if not is_cache_miss(result):
+                    return result
+                result = await fn()
+                if lookup is None:
+                    await _apublish(shared_cache, key, result)
+                return result
+            finally:
+                if await shared_cache.aget(lock_key) == token:
+                    await shared_cache.adelete(lock_key)
+
+        remaining = get_remaining_deadline()
+        if remaining is not None and remaining <= poll_interval:
+            return await fn()
+        await asyncio.sleep(poll_interval)
+        result = await _aget_published(shared_cache, key, lookup)
+        if not is_cache_miss(result):
+            return result
+
+
+async def asingle_flight(key: str, fn: Callable, lookup: Callable = None) -> Any:
+    """
+    Async counterpart of single_flight(), fn and lookup return coroutines. Calls are
+    shared between tasks of the same event loop.
+    """
+    if not _get_single_flight_settings().get("enabled", True):
+        return await fn()
+
+    loop = asyncio.get_running_loop()
+    flights = _aflights.setdefault(loop, {})
+    future = flights.get(key)
+    while future is not None:
+        try:
+            # shield, so that a cancelled waiter does not cancel the shared call
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The call was cancelled with the task of its leader, not this one, so
+            # the waiters make it again
+            if not future.cancelled():
+                raise
+        future = flights.get(key)
+
+    future = flights[key] = loop.create_future()
+    try:
+        result = await _arun_across_processes(key, fn, lookup)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        # Marked as retrieved, asyncio logs a warning when nobody else was waiting
+        future.exception()
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        flights.pop(key, None)
@@ -0,0 +1,355 @@
+import hashlib
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Iterator, Union
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+DEFAULT_MAX_EDIT_DISTANCE = 2
+DEFAULT_PREFIX_LENGTH = 7
+
+INDEX_MAGIC = b"SMSPELL1"
+# magic, byte order, max edit distance, prefix length, words, deletes
+_HEADER = struct.Struct("<8scBHQQ")
+_HEADER_SIZE = 64
+
+_WORD_PATTERN = re.compile(r"[^\W\d_]+(?:['’][^\W\d_]+)*")
+
+
+def _get_local_settings() -> dict:
+    return getattr(settings, "AI_API_SETTINGS", {}).get("local", {})
+
+
+def _hash(text: str) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(
+        hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little"
+    )
+
+
+def _get_deletes(word: str, max_edit_distance: int) -> set[str]:
+    deletes, edits = {word}, {word}
+    for _ in range(max_edit_distance):
+        edits = {edit[:i] + edit[i + 1 :] for edit in edits for i in range(len(edit))}
+        deletes |= edits
+    return deletes
+
+
+def _edit_distance(a: str, b: str, max_distance: int) -> Union[int, None]:
+    # Optimal string alignment distance, None when above max_distance
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    before_previous, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            distance = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (a[i - 1] != b[j - 1]),
+            )
+            if (
+                before_previous is not None
+                and j > 1
+                and a[i - 1] == b[j - 2]
+                and a[i - 2] == b[j - 1]
+            ):
+                distance = min(distance, before_previous[j - 2] + 1)
+            current[j] = distance
+        if min(current) > max_distance:
+            return None
+        before_previous, previous = previous, current
+    return previous[-1] if previous[-1] <= max_distance else None
+
+
+def _read_dictionary(dictionary_path: str) -> dict[str, int]:
+    # "word count" per line, the format of the SymSpell frequency dictionaries
+    counts = {}
+    with open(dictionary_path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 2 or not parts[1].isdigit():
+                continue
+            word = parts[0].lower()
+            counts[word] = counts.get(word, 0) + int(parts[1])
+    return counts
+
+
+def _sorted_by_hash(hashes: array, ids: array) -> tuple[array, array]:
+    order = sorted(range(len(hashes)), key=hashes.__getitem__)
+    return array("Q", (hashes[i] for i in order)), array("I", (ids[i] for i in order))
+
+
+def _padded(data: bytes) -> bytes:
+    return data + b"\0" * (-len(data) % 8)
+
+
+def build_spelling_index(
+    dictionary_path: str,
+    index_path: str,
+    max_edit_distance: int = DEFAULT_MAX_EDIT_DISTANCE,
+    prefix_length: int = DEFAULT_PREFIX_LENGTH,
+) -> int:
+    """
+    Precomputes the symmetric delete index of a frequency dictionary: every word
+    (prefix) with up to max_edit_distance characters deleted points to the word. Written
+    as sorted hash tables, so that it is used memory mapped without loading it.
+    Returns the number of words.
+    """
+    counts = _read_dictionary(dictionary_path)
+    words = sorted(counts)
+    blob = [word.encode("utf-8") for word in words]
+    offsets = array("Q", [0])
+    for word in blob:
+        offsets.append(offsets[-1] + len(word))
+
+    delete_hashes, delete_ids = array("Q"), array("I")
+    for i, word in enumerate(words):
+        for delete in _get_deletes(word[:prefix_length], max_edit_distance):
+            delete_hashes.append(_hash(delete))
+            delete_ids.append(i)
+    delete_hashes, delete_ids = _sorted_by_hash(delete_hashes, delete_ids)
+    word_hashes, word_ids = _sorted_by_hash(
+        array("Q", (_hash(word) for word in words)), array("I", range(len(words)))
+    )
+
+    header = _HEADER.pack(
+        INDEX_MAGIC,
+        sys.byteorder[0].encode(),
+        max_edit_distance,
+        prefix_length,
+        len(words),
+        len(delete_hashes),
+    )
+    # Written next to the index and renamed, so that workers never map a partial file
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(index_path)), suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header.ljust(_HEADER_SIZE, b"\0"))
+            f.write(array("Q", (counts[word] for word in words)).tobytes())
+            f.write(offsets.tobytes())
+            f.write(word_hashes.tobytes())
+            f.write(_padded(word_ids.tobytes()))
+            f.write(delete_hashes.tobytes())
+            f.write(_padded(delete_ids.tobytes()))
+            f.write(b"".join(blob))
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(words)
+
+
+class SpellingIndex:
+    """
+    Read only view of an index written by build_spelling_index(). The file is memory
+    mapped, so that all workers of a host share one copy in the page cache.
+    """
+
+    def __init__(self, index_path: str) -> None:
+        with open(index_path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic,
+            byteorder,
+            self.max_edit_distance,
+            self.prefix_length,
+            word_count,
+            delete_count,
+        ) = _HEADER.unpack_from(self._mmap)
+        if magic != INDEX_MAGIC or byteorder != sys.byteorder[0].encode():
+            raise ValueError(f"{index_path} is not a spelling index of this platform")
+
+        view = memoryview(self._mmap)
+        position = _HEADER_SIZE
+
+        def section(typecode: str, count: int) -> memoryview:
+            nonlocal position
+            size = count * array(typecode).itemsize
+            data = view[position : position + size].cast(typecode)
+            position += size + (-size % 8)
+            return data
+
+        self._counts = section("Q", word_count)
+        self._offsets = section("Q", word_count + 1)
+        self._word_hashes = section("Q", word_count)
+        self._word_ids = section("I", word_count)
+        self._delete_hashes = section("Q", delete_count)
+        self._delete_ids = section("I", delete_count)
+        self._blob = view[position:]
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def _word(self, word_id: int) -> str:
+        return bytes(
+            self._blob[self._offsets[word_id] : self._offsets[word_id + 1]]
+        ).decode("utf-8")
+
+    def _find(self, hashes: memoryview, ids: memoryview, text: str) -> Iterator[int]:
+        text_hash = _hash(text)
+        i = bisect_left(hashes, text_hash)
+        while i < len(hashes) and hashes[i] == text_hash:
+            yield ids[i]
+            i += 1
+
+    def __contains__(self, word: str) -> bool:
+        return any(
+            self._word(word_id) == word
+            for word_id in self._find(self._word_hashes, self._word_ids, word)
+        )
+
+    def lookup(
+        self, word: str, max_edit_distance: int = None
+    ) -> Union[tuple[str, int], None]:
+        """
+        Closest known word as (word, edit distance), the most frequent one among equally
+        close words, or None
+        """
+        if max_edit_distance is None or max_edit_distance > self.max_edit_distance:
+            max_edit_distance = self.max_edit_distance
+        if word in self:
+            return word, 0
+
+        best, best_distance, best_count = None, None, -1
+        seen = set()
+        for delete in _get_deletes(word[: self.prefix_length], max_edit_distance):
+            for word_id in self._find(self._delete_hashes, self._delete_ids, delete):
+                if word_id in seen:
+                    continue
+                seen.add(word_id)
+                suggestion = self._word(word_id)
+                distance = _edit_distance(word, suggestion, max_edit_distance)
+                if distance is None:
+                    continue
+                count = self._counts[word_id]
+                if (
+                    best is None
+                    or distance < best_distance
+                    or (distance == best_distance and count > best_count)
+                ):
+                    best, best_distance, best_count = suggestion, distance, count
+        return None if best is None else (best, best_distance)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_spelling_index_paths() -> tuple[str, str]:
+    local_settings = _get_local_settings()
+    dictionary_path = local_settings.get("spelling_dictionary")
+    if dictionary_path is None:
+        raise ImproperlyConfigured(
+            'AI_API_SETTINGS["local"]["spelling_dictionary"] has to be set to use the local spell correction'
+        )
+    return dictionary_path, local_settings.get(
+        "spelling_index", f"{dictionary_path}.idx"
+    )
+
+
+def _is_index_stale(
+    dictionary_path: str, index_path: str, max_edit_distance: int, prefix_length: int
+) -> bool:
+    if not os.path.exists(index_path):
+        return True
+    if os.path.exists(dictionary_path) and os.path.getmtime(
+        dictionary_path
+    ) > os.path.getmtime(index_path):
+        return True
+    with open(index_path, "rb") as f:
+        header = f.read(_HEADER.size)
+    try:
+        magic, byteorder, index_distance, index_prefix, _, _ = _HEADER.unpack(header)
+    except struct.error:
+        return True
+    return (
+        magic != INDEX_MAGIC
+        or byteorder != sys.byteorder[0].encode()
+        or index_distance < max_edit_distance
+        or index_prefix != prefix_length
+    )
+
+
+def get_spelling_index(
+    max_edit_distance: int = DEFAULT_MAX_EDIT_DISTANCE,
+    prefix_length: int = DEFAULT_PREFIX_LENGTH,
+) -> SpellingIndex:
+    """
+    Index of AI_API_SETTINGS["local"]["spelling_dictionary"], opened once per process.
+    Built on first use when missing or older than the dictionary, run
+    `python manage.py smart_models_build_spelling_index` to build it ahead of time.
+    """
+    dictionary_path, index_path = get_spelling_index_paths()
+    key = (index_path, max_edit_distance, prefix_length)
+    index = _indexes.get(key)
+    if index is not None:
+        return index
+
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            if _is_index_stale(
+                dictionary_path, index_path, max_edit_distance, prefix_length
+            ):
+                build_spelling_index(
+                    dictionary_path, index_path, max_edit_distance, prefix_length
+                )
+            index = _indexes[key] = SpellingIndex(index_path)
+    return index
+
+
+def _match_case(word: str, template: str) -> str:
+    if len(template) > 1 and template.isupper():
+        return word.upper()
+    if template[0].isupper():
+        return word[0].upper() + word[1:]
+    return word
+
+
+def correct_spelling(
+    index: SpellingIndex,
+    text: str,
+    max_edit_distance: int = DEFAULT_MAX_EDIT_DISTANCE,
+    ignore_capitalized: bool = True,
+) -> tuple[str, list[str], list[str]]:
+    """
+    Replaces unknown words by their closest known word, keeping everything else of the
+    text as is. Returns the corrected text, the unknown (suspicious) words and the
+    unknown words without a correction (unresolved).
+    ignore_capitalized: bool, treats unknown capitalized words as names, also at the
+    start of a sentence ("Paris is ..."), so that they are not corrected. They are
+    still suspicious, a misspelled word may be capitalized as well.
+    """
+    corrected, suspicious, unresolved = [], [], []
+    position = 0
+    for match in _WORD_PATTERN.finditer(text):
+        token = match.group()
+        word = token.lower()
+        # Short words have too many neighbours to be corrected reliably
+        distance = min(max_edit_distance, (len(word) - 1) // 2)
+        if distance == 0 or "'" in word or "’" in word or word in index:
+            continue
+
+        suspicious.append(token)
+        if ignore_capitalized and token[0].isupper():
+            continue
+        suggestion = index.lookup(word, distance)
+        if suggestion is None:
+            unresolved.append(token)
+            continue
+        corrected.append(text[position : match.start()])
+        corrected.append(_match_case(suggestion[0], token))
+        position = match.end()
+    corrected.append(text[position:])
+    return "".join(corrected), suspicious, unresolved
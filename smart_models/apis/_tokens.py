@@ -0,0 +1,70 @@
+import math
+import re
+
+# Words, runs of digits, single CJK characters and single punctuation marks
+_TOKEN_PATTERN = re.compile(
+    r"[぀-ヿ㐀-䶿一-鿿가-힯]|[^\W\d_]+|\d+|[^\w\s]",
+    re.UNICODE,
+)
+_PARAGRAPH_SEPARATOR = re.compile(r"(\n\s*\n)")
+_SENTENCE_SEPARATOR = re.compile(r"(?<=[.!?。！？])(\s+)")
+_WORD_SEPARATOR = re.compile(r"(\s+)")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Local estimate of the number of BPE tokens of a text. Errs on the high side: common
+    words are a single token, longer words count one token per 4 characters.
+    """
+    tokens = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        token = match.group()
+        tokens += math.ceil(len(token) / 4) if len(token) > 4 else 1
+    return tokens
+
+
+def _split_units(text: str, separator: re.Pattern) -> list[str]:
+    # Units keep their trailing separator, so that "".join(units) == text
+    parts = separator.split(text)
+    units = []
+    for i in range(0, len(parts), 2):
+        unit = parts[i] + (parts[i + 1] if i + 1 < len(parts) else "")
+        if unit:
+            units.append(unit)
+    return units
+
+
+def split_text(text: str, max_tokens: int) -> list[str]:
+    """
+    Splits text into chunks of at most max_tokens tokens, on paragraph boundaries when
+    possible, then on sentence and finally on word boundaries. "".join(chunks) == text.
+    """
+    if count_tokens(text) <= max_tokens:
+        return [text]
+
+    chunks, chunk, chunk_tokens = [], "", 0
+    for separator in (_PARAGRAPH_SEPARATOR, _SENTENCE_SEPARATOR, _WORD_SEPARATOR):
+        units = _split_units(text, separator)
+        if len(units) > 1:
+            break
+    else:
+        # A single word longer than the budget
+        return [text]
+
+    for unit in units:
+        unit_tokens = count_tokens(unit)
+        if unit_tokens > max_tokens:
+            if chunk:
+                chunks.append(chunk)
+                chunk, chunk_tokens = "", 0
+            chunks += split_text(unit, max_tokens)
+            continue
+        if chunk and chunk_tokens + unit_tokens > max_tokens:
+            chunks.append(chunk)
+            chunk, chunk_tokens = "", 0
+        chunk += unit
+        chunk_tokens += unit_tokens
+    if chunk:
+        chunks.append(chunk)
+
+    return chunks
@@ -1,64 +1,107 @@
 import os
+from functools import partial
 from typing import Any
 
 import openai
-from django.conf import settings
 
 from ..fields import APIProviders
-from ._configs import get_task_configs
+from ._clients import arun_openai_call, configure_openai, openai_task
+from ._limits import acall_with_limits, call_with_limits
+from ._providers import acall_backends, call_backends, register_backend
 
-openai.api_key = settings.AI_API_SETTINGS["openai"]["key"]
+configure_openai()
+
+SUPPORTED_AUDIO_FORMATS = [
+    ".mp3",
+    ".mp4",
+    ".mpeg",
+    ".mpga",
+    ".m4a",
+    ".wav",
+    ".webm",
+]
+
+
+def _validate_audio_format(audio_file: str, api_provider: APIProviders) -> None:
+    if os.path.splitext(audio_file)[-1] not in SUPPORTED_AUDIO_FORMATS:
+        raise Exception(
+            f"audio format {os.path.splitext(audio_file)[-1]} is not supported by {api_provider}"
+        )
+
+
+def _rewind(f: Any, fn: Any, model: str) -> Any:
+    # Retried uploads have to start from the beginning of the file
+    def call() -> Any:
+        f.seek(0)
+        return fn(model, f)
+
+    return call
+
+
+def _openai_audio(configs: Any, audio_file: str, task: str, method: str) -> str:
+    _validate_audio_format(audio_file, APIProviders.OPENAI)
+    with open(audio_file, "rb") as f, openai_task(task):
+        response = call_with_limits(
+            APIProviders.OPENAI,
+            configs.configurations["model"],
+            _rewind(f, getattr(openai.Audio, method), configs.configurations["model"]),
+            task=task,
+        )
+    return response["text"] if "text" in response else None
+
+
+async def _aopenai_audio(configs: Any, audio_file: str, task: str, method: str) -> str:
+    _validate_audio_format(audio_file, APIProviders.OPENAI)
+    with open(audio_file, "rb") as f:
+        response = await acall_with_limits(
+            APIProviders.OPENAI,
+            configs.configurations["model"],
+            lambda: arun_openai_call(
+                _rewind(
+                    f, getattr(openai.Audio, method), configs.configurations["model"]
+                )(),
+                task=task,
+            ),
+            task=task,
+        )
+    return response["text"] if "text" in response else None
 
 
 def transcribe_audio(
     audio_file: str, api_provider: APIProviders = APIProviders.OPENAI
 ) -> str:
-    configs = get_task_configs("transcribe", "audio", api_provider)
-    transcribed_text = None
-    if api_provider == APIProviders.OPENAI and configs is not None:
-        if os.path.splitext(audio_file)[-1] not in [
-            ".mp3",
-            ".mp4",
-            ".mpeg",
-            ".mpga",
-            ".m4a",
-            ".wav",
-            ".webm",
-        ]:
-            raise Exception(
-                f"audio format {os.path.splitext(audio_file)[-1]} is not supported by {api_provider}"
-            )
-
-        with open(audio_file, "rb") as f:
-            transcript = openai.Audio.transcribe(configs.configurations["model"], f)
-            if "text" in transcript:
-                transcribed_text = transcript["text"]
-
-    return transcribed_text
+    return call_backends("audio", "transcribe", api_provider, audio_file)
 
 
 def translate_audio(
     audio_file: str, api_provider: APIProviders = APIProviders.OPENAI
 ) -> str:
-    configs = get_task_configs("translate", "audio", api_provider)
-    translated_text = None
-    if api_provider == APIProviders.OPENAI and configs is not None:
-        if os.path.splitext(audio_file)[-1] not in [
-            ".mp3",
-            ".mp4",
-            ".mpeg",
-            ".mpga",
-            ".m4a",
-            ".wav",
-            ".webm",
-        ]:
-            raise Exception(
-                f"audio format {os.path.splitext(audio_file)[-1]} is not supported by {api_provider}"
-            )
-
-        with open(audio_file, "rb") as f:
-            translation = openai.Audio.translate(configs.configurations["model"], f)
-            if "text" in translation:
-                translated_text = translation["text"]
-
-    return translated_text
+    return call_backends("audio", "translate", api_provider, audio_file)
+
+
+async def atranscribe_audio(
+    audio_file: str, api_provider: APIProviders = APIProviders.OPENAI
+) -> str:
+    return await acall_backends("audio", "transcribe", api_provider, audio_file)
+
+
+async def atranslate_audio(
+    audio_file: str, api_provider: APIProviders = APIProviders.OPENAI
+) -> str:
+    return await acall_backends("audio", "translate", api_provider, audio_file)
+
+
+register_backend(
+    "audio",
+    "transcribe",
+    APIProviders.OPENAI,
+    partial(_openai_audio, task="transcribe", method="transcribe"),
+    partial(_aopenai_audio, task="transcribe", method="atranscribe"),
+)
+register_backend(
+    "audio",
+    "translate",
+    APIProviders.OPENAI,
+    partial(_openai_audio, task="translate", method="translate"),
+    partial(_aopenai_audio, task="translate", method="atranslate"),
+)
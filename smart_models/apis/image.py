@@ -1,19 +1,69 @@
+import asyncio
+import contextvars
+import hashlib
 import io
-from typing import Any
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Union
 
 import stability_sdk.interfaces.gooseai.generation.generation_pb2 as generation
 from django.apps import apps
 from django.conf import settings
-from stability_sdk import client
+from django.db import connections
 
 from ..fields import APIProviders
+from ._clients import get_stability_client
 from ._configs import get_task_configs
+from ._limits import call_with_limits
+from ._providers import acall_backends, call_backends, register_backend
+
+STABILITY_AI_SEED = 992446758  # using seed from documentation
+DEFAULT_SAMPLES = 1
+DEFAULT_FILTER_RETRIES = 2
+DEFAULT_BATCH_CONCURRENCY = 8
 
 
-# TODO: Cache results
 def _get_stability_ai_api(model: str) -> Any:
-    return client.StabilityInference(
-        key=settings.AI_API_SETTINGS["stability_ai"]["key"], verbose=True, engine=model
+    return get_stability_client(model)
+
+
+def _get_stabilityai_params(
+    configs: Any,
+    task: str,
+    text: str = None,
+    image_width: int = 512,
+    image_height: int = 512,
+) -> dict:
+    return {
+        "prompt": configs.configurations["tasks"][task].replace(
+            "article_placeholder", text
+        ),
+        "seed": STABILITY_AI_SEED,
+        "steps": configs.configurations["steps"],
+        "cfg_scale": configs.configurations["cfg_scale"],
+        "width": image_width,
+        "height": image_height,
+    }
+
+
+def _stabilityai_generate(
+    stability_api: Any, configs: Any, task: str, params: dict, samples: int
+) -> list:
+    # Errors are raised while iterating the response stream, consume it inside the
+    # rate limited call so that they can be retried
+    return call_with_limits(
+        APIProviders.STABILITYAI,
+        configs.configurations["model"],
+        lambda: [
+            artifact
+            for resp in stability_api.generate(
+                **params,
+                samples=samples,
+                guidance_preset=generation.GUIDANCE_PRESET_FAST_GREEN,
+            )
+            for artifact in resp.artifacts
+        ],
+        task=task,
     )
 
 
@@ -24,29 +74,88 @@ def stabilityai_gen(
     image_width: int = 512,
     image_height: int = 512,
 ) -> Any:
-    generated_image = None
+    """
+    Returns the first of configurations["samples"] images the safety filter did not
+    blur. When all of them were filtered, the images of the next seeds are requested,
+    up to configurations["filter_retries"] times, and None is returned after that.
+    """
     stability_api = _get_stability_ai_api(configs.configurations["model"])
-    prompt = configs.configurations["tasks"][task].replace("article_placeholder", text)
-
-    response = stability_api.generate(
-        prompt=prompt,
-        seed=992446758,  # using seed from documentation
-        steps=configs.configurations["steps"],
-        cfg_scale=configs.configurations["cfg_scale"],
-        width=image_width,
-        height=image_height,
-        samples=1,
-        guidance_preset=generation.GUIDANCE_PRESET_FAST_GREEN,
-    )
+    samples = configs.configurations.get("samples", DEFAULT_SAMPLES)
 
-    for resp in response:
-        for artifact in resp.artifacts:
+    params = _get_stabilityai_params(
+        configs, task, text, image_width=image_width, image_height=image_height
+    )
+    for _ in range(
+        configs.configurations.get("filter_retries", DEFAULT_FILTER_RETRIES) + 1
+    ):
+        artifacts = _stabilityai_generate(stability_api, configs, task, params, samples)
+        filtered = False
+        for artifact in artifacts:
             if artifact.finish_reason == generation.FILTER:
-                # TODO: retry generation
-                pass
-            if artifact.type == generation.ARTIFACT_IMAGE:
-                generated_image = io.BytesIO(artifact.binary)
-    return generated_image
+                filtered = True
+            elif artifact.type == generation.ARTIFACT_IMAGE:
+                # BytesIO shares the buffer of artifact.binary until it is written to
+                return io.BytesIO(artifact.binary)
+        if not filtered:
+            return None
+        params = {**params, "seed": params["seed"] + samples}
+    return None
+
+
+def get_thumbnail_key(
+    text: str,
+    image_width: int = 512,
+    image_height: int = 512,
+    image_extension: str = "png",
+    api_provider: APIProviders = APIProviders.STABILITYAI,
+) -> Union[str, None]:
+    """
+    Digest of everything that determines a generated thumbnail. Generation uses a fixed
+    seed, so equal keys produce the same image and it can be stored only once.
+    """
+    configs = get_task_configs("thumbnail", "image", api_provider)
+    if api_provider != APIProviders.STABILITYAI or configs is None:
+        return None
+
+    params = _get_stabilityai_params(
+        configs,
+        "thumbnail",
+        text,
+        image_width=image_width,
+        image_height=image_height,
+    )
+    return hashlib.sha256(
+        json.dumps(
+            [api_provider, configs.configurations["model"], params, image_extension],
+            sort_keys=True,
+            ensure_ascii=False,
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+def _stabilityai_thumbnail(
+    configs: Any, text: str, image_width: int = 512, image_height: int = 512
+) -> Any:
+    return stabilityai_gen(
+        configs,
+        "thumbnail",
+        text,
+        image_width=image_width,
+        image_height=image_height,
+    )
+
+
+async def _astabilityai_thumbnail(
+    configs: Any, text: str, image_width: int = 512, image_height: int = 512
+) -> Any:
+    # stability_sdk only ships a blocking gRPC client, run it off the event loop
+    return await asyncio.to_thread(
+        _stabilityai_thumbnail,
+        configs,
+        text,
+        image_width=image_width,
+        image_height=image_height,
+    )
 
 
 def generate_thumbnail(
@@ -55,15 +164,115 @@ def generate_thumbnail(
     image_height: int = 512,
     api_provider: APIProviders = APIProviders.STABILITYAI,
 ) -> str:
-    configs = get_task_configs("thumbnail", "image", api_provider)
-    thumbnail = None
-    if api_provider == APIProviders.STABILITYAI and configs is not None:
-        thumbnail = stabilityai_gen(
-            configs,
-            "thumbnail",
-            text,
-            image_width=image_width,
-            image_height=image_height,
-        )
-
-    return thumbnail
+    return call_backends(
+        "image",
+        "thumbnail",
+        api_provider,
+        text,
+        image_width=image_width,
+        image_height=image_height,
+    )
+
+
+async def agenerate_thumbnail(
+    text: str,
+    image_width: int = 512,
+    image_height: int = 512,
+    api_provider: APIProviders = APIProviders.STABILITYAI,
+) -> str:
+    return await acall_backends(
+        "image",
+        "thumbnail",
+        api_provider,
+        text,
+        image_width=image_width,
+        image_height=image_height,
+    )
+
+
+def _get_batch_concurrency() -> int:
+    return (
+        getattr(settings, "AI_API_SETTINGS", {})
+        .get("stability_ai", {})
+        .get("batch_concurrency", DEFAULT_BATCH_CONCURRENCY)
+    )
+
+
+def generate_thumbnails(
+    texts: list[str],
+    image_width: int = 512,
+    image_height: int = 512,
+    api_provider: APIProviders = APIProviders.STABILITYAI,
+) -> list[Any]:
+    """
+    Thumbnails of many texts, in the order of the texts (None where none was
+    generated). Distinct texts are generated concurrently, sharing the gRPC channels
+    of the engine, and identical texts only once. A filtered image is retried
+    without holding up the other texts.
+    """
+    distinct_texts = list(dict.fromkeys(texts))
+    if len(distinct_texts) == 0:
+        return []
+
+    def generate(text: str) -> Any:
+        try:
+            return generate_thumbnail(
+                text, image_width, image_height, api_provider=api_provider
+            )
+        finally:
+            # Every thread holds its own connection, e.g. of a DatabaseCache
+            connections.close_all()
+
+    with ThreadPoolExecutor(
+        max_workers=min(_get_batch_concurrency(), len(distinct_texts))
+    ) as executor:
+        # Deadline context vars are not inherited by pool threads
+        futures = {
+            text: executor.submit(contextvars.copy_context().run, generate, text)
+            for text in distinct_texts
+        }
+        thumbnails = {text: future.result() for text, future in futures.items()}
+    return _map_thumbnails(texts, thumbnails)
+
+
+async def agenerate_thumbnails(
+    texts: list[str],
+    image_width: int = 512,
+    image_height: int = 512,
+    api_provider: APIProviders = APIProviders.STABILITYAI,
+) -> list[Any]:
+    """
+    Async counterpart of generate_thumbnails()
+    """
+    distinct_texts = list(dict.fromkeys(texts))
+    semaphore = asyncio.Semaphore(_get_batch_concurrency())
+
+    async def generate(text: str) -> Any:
+        async with semaphore:
+            return await agenerate_thumbnail(
+                text, image_width, image_height, api_provider=api_provider
+            )
+
+    thumbnails = await asyncio.gather(*[generate(text) for text in distinct_texts])
+    return _map_thumbnails(texts, dict(zip(distinct_texts, thumbnails)))
+
+
+def _map_thumbnails(texts: list[str], thumbnails: dict[str, Any]) -> list[Any]:
+    # Rows sharing a text get their own buffer
+    results, mapped = [], set()
+    for text in texts:
+        thumbnail = thumbnails[text]
+        if thumbnail is not None and text in mapped:
+            thumbnail = io.BytesIO(thumbnail.getvalue())
+        mapped.add(text)
+        results.append(thumbnail)
+    return results
+
+
+register_backend(
+    "image",
+    "thumbnail",
+    APIProviders.STABILITYAI,
+    _stabilityai_thumbnail,
+    _astabilityai_thumbnail,
+)
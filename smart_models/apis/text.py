@@ -1,13 +1,42 @@
-from typing import Any
+import asyncio
+import contextvars
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Iterator, Union
 
 import openai
+from asgiref.sync import sync_to_async
 from django.apps import apps
 from django.conf import settings
+from django.db import connections
 
 from ..fields import APIProviders
-from ._configs import get_task_configs
+from ._cache import get_result_cache, is_cache_miss
+from ._clients import arun_openai_call, configure_openai, get_openai_timeout
+from ._configs import aget_task_configs, get_task_configs
+from ._language import get_original_language, is_target_language
+from ._limits import acall_with_limits, call_with_limits, estimate_tokens
+from ._providers import (acall_backends, call_backends, get_task_providers,
+                         register_backend)
+from ._singleflight import asingle_flight, make_flight_key, single_flight
+from ._spelling import (DEFAULT_MAX_EDIT_DISTANCE, DEFAULT_PREFIX_LENGTH,
+                        correct_spelling, get_spelling_index)
+from ._tokens import count_tokens, split_text
 
-openai.api_key = settings.AI_API_SETTINGS["openai"]["key"]
+configure_openai()
+
+DEFAULT_MAX_TOKENS = 4096
+DEFAULT_CHUNK_CONCURRENCY = 4
+MAP_REDUCE_TASKS = ("summarize", "generate_title")
+OPENAI_TEXT_TASKS = (
+    "spell_correct",
+    "translate",
+    "summarize",
+    "emojify",
+    "generate_title",
+)
+LOCAL_TEXT_TASKS = ("spell_correct",)
 
 
 def _parse_openai_chat_prompts(
@@ -16,6 +45,7 @@ def _parse_openai_chat_prompts(
     target_language: str = None,
     task: str = "translate",
     role: str = "system",
+    result_format_rules: bool = True,
 ) -> str:
     parsed_prompt = None
     if task != "translate":
@@ -30,7 +60,7 @@ def _parse_openai_chat_prompts(
             .replace("language_2", target_language.capitalize())
         )
 
-    if role == "system":
+    if role == "system" and result_format_rules:
         return parsed_prompt + task_configs["result_format_rules"]
 
     return parsed_prompt
@@ -46,22 +76,44 @@ def _postprocess_result(result: str, default_result_key: str) -> str:
     return result
 
 
-def openai_chat(model: str, messages: list[dict], default_result_key: str = "") -> str:
-    response = openai.ChatCompletion.create(model=model, messages=messages)
+def _openai_chat_completion(model: str, messages: list[dict], task: str = None) -> str:
+    response = call_with_limits(
+        APIProviders.OPENAI,
+        model,
+        # Timeouts are computed per attempt, so that retries respect the deadline
+        lambda: openai.ChatCompletion.create(
+            model=model, messages=messages, request_timeout=get_openai_timeout(task)
+        ),
+        tokens=estimate_tokens(*[message["content"] for message in messages]),
+        task=task,
+    )
+    return response.choices[0].message.content
+
+
+def _get_result_lines(content: str) -> str:
+    # Results of multi paragraph texts span several lines after "Result:"
+    if "Result:" in content:
+        return content[content.rfind("Result:") :].strip()
+    return content.split("\n")[-1].strip()
+
+
+def openai_chat(
+    model: str, messages: list[dict], default_result_key: str = "", task: str = None
+) -> str:
     return _postprocess_result(
-        response.choices[0].message.content.split("\n")[-1].strip(), default_result_key
+        _get_result_lines(_openai_chat_completion(model, messages, task=task)),
+        default_result_key,
     )
 
 
-def resolve_openai_text_calls(
+def _build_openai_text_messages(
     configs: Any,
     original_text: str,
     task: str,
     target_language: str = None,
     max_title_length: int = 3,
-) -> str:
-    # TODO: Identify original language automatically
-    original_language = "english"
+) -> list[dict]:
+    original_language = get_original_language(original_text)
     user_message = _parse_openai_chat_prompts(
         configs.configurations["tasks"][task],
         original_language=original_language,
@@ -79,87 +131,1591 @@ def resolve_openai_text_calls(
         task=task,
         role="system",
     )
-    messages = [
+    return [
         {"role": "system", "content": system_message},
         {"role": "user", "content": user_message},
     ]
 
-    result_text = openai_chat(
+
+def _get_result_cache_key(
+    result_cache: Any, configs: Any, task: str, messages: list[dict]
+) -> str:
+    return result_cache.make_key(
+        task,
+        configs.provider,
+        configs.configurations["model"],
+        *[message["content"] for message in messages],
+    )
+
+
+def _get_flight_key(configs: Any, task: str, messages: list[dict]) -> str:
+    return make_flight_key(
+        task,
+        configs.provider,
         configs.configurations["model"],
-        messages,
-        configs.configurations["tasks"][task]["default_result_key"],
+        *[message["content"] for message in messages],
+    )
+
+
+def _resolve_openai_text_call(
+    configs: Any,
+    original_text: str,
+    task: str,
+    target_language: str = None,
+    max_title_length: int = 3,
+) -> str:
+    messages = _build_openai_text_messages(
+        configs,
+        original_text,
+        task,
+        target_language=target_language,
+        max_title_length=max_title_length,
     )
+
+    result_cache = get_result_cache()
+    cache_key = None
+    result_text = None
+    if result_cache is not None:
+        cache_key = _get_result_cache_key(result_cache, configs, task, messages)
+        result_text = result_cache.get(cache_key)
+
+    if result_cache is None or is_cache_miss(result_text):
+
+        def call() -> str:
+            result = openai_chat(
+                configs.configurations["model"],
+                messages,
+                configs.configurations["tasks"][task]["default_result_key"],
+                task=task,
+            )
+            if result_cache is not None:
+                result_cache.set(cache_key, result)
+            return result
+
+        result_text = single_flight(
+            _get_flight_key(configs, task, messages),
+            call,
+            lookup=(lambda: result_cache.peek(cache_key)) if result_cache else None,
+        )
+
     if result_text is None:
         result_text = original_text
 
     return result_text
 
 
+def _get_chunk_tokens(configs: Any, task: str) -> int:
+    """
+    Token budget of the text sent in one call, "chunk_tokens" of the configuration or
+    half of "max_tokens" left after the prompt, as results are about as long as the text
+    """
+    chunk_tokens = configs.configurations.get("chunk_tokens")
+    if chunk_tokens is None:
+        task_configs = configs.configurations["tasks"][task]
+        prompt_tokens = count_tokens(
+            task_configs["system"]
+            + task_configs["result_format_rules"]
+            + task_configs["user"]
+        )
+        chunk_tokens = (
+            configs.configurations.get("max_tokens", DEFAULT_MAX_TOKENS) - prompt_tokens
+        ) // 2
+    return chunk_tokens
+
+
+def _get_chunk_concurrency() -> int:
+    return (
+        getattr(settings, "AI_API_SETTINGS", {})
+        .get("openai", {})
+        .get("chunk_concurrency", DEFAULT_CHUNK_CONCURRENCY)
+    )
+
+
+def _get_map_task(configs: Any, task: str) -> str:
+    # Chunks of long texts are summarized before generating the title/summary of the whole
+    return "summarize" if "summarize" in configs.configurations["tasks"] else task
+
+
+def _get_reduce_text(results: list[str], original_text: str, chunk_tokens: int) -> str:
+    reduce_text = "\n\n".join(results)
+    if len(reduce_text) >= len(original_text):
+        # The chunks were not shortened, reduce what fits into a single call
+        reduce_text = split_text(reduce_text, chunk_tokens)[0]
+    return reduce_text
+
+
+def _get_chunk_whitespace(chunk: str) -> tuple[str, str]:
+    return chunk[: len(chunk) - len(chunk.lstrip())], chunk[len(chunk.rstrip()) :]
+
+
+def _stitch_chunks(chunks: list[str], results: list[str]) -> str:
+    # Keeps the whitespace around every chunk, e.g. paragraph breaks
+    stitched = []
+    for chunk, result in zip(chunks, results):
+        leading, trailing = _get_chunk_whitespace(chunk)
+        stitched.append(leading + result + trailing)
+    return "".join(stitched)
+
+
+def _map_text_chunks(
+    configs: Any,
+    chunks: list[str],
+    task: str,
+    target_language: str = None,
+    max_title_length: int = 3,
+) -> list[str]:
+    def resolve_chunk(chunk: str) -> str:
+        try:
+            return _resolve_openai_text_call(
+                configs,
+                chunk.strip(),
+                task,
+                target_language=target_language,
+                max_title_length=max_title_length,
+            )
+        finally:
+            # Every thread holds its own connection, e.g. of a DatabaseCache
+            connections.close_all()
+
+    with ThreadPoolExecutor(
+        max_workers=min(_get_chunk_concurrency(), len(chunks))
+    ) as executor:
+        # Deadline and task context vars are not inherited by pool threads
+        futures = [
+            executor.submit(contextvars.copy_context().run, resolve_chunk, chunk)
+            for chunk in chunks
+        ]
+        return [future.result() for future in futures]
+
+
+def resolve_openai_text_calls(
+    configs: Any,
+    original_text: str,
+    task: str,
+    target_language: str = None,
+    max_title_length: int = 3,
+) -> str:
+    """
+    Texts longer than the token budget of a call are split on paragraph/sentence
+    boundaries. Chunks are processed concurrently and stitched back in order, summaries
+    and titles are generated from the summaries of the chunks (map reduce).
+    """
+    chunk_tokens = _get_chunk_tokens(configs, task)
+    chunks = split_text(original_text, chunk_tokens)
+    if len(chunks) == 1:
+        return _resolve_openai_text_call(
+            configs,
+            original_text,
+            task,
+            target_language=target_language,
+            max_title_length=max_title_length,
+        )
+
+    if task in MAP_REDUCE_TASKS:
+        results = _map_text_chunks(configs, chunks, _get_map_task(configs, task))
+        return resolve_openai_text_calls(
+            configs,
+            _get_reduce_text(results, original_text, chunk_tokens),
+            task,
+            target_language=target_language,
+            max_title_length=max_title_length,
+        )
+
+    results = _map_text_chunks(
+        configs,
+        chunks,
+        task,
+        target_language=target_language,
+        max_title_length=max_title_length,
+    )
+    return _stitch_chunks(chunks, results)
+
+
+def _load_json_result(content: str) -> Any:
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.strip("`").strip()
+        if content.lower().startswith("json"):
+            content = content[4:]
+    try:
+        return json.loads(content)
+    except ValueError:
+        return None
+
+
+def _parse_openai_batch_result(
+    content: str, items_count: int, default_result_key: str
+) -> Union[list, None]:
+    results = _load_json_result(content)
+
+    if (
+        not isinstance(results, list)
+        or len(results) != items_count
+        or not all(isinstance(result, str) for result in results)
+    ):
+        return None
+
+    return [
+        None if default_result_key.lower() in result.lower() else result.strip()
+        for result in results
+    ]
+
+
+def _openai_chat_batch(
+    configs: Any,
+    original_texts: list[str],
+    task: str,
+    target_language: str = None,
+    max_title_length: int = 3,
+) -> Union[list, None]:
+    """
+    Packs several texts into one chat request and asks for a JSON array of results.
+    Returns None when the response cannot be mapped back to the texts.
+    """
+    task_configs = configs.configurations["tasks"][task]
+    default_result_key = task_configs["default_result_key"]
+    original_language = get_original_language("\n".join(original_texts))
+    system_message = _parse_openai_chat_prompts(
+        task_configs,
+        original_language=original_language,
+        target_language=target_language,
+        task=task,
+        role="system",
+        result_format_rules=False,
+    ) + (
+        "Rules for formatting result:\n"
+        "Rule 1: The input is a JSON array of texts, process every text independently\n"
+        "Rule 2: Remember to return only a JSON array of strings with one result per text, in the same order\n"
+        f"Rule 3: Remember to return '{default_result_key}' as the result of a text when no result is found\n"
+        "Rule 4: Remember to not add any explanation to the results"
+    )
+    instruction = _parse_openai_chat_prompts(
+        task_configs,
+        original_language=original_language,
+        target_language=target_language,
+        task=task,
+        role="user",
+    )
+    instruction = instruction.split("\nText:")[0].replace(
+        "the following text", "each of the following texts"
+    )
+    if task == "generate_title":
+        instruction = instruction.replace("max_title_length", str(max_title_length))
+    messages = [
+        {"role": "system", "content": system_message},
+        {
+            "role": "user",
+            "content": instruction
+            + "\nTexts: "
+            + json.dumps(original_texts, ensure_ascii=False)
+            + "\nResults: ",
+        },
+    ]
+
+    return _parse_openai_batch_result(
+        _openai_chat_completion(configs.configurations["model"], messages, task=task),
+        len(original_texts),
+        default_result_key,
+    )
+
+
+def resolve_openai_text_calls_batch(
+    configs: Any,
+    original_texts: list[str],
+    task: str,
+    target_language: str = None,
+    max_title_length: int = 3,
+    max_batch_chars: int = 6000,
+) -> list[str]:
+    """
+    Batched counterpart of resolve_openai_text_calls. Short texts are packed into as few
+    chat requests as possible (bounded by max_batch_chars), long texts and batches whose
+    response cannot be parsed fall back to one request per text.
+    """
+    results = [None] * len(original_texts)
+    result_cache = get_result_cache()
+    cache_keys = [None] * len(original_texts)
+    pending = []
+    for i, original_text in enumerate(original_texts):
+        if result_cache is not None:
+            cache_keys[i] = _get_result_cache_key(
+                result_cache,
+                configs,
+                task,
+                _build_openai_text_messages(
+                    configs,
+                    original_text,
+                    task,
+                    target_language=target_language,
+                    max_title_length=max_title_length,
+                ),
+            )
+            cached_text = result_cache.get(cache_keys[i])
+            if not is_cache_miss(cached_text):
+                results[i] = original_text if cached_text is None else cached_text
+                continue
+        pending.append(i)
+
+    packs, pack, pack_chars = [], [], 0
+    for i in pending:
+        if len(original_texts[i]) > max_batch_chars:
+            packs.append([i])
+            continue
+        if len(pack) != 0 and pack_chars + len(original_texts[i]) > max_batch_chars:
+            packs.append(pack)
+            pack, pack_chars = [], 0
+        pack.append(i)
+        pack_chars += len(original_texts[i])
+    if len(pack) != 0:
+        packs.append(pack)
+
+    for pack in packs:
+        pack_results = None
+        if len(pack) > 1:
+            pack_results = _openai_chat_batch(
+                configs,
+                [original_texts[i] for i in pack],
+                task,
+                target_language=target_language,
+                max_title_length=max_title_length,
+            )
+
+        if pack_results is None:
+            for i in pack:
+                results[i] = resolve_openai_text_calls(
+                    configs,
+                    original_texts[i],
+                    task,
+                    target_language=target_language,
+                    max_title_length=max_title_length,
+                )
+            continue
+
+        for i, result_text in zip(pack, pack_results):
+            if result_cache is not None:
+                result_cache.set(cache_keys[i], result_text)
+            results[i] = original_texts[i] if result_text is None else result_text
+
+    return results
+
+
+def _build_openai_fused_messages(
+    configs: Any,
+    original_text: str,
+    tasks: list[str],
+    target_language: str = None,
+    max_title_length: int = 3,
+) -> list[dict]:
+    original_language = get_original_language(original_text)
+    steps = []
+    for i, task in enumerate(tasks):
+        task_configs = configs.configurations["tasks"][task]
+        instruction = _parse_openai_chat_prompts(
+            task_configs,
+            original_language=original_language,
+            target_language=target_language,
+            task=task,
+            role="user",
+        ).split("\nText:")[0]
+        if task == "generate_title":
+            instruction = instruction.replace("max_title_length", str(max_title_length))
+        steps.append(
+            f"Step {i + 1} ({task}): {instruction.replace('the following text', 'the text').rstrip(':')}. "
+            f"Return '{task_configs['default_result_key']}' when there is no result for this step"
+        )
+
+    system_message = (
+        "You are a helpful assistant that processes text in several steps. "
+        "Every step works on the result of the previous step.\n"
+        "Rules for formatting result:\n"
+        "Rule 1: Remember to return only a JSON object with the step names as keys and the result of every step as values\n"
+        "Rule 2: Remember to not add any extra content other than the actual result\n"
+        "Rule 3: Remember to not add any explanation to the Result"
+    )
+    user_message = "Steps:\n" + "\n".join(steps) + f"\nText: {original_text}\nResult: "
+    return [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": user_message},
+    ]
+
+
+def _parse_openai_fused_result(
+    content: str, configs: Any, original_text: str, tasks: list[str]
+) -> Union[str, None]:
+    results = _load_json_result(content)
+    if not isinstance(results, dict) or not all(
+        isinstance(results.get(task), str) for task in tasks
+    ):
+        return None
+
+    # A step without result leaves the text of the previous step unchanged, like the
+    # per task chain does
+    processed_text = original_text
+    for task in tasks:
+        default_result_key = configs.configurations["tasks"][task]["default_result_key"]
+        if default_result_key.lower() not in results[task].lower():
+            processed_text = results[task].strip()
+    return processed_text
+
+
+def resolve_openai_fused_text_calls(
+    configs: Any,
+    original_text: str,
+    tasks: list[str],
+    target_language: str = None,
+    max_title_length: int = 3,
+) -> Union[str, None]:
+    """
+    Runs all tasks in one chat request asking for a JSON object with the result of every
+    step. Returns None when the response cannot be validated.
+    """
+    messages = _build_openai_fused_messages(
+        configs,
+        original_text,
+        tasks,
+        target_language=target_language,
+        max_title_length=max_title_length,
+    )
+
+    result_cache = get_result_cache()
+    cache_key = None
+    if result_cache is not None:
+        cache_key = _get_result_cache_key(
+            result_cache, configs, "+".join(tasks), messages
+        )
+        result_text = result_cache.get(cache_key)
+        if not is_cache_miss(result_text):
+            return result_text
+
+    def call() -> Union[str, None]:
+        result = _parse_openai_fused_result(
+            _openai_chat_completion(
+                configs.configurations["model"], messages, task="+".join(tasks)
+            ),
+            configs,
+            original_text,
+            tasks,
+        )
+        if result_cache is not None and result is not None:
+            result_cache.set(cache_key, result)
+        return result
+
+    return single_flight(
+        _get_flight_key(configs, "+".join(tasks), messages),
+        call,
+        lookup=(lambda: result_cache.peek(cache_key)) if result_cache else None,
+    )
+
+
+def _resolve_local_spell_correct(configs: Any, original_text: str) -> tuple[str, bool]:
+    """
+    Corrects spelling with the local symmetric delete index. Returns the corrected text
+    and whether it has to be escalated to the provider of "escalate_to": "suspicious"
+    escalates texts with any unknown word (the local index only pre-screens),
+    "unresolved" only texts with unknown words the index has no correction for.
+    """
+    task_configs = configs.configurations["tasks"]["spell_correct"]
+    max_edit_distance = configs.configurations.get(
+        "max_edit_distance", DEFAULT_MAX_EDIT_DISTANCE
+    )
+    corrected_text, suspicious, unresolved = correct_spelling(
+        get_spelling_index(
+            max_edit_distance,
+            configs.configurations.get("prefix_length", DEFAULT_PREFIX_LENGTH),
+        ),
+        original_text,
+        max_edit_distance,
+        ignore_capitalized=task_configs.get("ignore_capitalized", True),
+    )
+    escalate = task_configs.get("escalate", "suspicious")
+    if task_configs.get("escalate_to") is None:
+        return corrected_text, False
+    if escalate == "suspicious":
+        return corrected_text, len(suspicious) != 0
+    if escalate == "unresolved":
+        return corrected_text, len(unresolved) != 0
+    return corrected_text, False
+
+
+def _has_fallbacks(tasks: list[str], api_provider: APIProviders) -> bool:
+    return any(
+        len(get_task_providers("text", task, api_provider)) > 1 for task in tasks
+    )
+
+
+def _local_spell_correct(configs: Any, original_text: str) -> str:
+    corrected_text, escalate = _resolve_local_spell_correct(configs, original_text)
+    if escalate:
+        corrected_text = spell_correct_text(
+            corrected_text,
+            api_provider=configs.configurations["tasks"]["spell_correct"][
+                "escalate_to"
+            ],
+        )
+    return corrected_text
+
+
+def _get_task_provider(task: str, api_provider: APIProviders) -> APIProviders:
+    # The local provider only corrects spelling, other tasks go to the provider it
+    # escalates to
+    if api_provider != APIProviders.LOCAL or task in LOCAL_TEXT_TASKS:
+        return api_provider
+    configs = get_task_configs("spell_correct", "text", APIProviders.LOCAL)
+    return (
+        configs.configurations["tasks"]["spell_correct"].get("escalate_to")
+        or APIProviders.OPENAI
+    )
+
+
 def translate_text(
     original_text: str,
     target_language: str,
     api_provider: APIProviders = APIProviders.OPENAI,
 ) -> str:
-    configs = get_task_configs("translate", "text", api_provider)
-    translated_text = None
-    if api_provider == APIProviders.OPENAI and configs is not None:
-        translated_text = resolve_openai_text_calls(
-            configs, original_text, "translate", target_language=target_language
-        )
-
-    return translated_text
+    if is_target_language(original_text, target_language):
+        return original_text
+    return call_backends(
+        "text",
+        "translate",
+        api_provider,
+        original_text,
+        target_language=target_language,
+    )
 
 
 def summarize_text(
     original_text: str, api_provider: APIProviders = APIProviders.OPENAI
 ) -> str:
-    configs = get_task_configs("summarize", "text", api_provider)
-    summarized_text = None
-    if api_provider == APIProviders.OPENAI and configs is not None:
-        summarized_text = resolve_openai_text_calls(
-            configs, original_text, task="summarize"
-        )
-    return summarized_text
+    return call_backends("text", "summarize", api_provider, original_text)
 
 
 def spell_correct_text(
     original_text: str, api_provider: APIProviders = APIProviders.OPENAI
 ) -> str:
-    configs = get_task_configs("spell_correct", "text", api_provider)
-    corrected_text = None
-    if api_provider == APIProviders.OPENAI and configs is not None:
-        corrected_text = resolve_openai_text_calls(
-            configs, original_text, task="spell_correct"
-        )
-    return corrected_text
+    return call_backends("text", "spell_correct", api_provider, original_text)
 
 
 def emojify_text(
     original_text: str, api_provider: APIProviders = APIProviders.OPENAI
 ) -> str:
-    configs = get_task_configs("emojify", "text", api_provider)
-    corrected_text = None
+    return call_backends("text", "emojify", api_provider, original_text)
+
+
+def generate_title(
+    original_text: str,
+    max_title_length: int,
+    api_provider: APIProviders = APIProviders.OPENAI,
+) -> str:
+    if max_title_length <= 2:
+        raise Exception("max_title_length should be greater than or equal to three")
+    return call_backends(
+        "text",
+        "generate_title",
+        api_provider,
+        original_text,
+        max_title_length=max_title_length,
+    )
+
+
+def process_texts(
+    original_texts: list[str],
+    task: str,
+    api_provider: APIProviders = APIProviders.OPENAI,
+    target_language: str = None,
+    max_title_length: int = 100,
+) -> list[str]:
+    """
+    Runs one text task over many texts, packing them into as few requests as possible
+    """
+    if task == "translate" and target_language is None:
+        raise Exception(
+            "value for 'target_language' has to specified for task 'translate'"
+        )
+    if task == "generate_title" and max_title_length <= 2:
+        raise Exception("max_title_length should be greater than or equal to three")
+    if task == "translate":
+        # Texts already written in the target language are returned as they are
+        translated = [
+            i
+            for i, original_text in enumerate(original_texts)
+            if not is_target_language(original_text, target_language)
+        ]
+        if len(translated) != len(original_texts):
+            processed_texts = list(original_texts)
+            if len(translated) != 0:
+                translated_texts = process_texts(
+                    [original_texts[i] for i in translated],
+                    task,
+                    api_provider=api_provider,
+                    target_language=target_language,
+                )
+                for i, translated_text in zip(translated, translated_texts):
+                    processed_texts[i] = translated_text
+            return processed_texts
+    api_provider = _get_task_provider(task, api_provider)
+    configs = get_task_configs(task, "text", api_provider)
+    if api_provider == APIProviders.OPENAI and configs is not None:
+        try:
+            processed_texts = resolve_openai_text_calls_batch(
+                configs,
+                original_texts,
+                task,
+                target_language=target_language,
+                max_title_length=max_title_length,
+            )
+        except Exception:
+            # Text by text requests fail over to the other backends of the task
+            if not _has_fallbacks([task], api_provider):
+                raise
+            processed_texts = [
+                _run_text_task(
+                    original_text,
+                    task,
+                    api_provider=api_provider,
+                    target_language=target_language,
+                    max_title_length=max_title_length,
+                )
+                for original_text in original_texts
+            ]
+    elif api_provider == APIProviders.LOCAL and configs is not None:
+        processed_texts, escalated = [], []
+        for i, original_text in enumerate(original_texts):
+            corrected_text, escalate = _resolve_local_spell_correct(
+                configs, original_text
+            )
+            processed_texts.append(corrected_text)
+            if escalate:
+                escalated.append(i)
+        if len(escalated) != 0:
+            escalated_texts = process_texts(
+                [processed_texts[i] for i in escalated],
+                task,
+                api_provider=configs.configurations["tasks"][task]["escalate_to"],
+            )
+            for i, escalated_text in zip(escalated, escalated_texts):
+                processed_texts[i] = escalated_text
+    else:
+        # Backends of other providers process the texts one by one
+        processed_texts = [
+            _run_text_task(
+                original_text,
+                task,
+                api_provider=api_provider,
+                target_language=target_language,
+                max_title_length=max_title_length,
+            )
+            for original_text in original_texts
+        ]
+    return processed_texts
+
+
+def _run_text_task(
+    original_text: str,
+    task: str,
+    api_provider: APIProviders = APIProviders.OPENAI,
+    target_language: str = None,
+    max_title_length: int = 100,
+) -> str:
+    api_provider = _get_task_provider(task, api_provider)
+    if task == "spell_correct":
+        return spell_correct_text(original_text, api_provider=api_provider)
+    if task == "generate_title":
+        return generate_title(
+            original_text, max_title_length=max_title_length, api_provider=api_provider
+        )
+    if task == "summarize":
+        return summarize_text(original_text, api_provider=api_provider)
+    if task == "translate":
+        return translate_text(
+            original_text, target_language=target_language, api_provider=api_provider
+        )
+    if task == "emojify":
+        return emojify_text(original_text, api_provider=api_provider)
+    raise Exception(f"text task '{task}' is not supported")
+
+
+def process_text_pipeline(
+    original_text: str,
+    tasks: list[str],
+    api_provider: APIProviders = APIProviders.OPENAI,
+    target_language: str = None,
+    max_title_length: int = 100,
+    fused: bool = False,
+) -> str:
+    """
+    Runs tasks in order, each on the result of the previous one.
+    fused: bool, runs all tasks in one request and falls back to one request per task
+    when the response cannot be parsed
+    """
+    if "translate" in tasks and is_target_language(original_text, target_language):
+        # Spell correction, summaries and emojis keep the language of the text
+        tasks = [task for task in tasks if task != "translate"]
+    if fused and len(tasks) > 1 and api_provider == APIProviders.OPENAI:
+        if "generate_title" in tasks and max_title_length <= 2:
+            raise Exception("max_title_length should be greater than or equal to three")
+        configs = get_task_configs(tasks[0], "text", api_provider)
+        # Texts longer than a single call run task by task, which chunks them
+        if all(
+            task in configs.configurations["tasks"] for task in tasks
+        ) and count_tokens(original_text) <= _get_chunk_tokens(configs, tasks[0]):
+            try:
+                processed_text = resolve_openai_fused_text_calls(
+                    configs,
+                    original_text,
+                    tasks,
+                    target_language=target_language,
+                    max_title_length=max_title_length,
+                )
+            except Exception:
+                # Task by task requests fail over to the other backends of the tasks
+                if not _has_fallbacks(tasks, api_provider):
+                    raise
+                processed_text = None
+            if processed_text is not None:
+                return processed_text
+
+    processed_text = original_text
+    for task in tasks:
+        processed_text = _run_text_task(
+            processed_text,
+            task,
+            api_provider=api_provider,
+            target_language=target_language,
+            max_title_length=max_title_length,
+        )
+    return processed_text
+
+
+_RESULT_LABELS = ("Text:", "Result:")
+
+
+class _ResultStream:
+    """
+    Incremental counterpart of _get_result_lines() and _postprocess_result(). Content up
+    to "Result:" is dropped and whitespace around the result is held back, so that the
+    segments add up to the result of a non streaming call. Responses without labels are
+    streamed whole. A result matching default_result_key is never emitted.
+    """
+
+    def __init__(self, default_result_key: str = "") -> None:
+        self.default_result_key = default_result_key.lower()
+        self.content = ""
+        self.emitted = ""
+        self.result = None
+        self._start = None
+
+    def _find_start(self) -> Union[int, None]:
+        marker = self.content.find("Result:")
+        if marker != -1:
+            return marker + len("Result:")
+        stripped = self.content.lstrip()
+        if any(label.startswith(stripped[: len(label)]) for label in _RESULT_LABELS):
+            # Too short to tell, or the text is echoed before "Result:"
+            return None
+        return 0
+
+    def _is_default_result(self, result: str) -> bool:
+        if not self.default_result_key or self.emitted:
+            return False
+        result = result.strip().strip("'\"").lower()
+        return self.default_result_key.startswith(result) or (
+            self.default_result_key in result
+        )
+
+    def feed(self, delta: str) -> str:
+        self.content += delta
+        if self._start is None:
+            self._start = self._find_start()
+            if self._start is None:
+                return ""
+        result = self.content[self._start :].strip()
+        if self._is_default_result(result):
+            return ""
+        segment = result[len(self.emitted) :]
+        self.emitted = result
+        return segment
+
+    def close(self) -> str:
+        if self._start is None:
+            result = self.content.split("\n")[-1].strip()
+        else:
+            result = self.content[self._start :].strip()
+        if (
+            self.default_result_key
+            and not self.emitted
+            and self.default_result_key in result.lower()
+        ):
+            return ""
+        self.result = result
+        segment = result[len(self.emitted) :]
+        self.emitted = result
+        return segment
+
+
+def _openai_chat_stream(
+    model: str, messages: list[dict], task: str = None
+) -> Iterator[str]:
+    # Retried until the response starts, an interrupted stream raises
+    response = call_with_limits(
+        APIProviders.OPENAI,
+        model,
+        lambda: openai.ChatCompletion.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            request_timeout=get_openai_timeout(task),
+        ),
+        tokens=estimate_tokens(*[message["content"] for message in messages]),
+        task=task,
+    )
+    for chunk in response:
+        content = chunk.choices[0].delta.get("content")
+        if content:
+            yield content
+
+
+def _stream_openai_text_call(
+    configs: Any,
+    original_text: str,
+    task: str,
+    target_language: str = None,
+    max_title_length: int = 3,
+) -> Iterator[str]:
+    messages = _build_openai_text_messages(
+        configs,
+        original_text,
+        task,
+        target_language=target_language,
+        max_title_length=max_title_length,
+    )
+
+    result_cache = get_result_cache()
+    cache_key = None
+    if result_cache is not None:
+        cache_key = _get_result_cache_key(result_cache, configs, task, messages)
+        result_text = result_cache.get(cache_key)
+        if not is_cache_miss(result_text):
+            yield original_text if result_text is None else result_text
+            return
+
+    result_stream = _ResultStream(
+        configs.configurations["tasks"][task]["default_result_key"]
+    )
+    for content in _openai_chat_stream(
+        configs.configurations["model"], messages, task=task
+    ):
+        segment = result_stream.feed(content)
+        if segment:
+            yield segment
+    segment = result_stream.close()
+    if segment:
+        yield segment
+
+    # Only complete results are cached
+    if result_cache is not None:
+        result_cache.set(cache_key, result_stream.result)
+    if result_stream.result is None:
+        yield original_text
+
+
+def _stream_openai_text_calls(
+    configs: Any,
+    original_text: str,
+    task: str,
+    target_language: str = None,
+    max_title_length: int = 3,
+) -> Iterator[str]:
+    """
+    Streaming counterpart of resolve_openai_text_calls(). Chunks are streamed one after
+    the other, summaries and titles stream the reduce call.
+    """
+    chunk_tokens = _get_chunk_tokens(configs, task)
+    chunks = split_text(original_text, chunk_tokens)
+    if len(chunks) == 1:
+        yield from _stream_openai_text_call(
+            configs,
+            original_text,
+            task,
+            target_language=target_language,
+            max_title_length=max_title_length,
+        )
+        return
+
+    if task in MAP_REDUCE_TASKS:
+        results = _map_text_chunks(configs, chunks, _get_map_task(configs, task))
+        yield from _stream_openai_text_calls(
+            configs,
+            _get_reduce_text(results, original_text, chunk_tokens),
+            task,
+            target_language=target_language,
+            max_title_length=max_title_length,
+        )
+        return
+
+    for chunk in chunks:
+        # Keeps the whitespace around every chunk, as _stitch_chunks() does
+        leading, trailing = _get_chunk_whitespace(chunk)
+        if leading:
+            yield leading
+        yield from _stream_openai_text_call(
+            configs,
+            chunk.strip(),
+            task,
+            target_language=target_language,
+            max_title_length=max_title_length,
+        )
+        if trailing:
+            yield trailing
+
+
+def stream_text(
+    original_text: str,
+    task: str,
+    api_provider: APIProviders = APIProviders.OPENAI,
+    target_language: str = None,
+    max_title_length: int = 100,
+) -> Iterator[str]:
+    """
+    Yields the result of a text task in segments as the provider generates it, e.g. to
+    feed a StreamingHttpResponse. "".join() of the segments is the result.
+    """
+    if task == "translate" and target_language is None:
+        raise Exception(
+            "value for 'target_language' has to specified for task 'translate'"
+        )
+    if task == "generate_title" and max_title_length <= 2:
+        raise Exception("max_title_length should be greater than or equal to three")
+    if task == "translate" and is_target_language(original_text, target_language):
+        yield original_text
+        return
+    api_provider = _get_task_provider(task, api_provider)
+    configs = get_task_configs(task, "text", api_provider)
     if api_provider == APIProviders.OPENAI and configs is not None:
-        corrected_text = resolve_openai_text_calls(
-            configs, original_text, task="emojify"
+        streamed = False
+        try:
+            for segment in _stream_openai_text_calls(
+                configs,
+                original_text,
+                task,
+                target_language=target_language,
+                max_title_length=max_title_length,
+            ):
+                streamed = True
+                yield segment
+        except Exception:
+            # Before the first segment, the other backends of the task can take over
+            if streamed or not _has_fallbacks([task], api_provider):
+                raise
+            yield _run_text_task(
+                original_text,
+                task,
+                api_provider=api_provider,
+                target_language=target_language,
+                max_title_length=max_title_length,
+            )
+    elif api_provider == APIProviders.LOCAL and configs is not None:
+        corrected_text, escalate = _resolve_local_spell_correct(configs, original_text)
+        if escalate:
+            yield from stream_text(
+                corrected_text,
+                task,
+                api_provider=configs.configurations["tasks"][task]["escalate_to"],
+            )
+        else:
+            yield corrected_text
+    else:
+        # Backends of other providers yield the whole result
+        processed_text = _run_text_task(
+            original_text,
+            task,
+            api_provider=api_provider,
+            target_language=target_language,
+            max_title_length=max_title_length,
+        )
+        if processed_text is not None:
+            yield processed_text
+
+
+def stream_text_pipeline(
+    original_text: str,
+    tasks: list[str],
+    api_provider: APIProviders = APIProviders.OPENAI,
+    target_language: str = None,
+    max_title_length: int = 100,
+) -> Iterator[str]:
+    """
+    Runs all tasks but the last one like process_text_pipeline() and streams the last.
+    Without tasks, the text is yielded unchanged like process_text_pipeline() returns it
+    """
+    if len(tasks) == 0:
+        yield original_text
+        return
+    processed_text = process_text_pipeline(
+        original_text,
+        tasks[:-1],
+        api_provider=api_provider,
+        target_language=target_language,
+        max_title_length=max_title_length,
+    )
+    if processed_text is None:
+        return
+    yield from stream_text(
+        processed_text,
+        tasks[-1],
+        api_provider=api_provider,
+        target_language=target_language,
+        max_title_length=max_title_length,
+    )
+
+
+async def _aopenai_chat_completion(
+    model: str, messages: list[dict], task: str = None
+) -> str:
+    response = await acall_with_limits(
+        APIProviders.OPENAI,
+        model,
+        lambda: arun_openai_call(
+            openai.ChatCompletion.acreate(
+                model=model, messages=messages, request_timeout=get_openai_timeout(task)
+            ),
+            task=task,
+        ),
+        tokens=estimate_tokens(*[message["content"] for message in messages]),
+        task=task,
+    )
+    return response.choices[0].message.content
+
+
+async def aopenai_chat(
+    model: str, messages: list[dict], default_result_key: str = "", task: str = None
+) -> str:
+    content = await _aopenai_chat_completion(model, messages, task=task)
+    return _postprocess_result(_get_result_lines(content), default_result_key)
+
+
+async def _aresolve_openai_text_call(
+    configs: Any,
+    original_text: str,
+    task: str,
+    target_language: str = None,
+    max_title_length: int = 3,
+) -> str:
+    messages = _build_openai_text_messages(
+        configs,
+        original_text,
+        task,
+        target_language=target_language,
+        max_title_length=max_title_length,
+    )
+
+    result_cache = get_result_cache()
+    cache_key = None
+    result_text = None
+    if result_cache is not None:
+        cache_key = _get_result_cache_key(result_cache, configs, task, messages)
+        result_text = await result_cache.aget(cache_key)
+
+    if result_cache is None or is_cache_miss(result_text):
+
+        async def call() -> str:
+            result = await aopenai_chat(
+                configs.configurations["model"],
+                messages,
+                configs.configurations["tasks"][task]["default_result_key"],
+                task=task,
+            )
+            if result_cache is not None:
+                await result_cache.aset(cache_key, result)
+            return result
+
+        result_text = await asingle_flight(
+            _get_flight_key(configs, task, messages),
+            call,
+            lookup=(lambda: result_cache.apeek(cache_key)) if result_cache else None,
+        )
+
+    if result_text is None:
+        result_text = original_text
+
+    return result_text
+
+
+async def _amap_text_chunks(
+    configs: Any,
+    chunks: list[str],
+    task: str,
+    target_language: str = None,
+    max_title_length: int = 3,
+) -> list[str]:
+    semaphore = asyncio.Semaphore(_get_chunk_concurrency())
+
+    async def resolve_chunk(chunk: str) -> str:
+        async with semaphore:
+            return await _aresolve_openai_text_call(
+                configs,
+                chunk.strip(),
+                task,
+                target_language=target_language,
+                max_title_length=max_title_length,
+            )
+
+    return await asyncio.gather(*[resolve_chunk(chunk) for chunk in chunks])
+
+
+async def aresolve_openai_text_calls(
+    configs: Any,
+    original_text: str,
+    task: str,
+    target_language: str = None,
+    max_title_length: int = 3,
+) -> str:
+    chunk_tokens = _get_chunk_tokens(configs, task)
+    chunks = split_text(original_text, chunk_tokens)
+    if len(chunks) == 1:
+        return await _aresolve_openai_text_call(
+            configs,
+            original_text,
+            task,
+            target_language=target_language,
+            max_title_length=max_title_length,
+        )
+
+    if task in MAP_REDUCE_TASKS:
+        results = await _amap_text_chunks(configs, chunks, _get_map_task(configs, task))
+        return await aresolve_openai_text_calls(
+            configs,
+            _get_reduce_text(results, original_text, chunk_tokens),
+            task,
+            target_language=target_language,
+            max_title_length=max_title_length,
+        )
+
+    results = await _amap_text_chunks(
+        configs,
+        chunks,
+        task,
+        target_language=target_language,
+        max_title_length=max_title_length,
+    )
+    return _stitch_chunks(chunks, results)
+
+
+async def aresolve_openai_fused_text_calls(
+    configs: Any,
+    original_text: str,
+    tasks: list[str],
+    target_language: str = None,
+    max_title_length: int = 3,
+) -> Union[str, None]:
+    messages = _build_openai_fused_messages(
+        configs,
+        original_text,
+        tasks,
+        target_language=target_language,
+        max_title_length=max_title_length,
+    )
+
+    result_cache = get_result_cache()
+    cache_key = None
+    if result_cache is not None:
+        cache_key = _get_result_cache_key(
+            result_cache, configs, "+".join(tasks), messages
+        )
+        result_text = await result_cache.aget(cache_key)
+        if not is_cache_miss(result_text):
+            return result_text
+
+    async def call() -> Union[str, None]:
+        result = _parse_openai_fused_result(
+            await _aopenai_chat_completion(
+                configs.configurations["model"], messages, task="+".join(tasks)
+            ),
+            configs,
+            original_text,
+            tasks,
+        )
+        if result_cache is not None and result is not None:
+            await result_cache.aset(cache_key, result)
+        return result
+
+    return await asingle_flight(
+        _get_flight_key(configs, "+".join(tasks), messages),
+        call,
+        lookup=(lambda: result_cache.apeek(cache_key)) if result_cache else None,
+    )
+
+
+async def _alocal_spell_correct(configs: Any, original_text: str) -> str:
+    # The index may have to be built on first use
+    corrected_text, escalate = await sync_to_async(_resolve_local_spell_correct)(
+        configs, original_text
+    )
+    if escalate:
+        corrected_text = await aspell_correct_text(
+            corrected_text,
+            api_provider=configs.configurations["tasks"]["spell_correct"][
+                "escalate_to"
+            ],
         )
     return corrected_text
 
 
-def generate_title(
+async def _aget_task_provider(task: str, api_provider: APIProviders) -> APIProviders:
+    if api_provider != APIProviders.LOCAL or task in LOCAL_TEXT_TASKS:
+        return api_provider
+    configs = await aget_task_configs("spell_correct", "text", APIProviders.LOCAL)
+    return (
+        configs.configurations["tasks"]["spell_correct"].get("escalate_to")
+        or APIProviders.OPENAI
+    )
+
+
+async def atranslate_text(
+    original_text: str,
+    target_language: str,
+    api_provider: APIProviders = APIProviders.OPENAI,
+) -> str:
+    if is_target_language(original_text, target_language):
+        return original_text
+    return await acall_backends(
+        "text",
+        "translate",
+        api_provider,
+        original_text,
+        target_language=target_language,
+    )
+
+
+async def asummarize_text(
+    original_text: str, api_provider: APIProviders = APIProviders.OPENAI
+) -> str:
+    return await acall_backends("text", "summarize", api_provider, original_text)
+
+
+async def aspell_correct_text(
+    original_text: str, api_provider: APIProviders = APIProviders.OPENAI
+) -> str:
+    return await acall_backends("text", "spell_correct", api_provider, original_text)
+
+
+async def aemojify_text(
+    original_text: str, api_provider: APIProviders = APIProviders.OPENAI
+) -> str:
+    return await acall_backends("text", "emojify", api_provider, original_text)
+
+
+async def agenerate_title(
     original_text: str,
     max_title_length: int,
     api_provider: APIProviders = APIProviders.OPENAI,
 ) -> str:
     if max_title_length <= 2:
         raise Exception("max_title_length should be greater than or equal to three")
-    configs = get_task_configs("generate_title", "text", api_provider)
-    generated_title = None
-    if api_provider == APIProviders.OPENAI and configs is not None:
-        generated_title = resolve_openai_text_calls(
+    return await acall_backends(
+        "text",
+        "generate_title",
+        api_provider,
+        original_text,
+        max_title_length=max_title_length,
+    )
+
+
+async def _arun_text_task(
+    original_text: str,
+    task: str,
+    api_provider: APIProviders = APIProviders.OPENAI,
+    target_language: str = None,
+    max_title_length: int = 100,
+) -> str:
+    api_provider = await _aget_task_provider(task, api_provider)
+    if task == "spell_correct":
+        return await aspell_correct_text(original_text, api_provider=api_provider)
+    if task == "generate_title":
+        return await agenerate_title(
+            original_text, max_title_length=max_title_length, api_provider=api_provider
+        )
+    if task == "summarize":
+        return await asummarize_text(original_text, api_provider=api_provider)
+    if task == "translate":
+        return await atranslate_text(
+            original_text, target_language=target_language, api_provider=api_provider
+        )
+    if task == "emojify":
+        return await aemojify_text(original_text, api_provider=api_provider)
+    raise Exception(f"text task '{task}' is not supported")
+
+
+async def aprocess_text_pipeline(
+    original_text: str,
+    tasks: list[str],
+    api_provider: APIProviders = APIProviders.OPENAI,
+    target_language: str = None,
+    max_title_length: int = 100,
+    fused: bool = False,
+) -> str:
+    if "translate" in tasks and is_target_language(original_text, target_language):
+        # Spell correction, summaries and emojis keep the language of the text
+        tasks = [task for task in tasks if task != "translate"]
+    if fused and len(tasks) > 1 and api_provider == APIProviders.OPENAI:
+        if "generate_title" in tasks and max_title_length <= 2:
+            raise Exception("max_title_length should be greater than or equal to three")
+        configs = await aget_task_configs(tasks[0], "text", api_provider)
+        # Texts longer than a single call run task by task, which chunks them
+        if all(
+            task in configs.configurations["tasks"] for task in tasks
+        ) and count_tokens(original_text) <= _get_chunk_tokens(configs, tasks[0]):
+            try:
+                processed_text = await aresolve_openai_fused_text_calls(
+                    configs,
+                    original_text,
+                    tasks,
+                    target_language=target_language,
+                    max_title_length=max_title_length,
+                )
+            except Exception:
+                # Task by task requests fail over to the other backends of the tasks
+                if not _has_fallbacks(tasks, api_provider):
+                    raise
+                processed_text = None
+            if processed_text is not None:
+                return processed_text
+
+    processed_text = original_text
+    for task in tasks:
+        processed_text = await _arun_text_task(
+            processed_text,
+            task,
+            api_provider=api_provider,
+            target_language=target_language,
+            max_title_length=max_title_length,
+        )
+    return processed_text
+
+
+async def _aopenai_chat_stream(
+    model: str, messages: list[dict], task: str = None
+) -> AsyncIterator[str]:
+    response = await acall_with_limits(
+        APIProviders.OPENAI,
+        model,
+        lambda: arun_openai_call(
+            openai.ChatCompletion.acreate(
+                model=model,
+                messages=messages,
+                stream=True,
+                request_timeout=get_openai_timeout(task),
+            ),
+            task=task,
+        ),
+        tokens=estimate_tokens(*[message["content"] for message in messages]),
+        task=task,
+    )
+    async for chunk in response:
+        content = chunk.choices[0].delta.get("content")
+        if content:
+            yield content
+
+
+async def _astream_openai_text_call(
+    configs: Any,
+    original_text: str,
+    task: str,
+    target_language: str = None,
+    max_title_length: int = 3,
+) -> AsyncIterator[str]:
+    messages = _build_openai_text_messages(
+        configs,
+        original_text,
+        task,
+        target_language=target_language,
+        max_title_length=max_title_length,
+    )
+
+    result_cache = get_result_cache()
+    cache_key = None
+    if result_cache is not None:
+        cache_key = _get_result_cache_key(result_cache, configs, task, messages)
+        result_text = await result_cache.aget(cache_key)
+        if not is_cache_miss(result_text):
+            yield original_text if result_text is None else result_text
+            return
+
+    result_stream = _ResultStream(
+        configs.configurations["tasks"][task]["default_result_key"]
+    )
+    async for content in _aopenai_chat_stream(
+        configs.configurations["model"], messages, task=task
+    ):
+        segment = result_stream.feed(content)
+        if segment:
+            yield segment
+    segment = result_stream.close()
+    if segment:
+        yield segment
+
+    if result_cache is not None:
+        await result_cache.aset(cache_key, result_stream.result)
+    if result_stream.result is None:
+        yield original_text
+
+
+async def _astream_openai_text_calls(
+    configs: Any,
+    original_text: str,
+    task: str,
+    target_language: str = None,
+    max_title_length: int = 3,
+) -> AsyncIterator[str]:
+    chunk_tokens = _get_chunk_tokens(configs, task)
+    chunks = split_text(original_text, chunk_tokens)
+    if len(chunks) == 1:
+        async for segment in _astream_openai_text_call(
             configs,
             original_text,
-            task="generate_title",
+            task,
+            target_language=target_language,
             max_title_length=max_title_length,
+        ):
+            yield segment
+        return
+
+    if task in MAP_REDUCE_TASKS:
+        results = await _amap_text_chunks(configs, chunks, _get_map_task(configs, task))
+        async for segment in _astream_openai_text_calls(
+            configs,
+            _get_reduce_text(results, original_text, chunk_tokens),
+            task,
+            target_language=target_language,
+            max_title_length=max_title_length,
+        ):
+            yield segment
+        return
+
+    for chunk in chunks:
+        leading, trailing = _get_chunk_whitespace(chunk)
+        if leading:
+            yield leading
+        async for segment in _astream_openai_text_call(
+            configs,
+            chunk.strip(),
+            task,
+            target_language=target_language,
+            max_title_length=max_title_length,
+        ):
+            yield segment
+        if trailing:
+            yield trailing
+
+
+async def astream_text(
+    original_text: str,
+    task: str,
+    api_provider: APIProviders = APIProviders.OPENAI,
+    target_language: str = None,
+    max_title_length: int = 100,
+) -> AsyncIterator[str]:
+    """
+    Async counterpart of stream_text(), e.g. for a StreamingHttpResponse served by ASGI
+    """
+    if task == "translate" and target_language is None:
+        raise Exception(
+            "value for 'target_language' has to specified for task 'translate'"
         )
-    return generated_title
+    if task == "generate_title" and max_title_length <= 2:
+        raise Exception("max_title_length should be greater than or equal to three")
+    if task == "translate" and is_target_language(original_text, target_language):
+        yield original_text
+        return
+    api_provider = await _aget_task_provider(task, api_provider)
+    configs = await aget_task_configs(task, "text", api_provider)
+    if api_provider == APIProviders.OPENAI and configs is not None:
+        streamed = False
+        try:
+            async for segment in _astream_openai_text_calls(
+                configs,
+                original_text,
+                task,
+                target_language=target_language,
+                max_title_length=max_title_length,
+            ):
+                streamed = True
+                yield segment
+        except Exception:
+            if streamed or not _has_fallbacks([task], api_provider):
+                raise
+            yield await _arun_text_task(
+                original_text,
+                task,
+                api_provider=api_provider,
+                target_language=target_language,
+                max_title_length=max_title_length,
+            )
+    elif api_provider == APIProviders.LOCAL and configs is not None:
+        corrected_text, escalate = await sync_to_async(_resolve_local_spell_correct)(
+            configs, original_text
+        )
+        if escalate:
+            async for segment in astream_text(
+                corrected_text,
+                task,
+                api_provider=configs.configurations["tasks"][task]["escalate_to"],
+            ):
+                yield segment
+        else:
+            yield corrected_text
+    else:
+        processed_text = await _arun_text_task(
+            original_text,
+            task,
+            api_provider=api_provider,
+            target_language=target_language,
+            max_title_length=max_title_length,
+        )
+        if processed_text is not None:
+            yield processed_text
+
+
+async def astream_text_pipeline(
+    original_text: str,
+    tasks: list[str],
+    api_provider: APIProviders = APIProviders.OPENAI,
+    target_language: str = None,
+    max_title_length: int = 100,
+) -> AsyncIterator[str]:
+    if len(tasks) == 0:
+        yield original_text
+        return
+    processed_text = await aprocess_text_pipeline(
+        original_text,
+        tasks[:-1],
+        api_provider=api_provider,
+        target_language=target_language,
+        max_title_length=max_title_length,
+    )
+    if processed_text is None:
+        return
+    async for segment in astream_text(
+        processed_text,
+        tasks[-1],
+        api_provider=api_provider,
+        target_language=target_language,
+        max_title_length=max_title_length,
+    ):
+        yield segment
+
+
+for text_task in OPENAI_TEXT_TASKS:
+    register_backend(
+        "text",
+        text_task,
+        APIProviders.OPENAI,
+        partial(resolve_openai_text_calls, task=text_task),
+        partial(aresolve_openai_text_calls, task=text_task),
+    )
+register_backend(
+    "text",
+    "spell_correct",
+    APIProviders.LOCAL,
+    _local_spell_correct,
+    _alocal_spell_correct,
+)
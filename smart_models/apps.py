@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SmartModelsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "smart_models"
+
+    def ready(self) -> None:
+        from . import checks  # noqa: F401
+        from . import signals  # noqa: F401
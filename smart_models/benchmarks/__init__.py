@@ -0,0 +1,4 @@
+"""
+Offline benchmark of smart model saves against local stand-ins of the OpenAI and
+Stability AI APIs, run with `python -m smart_models.benchmarks --help`
+"""
@@ -0,0 +1,346 @@
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import django
+from django.conf import settings
+
+from .servers import FakeBehaviour, FakeOpenAIServer, FakeStabilityServer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCENARIOS = ("text", "image", "audio")
+
+WORDS = (
+    "model field provider latency thumbnail summary article title request "
+    "response server worker database cache token batch queue"
+).split()
+
+
+def _percentile(values: list[float], percentile: float) -> float:
+    # Nearest rank
+    if len(values) == 0:
+        return 0.0
+    values = sorted(values)
+    return values[max(math.ceil(percentile / 100 * len(values)) - 1, 0)]
+
+
+def _peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _make_text(i: int, paragraphs: int) -> str:
+    # Unique per save, so that neither the result cache nor image deduplication hit
+    return "\n\n".join(
+        f"Benchmark {uuid.uuid4().hex} article {i}. "
+        + " ".join(WORDS[(i + j + k) % len(WORDS)] for k in range(60))
+        + "."
+        for j in range(paragraphs)
+    )
+
+
+def _configure(args: argparse.Namespace, workdir: str, openai_server, stability_server):
+    settings.configure(
+        DEBUG=False,
+        SECRET_KEY="smart_models.benchmarks",
+        INSTALLED_APPS=[
+            "django.contrib.contenttypes",
+            "django.contrib.auth",
+            "smart_models",
+            "smart_models.benchmarks",
+        ],
+        DATABASES={
+            "default": {
+                "ENGINE": "django.db.backends.sqlite3",
+                "NAME": os.path.join(workdir, "benchmark.sqlite3"),
+                "OPTIONS": {"timeout": 60},
+            }
+        },
+        MEDIA_ROOT=os.path.join(workdir, "media"),
+        USE_TZ=True,
+        AI_API_SETTINGS={
+            "openai": {
+                "key": "sk-benchmark",
+                "api_base": openai_server.api_base,
+                "pool_size": max(args.concurrency),
+            },
+            "stability_ai": {
+                "key": "sk-benchmark",
+                "host": stability_server.host,
+            },
+            "rate_limiter": {"backoff_base": 0.05, "backoff_max": 1.0},
+        },
+    )
+    django.setup()
+
+
+def _create_instance(scenario: str, i: int, paragraphs: int):
+    from .models import BenchmarkArticle, BenchmarkAudio, BenchmarkImage
+
+    if scenario == "text":
+        return BenchmarkArticle(body=_make_text(i, paragraphs))
+    if scenario == "image":
+        return BenchmarkImage(body=_make_text(i, 1))
+    audio = BenchmarkAudio()
+    audio.audio.name = "benchmark/sample.mp3"
+    return audio
+
+
+def run_scenario(
+    scenario: str,
+    concurrency: int,
+    saves: int,
+    paragraphs: int,
+    behaviour: FakeBehaviour,
+) -> dict:
+    from django.db import connection, connections
+
+    behaviour.reset()
+    latencies, queries, errors = [], [], []
+    lock = threading.Lock()
+    counter = iter(range(saves))
+
+    def worker() -> None:
+        try:
+            while True:
+                with lock:
+                    i = next(counter, None)
+                    if i is None:
+                        return
+                instance = _create_instance(scenario, i, paragraphs)
+                thread_queries = [0]
+
+                def count_queries(execute, sql, params, many, context):
+                    thread_queries[0] += 1
+                    return execute(sql, params, many, context)
+
+                start = time.perf_counter()
+                try:
+                    with connection.execute_wrapper(count_queries):
+                        instance.save()
+                except Exception as e:
+                    with lock:
+                        errors.append(f"{e.__class__.__name__}: {e}")
+                    continue
+                latency = time.perf_counter() - start
+                with lock:
+                    latencies.append(latency)
+                    queries.append(thread_queries[0])
+        finally:
+            connections.close_all()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "saves": len(latencies),
+        "errors": len(errors),
+        "throughput": len(latencies) / duration if duration else 0.0,
+        "p50": _percentile(latencies, 50),
+        "p95": _percentile(latencies, 95),
+        "p99": _percentile(latencies, 99),
+        "calls_per_save": behaviour.requests / saves if saves else 0.0,
+        "queries_per_save": sum(queries) / len(queries) if queries else 0.0,
+        "peak_rss_mb": _peak_rss_mb(),
+        "first_error": errors[0] if errors else "",
+    }
+
+
+def _print_results(results: list[dict]) -> None:
+    headers = [
+        "scenario",
+        "concurrency",
+        "saves",
+        "errors",
+        "saves/s",
+        "p50 ms",
+        "p95 ms",
+        "p99 ms",
+        "calls/save",
+        "queries/save",
+        "peak rss MB",
+    ]
+    rows = [
+        [
+            result["scenario"],
+            result["concurrency"],
+            result["saves"],
+            result["errors"],
+            f"{result['throughput']:.1f}",
+            f"{result['p50'] * 1000:.1f}",
+            f"{result['p95'] * 1000:.1f}",
+            f"{result['p99'] * 1000:.1f}",
+            f"{result['calls_per_save']:.2f}",
+            f"{result['queries_per_save']:.1f}",
+            f"{result['peak_rss_mb']:.1f}",
+        ]
+        for result in results
+    ]
+    rows = [[str(value) for value in row] for row in rows]
+    widths = [
+        max([len(header)] + [len(row[i]) for row in rows])
+        for i, header in enumerate(headers)
+    ]
+    for row in [headers] + rows:
+        print("  ".join(value.rjust(width) for value, width in zip(row, widths)))
+    for result in results:
+        if result["first_error"]:
+            print(
+                f"{result['scenario']} x{result['concurrency']}: {result['first_error']}"
+            )
+
+
+def _compare(results: list[dict], baseline: list[dict], tolerance: float) -> list:
+    """
+    Regressions of throughput, p95 latency, calls and queries per save against a
+    baseline written with --json
+    """
+    baseline = {(b["scenario"], b["concurrency"]): b for b in baseline}
+    regressions = []
+    for result in results:
+        base = baseline.get((result["scenario"], result["concurrency"]))
+        if base is None:
+            continue
+        name = f"{result['scenario']} x{result['concurrency']}"
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {result['throughput']:.1f} < {base['throughput']:.1f} saves/s"
+            )
+        if result["p95"] > base["p95"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {result['p95'] * 1000:.1f} > {base['p95'] * 1000:.1f} ms"
+            )
+        for key in ("calls_per_save", "queries_per_save"):
+            if result[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {result[key]:.2f} > {base[key]:.2f}")
+    return regressions
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m smart_models.benchmarks",
+        description="Benchmark smart model saves against local stand-ins of the "
+        "OpenAI and Stability AI APIs",
+    )
+    parser.add_argument(
+        "--scenarios",
+        default=",".join(SCENARIOS),
+        help="Comma separated scenarios out of text, image and audio",
+    )
+    parser.add_argument(
+        "--concurrency",
+        default="1,4,16",
+        type=lambda value: [int(c) for c in value.split(",")],
+        help="Comma separated numbers of threads saving in parallel",
+    )
+    parser.add_argument("--saves", type=int, default=50, help="Saves per run")
+    parser.add_argument(
+        "--paragraphs", type=int, default=3, help="Paragraphs of the text scenario"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="Seconds per provider request"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.01, help="+/- seconds of latency"
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Share of provider requests failing with a transient error",
+    )
+    parser.add_argument(
+        "--rpm",
+        type=int,
+        default=None,
+        help="Provider requests per minute before the servers throttle",
+    )
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument(
+        "--baseline",
+        help="Results written with --json, exit with status 1 on regressions",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed relative change against --baseline",
+    )
+    args = parser.parse_args(argv)
+
+    behaviour_kwargs = {
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "error_rate": args.error_rate,
+        "rpm": args.rpm,
+    }
+    openai_server = FakeOpenAIServer(FakeBehaviour(**behaviour_kwargs)).start()
+    stability_server = FakeStabilityServer(FakeBehaviour(**behaviour_kwargs)).start()
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            _configure(args, workdir, openai_server, stability_server)
+            from django.core.files.base import ContentFile
+            from django.core.files.storage import default_storage
+            from django.core.management import call_command
+
+            call_command("migrate", run_syncdb=True, verbosity=0)
+            call_command("init_smart_models", stdout=open(os.devnull, "w"))
+            default_storage.save("benchmark/sample.mp3", ContentFile(os.urandom(32000)))
+
+            for scenario in args.scenarios.split(","):
+                behaviour = (
+                    stability_server.behaviour
+                    if scenario == "image"
+                    else openai_server.behaviour
+                )
+                for concurrency in args.concurrency:
+                    results.append(
+                        run_scenario(
+                            scenario,
+                            concurrency,
+                            args.saves,
+                            args.paragraphs,
+                            behaviour,
+                        )
+                    )
+    finally:
+        openai_server.stop()
+        stability_server.stop()
+
+    _print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = _compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
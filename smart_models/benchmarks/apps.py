@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class SmartModelsBenchmarksConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "smart_models.benchmarks"
+    label = "smart_models_benchmarks"
@@ -0,0 +1,33 @@
+from django.db import models
+
+from smart_models.fields import (AudioToTextField, SmartImageField,
+                                 SmartTextField)
+from smart_models.models import AudioAIModel, ImageAIModel, TextAIModel
+
+
+class BenchmarkArticle(TextAIModel):
+    body = models.TextField()
+    title = SmartTextField(
+        data_fields=["body"], generate_title=True, blank=True, null=True
+    )
+    summary = SmartTextField(
+        data_fields=["body"], spell_correct=True, summarize=True, blank=True, null=True
+    )
+
+
+class BenchmarkImage(ImageAIModel):
+    body = models.TextField()
+    thumbnail = SmartImageField(
+        data_fields=["body"],
+        thumbnail=True,
+        upload_to="benchmark",
+        blank=True,
+        null=True,
+    )
+
+
+class BenchmarkAudio(AudioAIModel):
+    audio = models.FileField(upload_to="benchmark")
+    transcript = AudioToTextField(
+        data_fields=["audio"], transcribe=True, blank=True, null=True
+    )
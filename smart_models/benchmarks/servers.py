@@ -0,0 +1,222 @@
+import json
+import random
+import threading
+import time
+import uuid
+from concurrent import futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Union
+
+import grpc
+import stability_sdk.interfaces.gooseai.generation.generation_pb2 as generation
+from stability_sdk.interfaces.gooseai.generation import \
+    generation_pb2_grpc as generation_grpc
+
+# 1x1 transparent PNG
+PNG_IMAGE = bytes.fromhex(
+    "89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489"
+    "0000000d49444154789c6360606060000000050001a5f645400000000049454e44ae426082"
+)
+
+
+class FakeBehaviour:
+    """
+    Latency, failures and throttling of a stand-in server.
+    latency: seconds per request, jitter: +/- seconds added at random
+    error_rate: share of requests failing with a transient error (HTTP 503/UNAVAILABLE)
+    rpm: requests per minute accepted before throttling (HTTP 429/RESOURCE_EXHAUSTED)
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rpm: int = None,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self._window = None
+        self._window_requests = 0
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.errors = 0
+            self.throttled = 0
+
+    def handle(self) -> Union[str, None]:
+        """
+        Sleeps for the latency of a request and returns "throttled", "error" or None
+        """
+        with self._lock:
+            self.requests += 1
+            window = int(time.time() // 60)
+            if window != self._window:
+                self._window, self._window_requests = window, 0
+            self._window_requests += 1
+            if self.rpm is not None and self._window_requests > self.rpm:
+                self.throttled += 1
+                return "throttled"
+            if random.random() < self.error_rate:
+                self.errors += 1
+                return "error"
+
+        time.sleep(max(self.latency + random.uniform(-self.jitter, self.jitter), 0))
+        return None
+
+    def retry_after(self) -> float:
+        return 60 - time.time() % 60
+
+
+class _FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send_json(self, status: int, body: dict, headers: dict = None) -> None:
+        content = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _chat_completion(self, body: dict) -> dict:
+        content = body["messages"][-1]["content"]
+        text = content.split("Text:", 1)[-1].rsplit("Result:", 1)[0].strip()
+        prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 4
+        result = text[:200] or "none"
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": f"Result: {result}"},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(result) // 4,
+                "total_tokens": prompt_tokens + len(result) // 4,
+            },
+        }
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        outcome = self.server.behaviour.handle()
+        if outcome == "throttled":
+            return self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "requests"}},
+                {"Retry-After": f"{self.server.behaviour.retry_after():.2f}"},
+            )
+        if outcome == "error":
+            return self._send_json(
+                503, {"error": {"message": "Service unavailable", "type": "server"}}
+            )
+
+        if self.path.endswith("/chat/completions"):
+            return self._send_json(200, self._chat_completion(json.loads(body)))
+        if self.path.endswith("/audio/transcriptions") or self.path.endswith(
+            "/audio/translations"
+        ):
+            return self._send_json(200, {"text": f"{len(body)} bytes of audio"})
+        self._send_json(404, {"error": {"message": "Not found", "type": "invalid"}})
+
+
+class FakeOpenAIServer:
+    """
+    Stand-in for the chat completion and audio endpoints of the OpenAI HTTP API
+    """
+
+    def __init__(self, behaviour: FakeBehaviour = None, port: int = 0) -> None:
+        self.behaviour = behaviour or FakeBehaviour()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), _FakeOpenAIHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.behaviour = self.behaviour
+        self.thread = None
+
+    @property
+    def api_base(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _FakeGenerationService(generation_grpc.GenerationServiceServicer):
+    def __init__(self, behaviour: FakeBehaviour) -> None:
+        self.behaviour = behaviour
+
+    def Generate(self, request, context):
+        outcome = self.behaviour.handle()
+        if outcome == "throttled":
+            context.set_trailing_metadata(
+                (("retry-after", f"{self.behaviour.retry_after():.2f}"),)
+            )
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Rate limit reached")
+        if outcome == "error":
+            context.abort(grpc.StatusCode.UNAVAILABLE, "Service unavailable")
+
+        yield generation.Answer(
+            answer_id=uuid.uuid4().hex,
+            request_id=request.request_id,
+            artifacts=[
+                generation.Artifact(
+                    id=i,
+                    type=generation.ARTIFACT_IMAGE,
+                    mime="image/png",
+                    binary=PNG_IMAGE,
+                    seed=request.image.seed[0] if request.image.seed else 0,
+                    finish_reason=generation.NULL,
+                )
+                for i in range(max(request.image.samples, 1))
+            ],
+        )
+
+
+class FakeStabilityServer:
+    """
+    Stand-in for the Stability AI gRPC GenerationService, serving insecure gRPC
+    """
+
+    def __init__(
+        self, behaviour: FakeBehaviour = None, port: int = 0, max_workers: int = 32
+    ) -> None:
+        self.behaviour = behaviour or FakeBehaviour()
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+        generation_grpc.add_GenerationServiceServicer_to_server(
+            _FakeGenerationService(self.behaviour), self.server
+        )
+        self.port = self.server.add_insecure_port(f"127.0.0.1:{port}")
+
+    @property
+    def host(self) -> str:
+        return f"127.0.0.1:{self.port}"
+
+    def start(self) -> "FakeStabilityServer":
+        self.server.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.stop(grace=None)
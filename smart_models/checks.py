@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core import checks
+
+from .apis._limits import _get_rate_limiter_settings
+
+
+@checks.register(checks.Tags.caches)
+def check_rate_limiter_cache(app_configs, **kwargs) -> list[checks.CheckMessage]:
+    alias = _get_rate_limiter_settings().get("alias")
+    if not alias:
+        return [
+            checks.Warning(
+                "Rate limits and the circuit breaker are counted per process.",
+                hint=(
+                    'Set AI_API_SETTINGS["rate_limiter"]["alias"] to a cache shared by '
+                    "all workers, e.g. Redis or a DatabaseCache."
+                ),
+                id="smart_models.W001",
+            )
+        ]
+    if alias not in settings.CACHES:
+        return [
+            checks.Error(
+                f'AI_API_SETTINGS["rate_limiter"]["alias"] is "{alias}", which is not in CACHES.',
+                id="smart_models.E006",
+            )
+        ]
+    return []
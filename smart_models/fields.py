@@ -1,4 +1,7 @@
+import os
+
 from django.db import models
+from django.db.models.fields.files import ImageFieldFile
 from django.utils.translation import gettext_lazy as _
 
 
@@ -17,6 +20,9 @@ def _validate_smart_task_arguments(**kwargs) -> None:
                 "Only one of 'generate_title' or 'summarize' can be set to True"
             )
 
+    if kwargs.get("mode", ProcessingModes.SYNC) not in ProcessingModes.values:
+        raise Exception(f"'mode' should be one of {', '.join(ProcessingModes.values)}")
+
     if kwargs["type"] is "audio":
         if kwargs["translate"] and kwargs["transcribe"]:
             raise Exception(
@@ -27,11 +33,17 @@ def _validate_smart_task_arguments(**kwargs) -> None:
 class APIProviders(models.TextChoices):
     OPENAI = "OPAI", _("OpenAI")
     STABILITYAI = "STBAI", _("Stability AI")
+    LOCAL = "LOCAL", _("Local")
     GCP = "GCP", _("Google Cloud")
     AZURE = "AZC", _("Azure Cloud")
     AWS = "AWS", _("Amazon Web Services")
 
 
+class ProcessingModes(models.TextChoices):
+    SYNC = "sync", _("Synchronous")
+    DEFERRED = "deferred", _("Deferred")
+
+
 class SmartTextField(models.TextField):
     description = "smart models.TextField"
 
@@ -46,11 +58,15 @@ class SmartTextField(models.TextField):
         summarize: bool = False,
         emojify: bool = False,
         api_provider: APIProviders = APIProviders.OPENAI,
+        mode: ProcessingModes = ProcessingModes.SYNC,
+        fused: bool = False,
         *args,
         **kwargs,
     ):
         """
         to: str, is only used when translate = True
+        mode: ProcessingModes, DEFERRED saves the row immediately and leaves processing to smart_models_worker
+        fused: bool, runs all enabled tasks in a single request instead of one request per task
         Order of execution: correct_spelling -> summarize -> translate -> emojify
         """
 
@@ -64,6 +80,7 @@ class SmartTextField(models.TextField):
             generate_title=generate_title,
             max_title_length=max_title_length,
             emojify=emojify,
+            mode=mode,
         )
         self.spell_correct = spell_correct
         self.translate = translate
@@ -74,10 +91,26 @@ class SmartTextField(models.TextField):
         self.max_title_length = max_title_length
         self.data_fields = data_fields
         self.api_provider = api_provider
+        self.mode = mode
+        self.fused = fused
         super().__init__(*args, **kwargs)
         self.help_text = f"spell_correct={spell_correct}; translate={translate}; target_lang={target_lang}; \
             summarize={summarize}; emojify={emojify}; generate_title={generate_title}; max_title_length={max_title_length}; api={api_provider}"
 
+    @property
+    def tasks(self) -> list[str]:
+        return [
+            task
+            for task, enabled in [
+                ("spell_correct", self.spell_correct),
+                ("generate_title", self.generate_title),
+                ("summarize", self.summarize),
+                ("translate", self.translate),
+                ("emojify", self.emojify),
+            ]
+            if enabled
+        ]
+
     def deconstruct(self):
         name, path, args, kwargs = super().deconstruct()
         # Only include in kwargs if it's not the default
@@ -95,11 +128,63 @@ class SmartTextField(models.TextField):
             kwargs["max_title_length"] = self.max_title_length
         kwargs["data_fields"] = self.data_fields
         kwargs["api_provider"] = self.api_provider
+        if self.mode != ProcessingModes.SYNC:
+            kwargs["mode"] = self.mode
+        if self.fused:
+            kwargs["fused"] = self.fused
         return name, path, args, kwargs
 
 
+# Extension of rendition files by format, when it differs from the format
+RENDITION_EXTENSIONS = {"jpeg": "jpg"}
+
+
+class ImageRendition:
+    """
+    A rendition stored next to the image of a SmartImageField
+    """
+
+    def __init__(self, storage, name: str) -> None:
+        self.storage = storage
+        self.name = name
+
+    def __str__(self) -> str:
+        return self.name
+
+    @property
+    def url(self) -> str:
+        return self.storage.url(self.name)
+
+    @property
+    def path(self) -> str:
+        return self.storage.path(self.name)
+
+    def exists(self) -> bool:
+        return self.storage.exists(self.name)
+
+    def open(self, mode: str = "rb"):
+        return self.storage.open(self.name, mode)
+
+
+class SmartImageFieldFile(ImageFieldFile):
+    @property
+    def renditions(self) -> dict[str, ImageRendition]:
+        """
+        Renditions of the image by name, e.g. {{ article.image.renditions.small.url }}
+        """
+        if not self:
+            return {}
+        return {
+            rendition: ImageRendition(
+                self.storage, self.field.get_rendition_name(self.name, rendition)
+            )
+            for rendition in self.field.renditions
+        }
+
+
 class SmartImageField(models.ImageField):
     description = "smart models.ImageField"
+    attr_class = SmartImageFieldFile
 
     def __init__(
         self,
@@ -109,6 +194,8 @@ class SmartImageField(models.ImageField):
         image_width: int = 512,
         image_extension: str = "png",
         api_provider: APIProviders = APIProviders.STABILITYAI,
+        mode: ProcessingModes = ProcessingModes.SYNC,
+        renditions: dict[str, dict] = None,
         *args,
         **kwargs,
     ):
@@ -120,6 +207,7 @@ class SmartImageField(models.ImageField):
             image_height=image_height,
             image_width=image_width,
             image_extension=image_extension,
+            mode=mode,
         )
         self.data_fields = data_fields
         self.thumbnail = thumbnail
@@ -127,9 +215,19 @@ class SmartImageField(models.ImageField):
         self.image_height = image_height
         self.image_extension = image_extension
         self.api_provider = api_provider
+        self.mode = mode
+        # name -> {"width", "height", "format", "quality"}, derived from the generated
+        # image instead of generating every size
+        self.renditions = renditions or {}
         super().__init__(*args, **kwargs)
         self.help_text = f"thumbnail={thumbnail};api={api_provider}"
 
+    def get_rendition_name(self, name: str, rendition: str) -> str:
+        image_format = (
+            self.renditions[rendition].get("format") or self.image_extension
+        ).lower()
+        return f"{os.path.splitext(name)[0]}.{rendition}.{RENDITION_EXTENSIONS.get(image_format, image_format)}"
+
     def deconstruct(self):
         name, path, args, kwargs = super().deconstruct()
         # Only include in kwargs if it's not the default
@@ -140,6 +238,10 @@ class SmartImageField(models.ImageField):
         kwargs["image_extension"] = self.image_extension
         kwargs["data_fields"] = self.data_fields
         kwargs["api_provider"] = self.api_provider
+        if self.mode != ProcessingModes.SYNC:
+            kwargs["mode"] = self.mode
+        if len(self.renditions) != 0:
+            kwargs["renditions"] = self.renditions
         return name, path, args, kwargs
 
 
@@ -150,6 +252,7 @@ class AudioToTextField(models.TextField):
         transcribe: bool = False,
         translate: bool = False,
         api_provider: APIProviders = APIProviders.OPENAI,
+        mode: ProcessingModes = ProcessingModes.SYNC,
         *args,
         **kwargs,
     ):
@@ -159,11 +262,13 @@ class AudioToTextField(models.TextField):
             type="audio",
             transcribe=transcribe,
             translate=translate,
+            mode=mode,
         )
         self.transcribe = transcribe
         self.translate = translate
         self.data_fields = data_fields
         self.api_provider = api_provider
+        self.mode = mode
         super().__init__(*args, **kwargs)
         self.help_text = f"api={api_provider}"
 
@@ -176,4 +281,6 @@ class AudioToTextField(models.TextField):
             kwargs["translate"] = self.translate
         kwargs["data_fields"] = self.data_fields
         kwargs["api_provider"] = self.api_provider
+        if self.mode != ProcessingModes.SYNC:
+            kwargs["mode"] = self.mode
         return name, path, args, kwargs
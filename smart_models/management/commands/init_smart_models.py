@@ -1,15 +1,10 @@
-import json
-import os
-from pathlib import Path
-
 from django.core.management.base import BaseCommand
+from django.db import connections, router
 
-from smart_models.fields import APIProviders
+from smart_models.apis._configs import (get_file_configs,
+                                        invalidate_task_configs)
 from smart_models.models import AIAPI
 
-BASE_DIR = Path(__file__).resolve().parent.parent.parent
-API_CONFIGS_DIR = os.path.join(BASE_DIR, "api_configurations")
-
 
 class Command(BaseCommand):
     help = "Initialize smart models & fields"
@@ -17,25 +12,36 @@ class Command(BaseCommand):
     requires_system_checks = []
 
     def handle(self, *args, **options):
-        configs = None
-        with open(os.path.join(API_CONFIGS_DIR, "configs.json"), "r") as f:
-            configs = json.loads(f.read())
-
-        for api_provider, api_name in APIProviders.choices:
-            if api_provider in configs and configs[api_provider] != {}:
-                api_configs = None
-                with open(
-                    os.path.join(API_CONFIGS_DIR, configs[api_provider]["configs"]), "r"
-                ) as f:
-                    api_configs = json.loads(f.read())
-
-                for key, val in api_configs.items():
-                    new_aiapi = AIAPI.objects.create(
-                        name=f"{key}-{api_name}",
-                        provider=api_provider,
-                        configurations=val,
-                    )
+        aiapis = [
+            AIAPI(name=name, provider=provider, configurations=configurations)
+            for name, provider, configurations in get_file_configs()
+        ]
+        # Upserted on (name, provider), so that running the command again updates the
+        # configurations instead of duplicating them
+        features = connections[router.db_for_write(AIAPI)].features
+        if features.supports_update_conflicts:
+            AIAPI.objects.bulk_create(
+                aiapis,
+                update_conflicts=True,
+                # MySQL and MariaDB update on any unique constraint without a target
+                unique_fields=(
+                    ["name", "provider"]
+                    if features.supports_update_conflicts_with_target
+                    else None
+                ),
+                update_fields=["configurations"],
+            )
+        else:
+            for aiapi in aiapis:
+                AIAPI.objects.update_or_create(
+                    name=aiapi.name,
+                    provider=aiapi.provider,
+                    defaults={"configurations": aiapi.configurations},
+                )
+        # bulk_create() does not send post_save
+        invalidate_task_configs()
 
         self.stdout.write(
-            "Initialized smart models. Open admin dashboard to see AI API configurations"
+            f"Initialized {len(aiapis)} AI API configurations. Open admin dashboard to "
+            "see AI API configurations"
         )
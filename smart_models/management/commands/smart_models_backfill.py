@@ -0,0 +1,195 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import CharField, F, Q
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from smart_models.models import (BackfillCheckpoint, BaseAIModelMixin,
+                                 JobStatus, SmartJob)
+
+# Jobs of rows whose inputs changed and whose smart fields were not processed since
+STALE_JOB_STATUSES = [JobStatus.PENDING, JobStatus.FAILED]
+
+
+class Command(BaseCommand):
+    help = (
+        "Process smart fields of existing rows of a model. "
+        "Progress is checkpointed, so an interrupted run resumes where it stopped"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", help="Model in the form app_label.ModelName")
+        parser.add_argument(
+            "--fields",
+            default="",
+            help="Comma separated smart fields to process, defaults to all smart fields",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of rows fetched from the database at once",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=20,
+            help="Number of rows processed and updated together",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Number of batches processed in parallel",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=0,
+            help="Maximum number of rows processed per second, 0 for no limit",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Also process rows whose smart fields are up to date",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the checkpoint of a previous run and start from the first row",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the number of rows that would be processed",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options["model"])
+        except (LookupError, ValueError):
+            raise CommandError(f"Model '{options['model']}' does not exist")
+        if not issubclass(model, BaseAIModelMixin):
+            raise CommandError(f"Model '{options['model']}' has no smart fields")
+
+        field_names = [name for name in options["fields"].split(",") if name != ""]
+        smart_fields = [
+            field
+            for field in model()._get_smart_fields()
+            if len(field_names) == 0 or field.name in field_names
+        ]
+        if len(smart_fields) == 0:
+            raise CommandError(
+                f"Model '{options['model']}' has no matching smart fields"
+            )
+        field_names = sorted(field.name for field in smart_fields)
+
+        checkpoint = BackfillCheckpoint.objects.filter(
+            model=model._meta.label, fields=",".join(field_names)
+        ).first()
+        queryset = model._default_manager.order_by("pk")
+        if (
+            checkpoint is not None
+            and checkpoint.last_pk != ""
+            and not options["restart"]
+        ):
+            queryset = queryset.filter(
+                pk__gt=model._meta.pk.to_python(checkpoint.last_pk)
+            )
+            self.stdout.write(f"Resuming after pk {checkpoint.last_pk}")
+        stale_jobs = SmartJob.objects.filter(
+            model=model._meta.label,
+            field_name__in=field_names,
+            status__in=STALE_JOB_STATUSES,
+        )
+        if not options["force"]:
+            # Rows with empty smart fields, or stale ones: saved with changed inputs
+            # while their deferred jobs are still pending or failed
+            stale = Q(_smart_pk__in=stale_jobs.values("object_pk"))
+            for field in smart_fields:
+                stale |= Q(**{f"{field.name}__isnull": True}) | Q(**{field.name: ""})
+            queryset = queryset.annotate(
+                _smart_pk=Cast("pk", output_field=CharField())
+            ).filter(stale)
+
+        total = queryset.count()
+        if options["dry_run"]:
+            self.stdout.write(
+                f"{total} rows of {model._meta.label} would be processed ({', '.join(field_names)})"
+            )
+            return
+
+        if checkpoint is None:
+            checkpoint = BackfillCheckpoint.objects.create(
+                model=model._meta.label, fields=",".join(field_names)
+            )
+        if options["restart"]:
+            BackfillCheckpoint.objects.filter(pk=checkpoint.pk).update(
+                last_pk="", processed=0, updated_at=timezone.now()
+            )
+
+        processed = 0
+        started_at = time.monotonic()
+        in_flight = deque()
+
+        def complete_oldest() -> None:
+            # Batches are checkpointed in order, so that a resumed run never skips rows
+            nonlocal processed
+            future, pks = in_flight.popleft()
+            try:
+                future.result()
+            except Exception as e:
+                raise CommandError(
+                    f"Backfill stopped after {processed} rows, resume by running the command again: {e}"
+                )
+            # The rows are up to date, smart_models_worker does not process them again
+            stale_jobs.filter(object_pk__in=[str(pk) for pk in pks]).update(
+                status=JobStatus.DONE, last_error="", updated_at=timezone.now()
+            )
+            size, last_pk = len(pks), pks[-1]
+            processed += size
+            BackfillCheckpoint.objects.filter(pk=checkpoint.pk).update(
+                last_pk=str(last_pk),
+                processed=F("processed") + size,
+                updated_at=timezone.now(),
+            )
+            elapsed = time.monotonic() - started_at
+            self.stdout.write(
+                f"{processed}/{total} rows, {processed / elapsed if elapsed else 0:.1f} rows/s"
+            )
+
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            submitted = 0
+            for batch in queryset.smart_batches(
+                options["batch_size"], chunk_size=options["chunk_size"]
+            ):
+                if options["rate"] > 0:
+                    wait_for = (
+                        started_at + submitted / options["rate"] - time.monotonic()
+                    )
+                    if wait_for > 0:
+                        time.sleep(wait_for)
+                in_flight.append(
+                    (
+                        executor.submit(
+                            queryset._smart_update_batch, batch, field_names
+                        ),
+                        [instance.pk for instance in batch],
+                    )
+                )
+                submitted += len(batch)
+                while len(in_flight) >= options["concurrency"]:
+                    complete_oldest()
+
+            while len(in_flight) != 0:
+                complete_oldest()
+
+        # A complete run starts over next time, picking up rows that became stale since
+        BackfillCheckpoint.objects.filter(pk=checkpoint.pk).update(
+            last_pk="", updated_at=timezone.now()
+        )
+        self.stdout.write(f"Processed {processed} rows of {model._meta.label}")
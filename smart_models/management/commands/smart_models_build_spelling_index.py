@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from smart_models.apis._configs import get_task_configs
+from smart_models.apis._spelling import (DEFAULT_MAX_EDIT_DISTANCE,
+                                         DEFAULT_PREFIX_LENGTH,
+                                         build_spelling_index,
+                                         get_spelling_index_paths)
+from smart_models.fields import APIProviders
+from smart_models.models import AIAPI
+
+
+class Command(BaseCommand):
+    help = "Build the index of the local spell correction from its frequency dictionary"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-edit-distance",
+            type=int,
+            default=None,
+            help="Defaults to the local AI API configuration",
+        )
+        parser.add_argument(
+            "--prefix-length",
+            type=int,
+            default=None,
+            help="Defaults to the local AI API configuration",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            configurations = get_task_configs(
+                "spell_correct", "text", APIProviders.LOCAL
+            ).configurations
+        except AIAPI.DoesNotExist:
+            configurations = {}
+        max_edit_distance = options["max_edit_distance"] or configurations.get(
+            "max_edit_distance", DEFAULT_MAX_EDIT_DISTANCE
+        )
+        prefix_length = options["prefix_length"] or configurations.get(
+            "prefix_length", DEFAULT_PREFIX_LENGTH
+        )
+
+        dictionary_path, index_path = get_spelling_index_paths()
+        start = time.perf_counter()
+        words = build_spelling_index(
+            dictionary_path, index_path, max_edit_distance, prefix_length
+        )
+        self.stdout.write(
+            f"Indexed {words} words of {dictionary_path} into {index_path} "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
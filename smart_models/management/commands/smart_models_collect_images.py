@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from smart_models.models import GeneratedImage
+
+
+class Command(BaseCommand):
+    help = "Delete generated images which are no longer referenced by any row"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the images which would be deleted",
+        )
+        parser.add_argument(
+            "--grace-minutes",
+            type=float,
+            default=60.0,
+            help=(
+                "Minutes an image has to be unreferenced before it is deleted, "
+                "rows being processed can still reuse it meanwhile"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        deleted, recounted = 0, 0
+        released_before = timezone.now() - timedelta(minutes=options["grace_minutes"])
+        for generated_image in GeneratedImage.objects.filter(
+            references__lte=0, updated_at__lt=released_before
+        ):
+            app_label, model_name, field_name = generated_image.field.rsplit(".", 2)
+            try:
+                model = apps.get_model(app_label, model_name)
+                field = model._meta.get_field(field_name)
+            except LookupError:
+                model, field = None, None
+
+            with transaction.atomic():
+                # Reuse and reference changes since the query above keep the image
+                locked_image = (
+                    GeneratedImage.objects.select_for_update()
+                    .filter(
+                        pk=generated_image.pk,
+                        references__lte=0,
+                        updated_at__lt=released_before,
+                    )
+                    .first()
+                )
+                if locked_image is None:
+                    continue
+
+                if model is not None:
+                    # Rows written bypassing the model, e.g. by QuerySet.update(), are
+                    # not counted, trust the rows over the counter
+                    references = model._default_manager.filter(
+                        **{field.attname: generated_image.name}
+                    ).count()
+                    if references > 0:
+                        recounted += 1
+                        if not options["dry_run"]:
+                            GeneratedImage.objects.filter(pk=generated_image.pk).update(
+                                references=references, updated_at=timezone.now()
+                            )
+                        continue
+
+                deleted += 1
+                self.stdout.write(f"Deleting {generated_image.name}")
+                if not options["dry_run"]:
+                    locked_image.delete()
+
+            # Files are deleted once the row is gone, a failed deletion leaves a file
+            # without a row instead of a row without a file
+            if not options["dry_run"] and field is not None:
+                field.storage.delete(generated_image.name)
+                for rendition in getattr(field, "renditions", {}):
+                    field.storage.delete(
+                        field.get_rendition_name(generated_image.name, rendition)
+                    )
+
+        self.stdout.write(f"Deleted {deleted} images, recounted {recounted}")
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+
+from smart_models.models import AIAPI
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete duplicate AI API configurations of the same name and provider, "
+        "created by init_smart_models of earlier versions. Run it before migrating "
+        "to the unique (name, provider) constraint"
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the configurations which would be deleted",
+        )
+
+    def handle(self, *args, **options):
+        # The oldest row of a name and provider is the one tasks have been using
+        kept_pks = (
+            AIAPI.objects.values("name", "provider")
+            .annotate(kept_pk=Min("pk"))
+            .values_list("kept_pk", flat=True)
+        )
+        # Evaluated first, MySQL cannot delete from a table it selects from
+        duplicates = AIAPI.objects.exclude(pk__in=list(kept_pks))
+
+        deleted = 0
+        for aiapi in duplicates.order_by("pk"):
+            deleted += 1
+            self.stdout.write(
+                f"Deleting {aiapi.name} ({aiapi.provider}, pk {aiapi.pk})"
+            )
+        if not options["dry_run"]:
+            duplicates.delete()
+
+        self.stdout.write(f"Deleted {deleted} duplicate AI API configurations")
@@ -0,0 +1,142 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Max, Q, Sum
+from django.utils import timezone
+
+from smart_models.models import SmartMetric
+
+
+class Command(BaseCommand):
+    help = (
+        "Summarize metrics recorded by smart_models.apis.DatabaseCollector: "
+        "time spent per save and field, provider calls per task and cache hits"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=float,
+            default=24.0,
+            help="Only include metrics of the last HOURS hours",
+        )
+        parser.add_argument(
+            "--purge",
+            action="store_true",
+            help="Delete metrics older than --hours instead of reporting",
+        )
+
+    def _write_table(self, title: str, headers: list[str], rows: list) -> None:
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        rows = [[str(value) for value in row] for row in rows]
+        widths = [
+            max([len(header)] + [len(row[i]) for row in rows])
+            for i, header in enumerate(headers)
+        ]
+        for row in [headers] + rows:
+            self.stdout.write(
+                "  ".join(value.ljust(width) for value, width in zip(row, widths))
+            )
+        self.stdout.write("")
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(hours=options["hours"])
+        if options["purge"]:
+            deleted, _ = SmartMetric.objects.filter(created_at__lt=since).delete()
+            self.stdout.write(f"Deleted {deleted} metrics")
+            return
+
+        metrics = SmartMetric.objects.filter(created_at__gte=since)
+        spans = (
+            metrics.filter(kind__in=["save", "field"])
+            .values("kind", "label")
+            .annotate(
+                count=Count("pk"),
+                total=Sum("latency"),
+                avg=Avg("latency"),
+                max=Max("latency"),
+                errors=Count("pk", filter=~Q(outcome="success")),
+            )
+            .order_by("-total")
+        )
+        self._write_table(
+            "Time added to save()",
+            ["span", "label", "count", "total s", "avg s", "max s", "errors"],
+            [
+                [
+                    span["kind"],
+                    span["label"],
+                    span["count"],
+                    f"{span['total']:.2f}",
+                    f"{span['avg']:.3f}",
+                    f"{span['max']:.3f}",
+                    span["errors"],
+                ]
+                for span in spans
+            ],
+        )
+
+        calls = (
+            metrics.filter(kind="call")
+            .values("provider", "model", "task")
+            .annotate(
+                count=Count("pk"),
+                total=Sum("latency"),
+                avg=Avg("latency"),
+                retries=Sum("retries"),
+                prompt_tokens=Sum("prompt_tokens"),
+                completion_tokens=Sum("completion_tokens"),
+                errors=Count("pk", filter=~Q(outcome="success")),
+            )
+            .order_by("-total")
+        )
+        self._write_table(
+            "Provider calls",
+            [
+                "provider",
+                "model",
+                "task",
+                "calls",
+                "total s",
+                "avg s",
+                "retries",
+                "prompt tokens",
+                "completion tokens",
+                "errors",
+            ],
+            [
+                [
+                    call["provider"],
+                    call["model"],
+                    call["task"],
+                    call["count"],
+                    f"{call['total']:.2f}",
+                    f"{call['avg']:.3f}",
+                    call["retries"],
+                    call["prompt_tokens"],
+                    call["completion_tokens"],
+                    call["errors"],
+                ]
+                for call in calls
+            ],
+        )
+
+        lookups = (
+            metrics.filter(kind="cache")
+            .values("task")
+            .annotate(count=Count("pk"), hits=Count("pk", filter=Q(outcome="hit")))
+            .order_by("task")
+        )
+        self._write_table(
+            "Result cache",
+            ["task", "lookups", "hits", "hit rate"],
+            [
+                [
+                    lookup["task"],
+                    lookup["count"],
+                    lookup["hits"],
+                    f"{lookup['hits'] / lookup['count']:.0%}",
+                ]
+                for lookup in lookups
+            ],
+        )
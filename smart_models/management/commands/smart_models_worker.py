@@ -0,0 +1,148 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from smart_models.models import JobStatus, SmartJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Process smart fields with mode='deferred'. "
+        "Several workers can run side by side, jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=4,
+            help="Number of jobs processed in parallel",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=20, help="Number of jobs claimed at once"
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=3,
+            help="Number of attempts before a job is marked as failed",
+        )
+        parser.add_argument(
+            "--retry-delay",
+            type=float,
+            default=30.0,
+            help="Base delay in seconds before a failed job is retried, doubled on every attempt",
+        )
+        parser.add_argument(
+            "--stale-after",
+            type=float,
+            default=3600.0,
+            help="Seconds after which running jobs of a crashed worker are requeued",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=5.0,
+            help="Seconds to wait when there are no pending jobs",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when there are no pending jobs left instead of polling",
+        )
+
+    def _requeue_stale_jobs(self, stale_after: float) -> None:
+        SmartJob.objects.filter(
+            status=JobStatus.RUNNING,
+            updated_at__lt=timezone.now() - timedelta(seconds=stale_after),
+        ).update(status=JobStatus.PENDING, updated_at=timezone.now())
+
+    def _claim_jobs(self, batch_size: int) -> list[SmartJob]:
+        with transaction.atomic():
+            jobs = list(
+                SmartJob.objects.select_for_update(skip_locked=True)
+                .filter(status=JobStatus.PENDING, run_after__lte=timezone.now())
+                .order_by("run_after", "pk")[:batch_size]
+            )
+            SmartJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status=JobStatus.RUNNING,
+                attempts=F("attempts") + 1,
+                updated_at=timezone.now(),
+            )
+        for job in jobs:
+            job.attempts += 1
+        return jobs
+
+    def _run_job(self, job: SmartJob, max_attempts: int, retry_delay: float) -> bool:
+        try:
+            model = apps.get_model(job.model)
+            try:
+                instance = model._default_manager.get(pk=job.object_pk)
+            except model.DoesNotExist:
+                # Nothing left to process, retrying cannot succeed
+                SmartJob.objects.filter(pk=job.pk).update(
+                    status=JobStatus.DONE,
+                    last_error="Not processed, the row was deleted",
+                    updated_at=timezone.now(),
+                )
+                return True
+            written = instance.run_smart_field(job.field_name)
+        except Exception as e:
+            if job.attempts >= max_attempts:
+                status, run_after = JobStatus.FAILED, timezone.now()
+            else:
+                status = JobStatus.PENDING
+                run_after = timezone.now() + timedelta(
+                    seconds=retry_delay * 2 ** (job.attempts - 1)
+                )
+            SmartJob.objects.filter(pk=job.pk).update(
+                status=status,
+                run_after=run_after,
+                last_error=f"{e.__class__.__name__}: {e}",
+                updated_at=timezone.now(),
+            )
+            return False
+        else:
+            # A save() of the changed data fields queues a job of its own
+            SmartJob.objects.filter(pk=job.pk).update(
+                status=JobStatus.DONE,
+                last_error=(
+                    "" if written else "Not written, the data fields of the row changed"
+                ),
+                updated_at=timezone.now(),
+            )
+            return True
+        finally:
+            # Every thread holds its own connection
+            connections.close_all()
+
+    def handle(self, *args, **options):
+        processed, failed = 0, 0
+        with ThreadPoolExecutor(max_workers=options["threads"]) as executor:
+            while True:
+                self._requeue_stale_jobs(options["stale_after"])
+                jobs = self._claim_jobs(options["batch_size"])
+                if len(jobs) == 0:
+                    if options["once"]:
+                        break
+                    time.sleep(options["sleep"])
+                    continue
+
+                results = executor.map(
+                    lambda job: self._run_job(
+                        job, options["max_attempts"], options["retry_delay"]
+                    ),
+                    jobs,
+                )
+                for result in results:
+                    if result:
+                        processed += 1
+                    else:
+                        failed += 1
+                self.stdout.write(f"Processed {processed} jobs, {failed} failed")
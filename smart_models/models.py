@@ -1,19 +1,40 @@
+import asyncio
+import hashlib
+import logging
 import os
 import tempfile
 import uuid
-from typing import Union
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from typing import Any, AsyncIterator, Iterator, Union
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
 from django.core.files import File, storage, uploadedfile
 from django.core.files.base import ContentFile
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models import F, Q
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import class_prepared
+from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from .apis import (emojify_text, generate_thumbnail, generate_title,
-                   spell_correct_text, summarize_text, transcribe_audio,
-                   translate_audio, translate_text)
-from .fields import (APIProviders, AudioToTextField, SmartImageField,
-                     SmartTextField)
+from .apis import (agenerate_thumbnail, aprocess_text_pipeline,
+                   astream_text_pipeline, atranscribe_audio, atranslate_audio,
+                   generate_thumbnail, generate_thumbnails, get_thumbnail_key,
+                   process_text_pipeline, process_texts, stream_text_pipeline,
+                   transcribe_audio, translate_audio)
+from .apis._cache import cache_miss
+from .apis._metrics import asmart_span, smart_span
+from .apis._renditions import derive_renditions, is_rendition_format_supported
+from .apis._singleflight import asingle_flight, make_flight_key, single_flight
+from .fields import (APIProviders, AudioToTextField, ProcessingModes,
+                     SmartImageField, SmartTextField)
+
+logger = logging.getLogger(__name__)
 
 
 class AIAPI(models.Model):
@@ -28,77 +49,824 @@ class AIAPI(models.Model):
     )
     configurations = models.JSONField(_("configurations"), blank=False, null=False)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "provider"], name="smart_models_unique_aiapi"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class JobStatus(models.TextChoices):
+    PENDING = "pending", _("Pending")
+    RUNNING = "running", _("Running")
+    DONE = "done", _("Done")
+    FAILED = "failed", _("Failed")
+
+
+class SmartJob(models.Model):
+    """
+    Smart field processing queued by fields with mode=ProcessingModes.DEFERRED
+    """
+
+    model = models.CharField(_("model"), max_length=255)
+    object_pk = models.CharField(_("object pk"), max_length=255)
+    field_name = models.CharField(_("field name"), max_length=255)
+    status = models.CharField(
+        _("status"),
+        max_length=10,
+        choices=JobStatus.choices,
+        default=JobStatus.PENDING,
+    )
+    attempts = models.PositiveIntegerField(_("attempts"), default=0)
+    last_error = models.TextField(_("last error"), blank=True, default="")
+    run_after = models.DateTimeField(_("run after"), default=timezone.now)
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("updated at"), auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_after"])]
+
+    def __str__(self) -> str:
+        return f"{self.model}({self.object_pk}).{self.field_name}"
+
+
+class BackfillCheckpoint(models.Model):
+    """
+    Last processed primary key of a smart_models_backfill run
+    """
+
+    model = models.CharField(_("model"), max_length=255)
+    fields = models.CharField(_("fields"), max_length=255, blank=True, default="")
+    last_pk = models.CharField(_("last pk"), max_length=255, blank=True, default="")
+    processed = models.PositiveIntegerField(_("processed rows"), default=0)
+    updated_at = models.DateTimeField(_("updated at"), auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["model", "fields"], name="smart_models_unique_checkpoint"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.model} [{self.fields}] @ {self.last_pk}"
+
+
+class GeneratedImage(models.Model):
+    """
+    Content addressed image stored once per SmartImageField and shared by all rows whose
+    generation parameters are equal
+    """
+
+    key = models.CharField(_("key"), max_length=64)
+    field = models.CharField(_("field"), max_length=255)  # app_label.Model.field_name
+    name = models.CharField(_("name"), max_length=255)
+    references = models.IntegerField(_("references"), default=0)
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+    # Last reference change or reuse, collection waits for a grace period after it
+    updated_at = models.DateTimeField(_("updated at"), auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["key", "field"], name="smart_models_unique_generated_image"
+            )
+        ]
+
     def __str__(self) -> str:
         return self.name
 
 
+class SmartMetric(models.Model):
+    """
+    Provider call, result cache lookup or save()/field span recorded by
+    smart_models.apis.DatabaseCollector
+    """
+
+    kind = models.CharField(_("kind"), max_length=10)  # call, cache, save or field
+    provider = models.CharField(_("api provider"), max_length=6, blank=True)
+    model = models.CharField(_("model"), max_length=100, blank=True)
+    task = models.CharField(_("task"), max_length=100, blank=True)
+    label = models.CharField(_("label"), max_length=255, blank=True)
+    latency = models.FloatField(_("latency"), null=True)
+    retries = models.IntegerField(_("retries"), default=0)
+    prompt_tokens = models.IntegerField(_("prompt tokens"), default=0)
+    completion_tokens = models.IntegerField(_("completion tokens"), default=0)
+    outcome = models.CharField(_("outcome"), max_length=20)
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["kind", "created_at"])]
+
+    def __str__(self) -> str:
+        return f"{self.kind} {self.label or self.model} {self.outcome}"
+
+
+class SmartFieldPlan:
+    """
+    Smart fields of a model in execution order together with their resolved data fields,
+    compiled once per model class
+    """
+
+    def __init__(
+        self,
+        fields: list[models.Field],
+        data_fields: dict[str, list[models.Field]],
+        dependencies: dict[str, set[str]],
+        errors: list[checks.CheckMessage],
+    ) -> None:
+        self.fields = fields
+        # field name -> fields whose values are the input of the smart field
+        self.data_fields = data_fields
+        # field name -> names of the smart fields it reads from
+        self.dependencies = dependencies
+        self.errors = errors
+
+
+class SmartQuerySet(models.QuerySet):
+    def _smart_process_batch(
+        self, instances: list[models.Model], field_names: list[str] = None
+    ) -> list[models.Field]:
+        smart_fields = [
+            field
+            for field in instances[0]._get_smart_fields()
+            if field_names is None or field.name in field_names
+        ]
+        for field in smart_fields:
+            self.model._process_smart_field_batch(instances, field)
+        return smart_fields
+
+    def _run_smart_batches(self, batches: Iterator, concurrency: int, fn) -> int:
+        # Bounded number of batches in flight, so that large querysets are not loaded at once
+        processed = 0
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            in_flight = set()
+            for batch in batches:
+                if len(in_flight) >= concurrency:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    processed += sum(future.result() for future in done)
+                in_flight.add(executor.submit(fn, batch))
+            processed += sum(future.result() for future in in_flight)
+        return processed
+
+    def _smart_update_batch(
+        self, instances: list[models.Model], field_names: list[str] = None
+    ) -> int:
+        try:
+            smart_fields = self._smart_process_batch(instances, field_names)
+            if len(smart_fields) != 0:
+                with transaction.atomic(using=self.db, savepoint=False):
+                    self.model._default_manager.db_manager(self.db).bulk_update(
+                        instances, [field.name for field in smart_fields]
+                    )
+                    for instance in instances:
+                        instance._update_smart_references()
+                for instance in instances:
+                    instance._snapshot_smart_inputs(smart_fields)
+            return len(instances)
+        finally:
+            # Every thread holds its own connection
+            connections.close_all()
+
+    def smart_batches(self, batch_size: int, chunk_size: int = None) -> Iterator:
+        batch = []
+        for instance in self.iterator(chunk_size=chunk_size or batch_size):
+            batch.append(instance)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if len(batch) != 0:
+            yield batch
+
+    def smart_process(
+        self, fields: list[str] = None, batch_size: int = 20, concurrency: int = 4
+    ) -> int:
+        """
+        Processes smart fields of all rows in the queryset, bypassing save(). Text tasks of a
+        batch are packed into as few provider requests as possible, batches run concurrently
+        and are written back with one bulk_update per batch. Returns the number of rows processed.
+        """
+        return self._run_smart_batches(
+            self.smart_batches(batch_size),
+            concurrency,
+            lambda batch: self._smart_update_batch(batch, fields),
+        )
+
+    def bulk_create(
+        self,
+        objs,
+        *args,
+        smart: bool = False,
+        smart_concurrency: int = 4,
+        **kwargs,
+    ) -> list[models.Model]:
+        """
+        With smart=True, smart fields of objs are processed in batches before they are
+        inserted. The provider calls run in threads outside of any transaction of the
+        caller, so process the rows before transaction.atomic() when inserting in one.
+        """
+        objs = list(objs)
+        if not smart or len(objs) == 0:
+            return super().bulk_create(objs, *args, **kwargs)
+
+        batch_size = kwargs.get("batch_size") or 20
+
+        def process_batch(batch: list[models.Model]) -> int:
+            try:
+                self._smart_process_batch(batch)
+                return len(batch)
+            finally:
+                connections.close_all()
+
+        self._run_smart_batches(
+            (objs[i : i + batch_size] for i in range(0, len(objs), batch_size)),
+            smart_concurrency,
+            process_batch,
+        )
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            for obj in objs:
+                obj._update_smart_references()
+        return objs
+
+
 class BaseAIModelMixin(models.Model):
     class Meta:
         abstract = True
 
+    objects = SmartQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_smart_inputs()
+        return instance
+
+    @classmethod
+    def check(cls, **kwargs) -> list[checks.CheckMessage]:
+        return [*super().check(**kwargs), *cls._get_smart_plan().errors]
+
+    @classmethod
+    def _get_smart_field_types(cls) -> tuple:
+        # Extended by TextAIModel, ImageAIModel & AudioAIModel
+        return ()
+
+    @classmethod
+    def _check_smart_field(
+        cls, field: models.Field, data_fields: list[models.Field]
+    ) -> list[checks.CheckMessage]:
+        # Extended by TextAIModel, ImageAIModel & AudioAIModel
+        return []
+
+    @classmethod
+    def _compile_smart_plan(cls) -> SmartFieldPlan:
+        smart_field_types = cls._get_smart_field_types()
+        model_fields = {}
+        for model_field in cls._meta.fields:
+            model_fields[model_field.name] = model_field
+            model_fields[model_field.attname] = model_field
+        smart_fields = [
+            field for field in cls._meta.fields if isinstance(field, smart_field_types)
+        ]
+        smart_field_names = {field.name for field in smart_fields}
+
+        data_fields, dependencies, errors = {}, {}, []
+        for field in smart_fields:
+            data_fields[field.name] = []
+            for data_field in field.data_fields:
+                if data_field not in model_fields:
+                    errors.append(
+                        checks.Error(
+                            f"'data_fields' refers to the nonexistent field '{data_field}'.",
+                            obj=field,
+                            id="smart_models.E001",
+                        )
+                    )
+                    continue
+                data_fields[field.name].append(model_fields[data_field])
+            dependencies[field.name] = {
+                data_field.name
+                for data_field in data_fields[field.name]
+                if data_field.name in smart_field_names
+            }
+            errors += cls._check_smart_field(field, data_fields[field.name])
+
+        # Fields reading the output of another smart field run after it, otherwise in
+        # the order they are declared
+        fields, pending_fields = [], list(smart_fields)
+        while len(pending_fields) != 0:
+            done = {field.name for field in fields}
+            ready_fields = [
+                field for field in pending_fields if dependencies[field.name] <= done
+            ]
+            if len(ready_fields) == 0:
+                for field in pending_fields:
+                    errors.append(
+                        checks.Error(
+                            "'data_fields' of smart fields must not form a cycle.",
+                            obj=field,
+                            id="smart_models.E002",
+                        )
+                    )
+                break
+            fields += ready_fields
+            pending_fields = [
+                field for field in pending_fields if field not in ready_fields
+            ]
+
+        return SmartFieldPlan(fields, data_fields, dependencies, errors)
+
+    @classmethod
+    def _get_smart_plan(cls) -> SmartFieldPlan:
+        # Compiled when the class is prepared, see compile_smart_plan()
+        plan = cls.__dict__.get("_smart_plan")
+        if plan is None:
+            plan = cls._smart_plan = cls._compile_smart_plan()
+        return plan
+
     def _get_field(self, field_name: str) -> models.Field:
         return self._meta.get_field(field_name)
 
+    def _get_smart_fields(self) -> list[models.Field]:
+        return self._get_smart_plan().fields
+
+    def _get_smart_data_values(self, field: models.Field) -> list[Any]:
+        return [
+            getattr(self, data_field.attname)
+            for data_field in self._get_smart_plan().data_fields[field.name]
+        ]
+
+    def _process_smart_field(self, field: models.Field) -> None:
+        # Extended by TextAIModel, ImageAIModel & AudioAIModel
+        pass
+
+    @classmethod
+    def _process_smart_field_batch(
+        cls, instances: list[models.Model], field: models.Field
+    ) -> None:
+        # Overridden for fields whose provider calls can be batched
+        for instance in instances:
+            instance._process_smart_field(field)
+
+    def _get_smart_input_fingerprint(self, field: models.Field) -> Union[str, None]:
+        deferred_fields = self.get_deferred_fields()
+        values = []
+        for data_field in self._get_smart_plan().data_fields[field.name] or [field]:
+            if data_field.attname in deferred_fields:
+                return None
+            value = getattr(self, data_field.attname)
+            values.append("" if value is None else str(value))
+
+        return hashlib.sha256("\x1f".join(values).encode("utf-8")).hexdigest()
+
+    def _snapshot_smart_inputs(self, fields: list[models.Field] = None) -> None:
+        if not hasattr(self, "_smart_inputs"):
+            self._smart_inputs = {}
+        for field in fields if fields is not None else self._get_smart_fields():
+            self._smart_inputs[field.name] = self._get_smart_input_fingerprint(field)
+
+    def _smart_inputs_changed(self, field: models.Field) -> bool:
+        if self._state.adding or not getattr(self, field.attname):
+            return True
+        snapshot = getattr(self, "_smart_inputs", {}).get(field.name)
+        if snapshot is None:
+            return True
+        return snapshot != self._get_smart_input_fingerprint(field)
+
+    def _get_saved_smart_fields(self, update_fields: list[str] = None) -> list:
+        plan = self._get_smart_plan()
+        if len(plan.errors) != 0:
+            raise ImproperlyConfigured(
+                f"{self._meta.label}: {plan.errors[0].obj.name}: {plan.errors[0].msg}"
+            )
+        return [
+            field
+            for field in self._get_smart_fields()
+            if update_fields is None
+            or field.name in update_fields
+            or field.attname in update_fields
+        ]
+
+    def _split_smart_fields(
+        self, smart_fields: list[models.Field], force_smart: bool = False
+    ) -> tuple[list, list]:
+        # Returns fields to process now and fields to queue for smart_models_worker
+        fields, deferred_fields = [], []
+        for field in smart_fields:
+            if force_smart or self._smart_inputs_changed(field):
+                if field.mode == ProcessingModes.DEFERRED:
+                    deferred_fields.append(field)
+                else:
+                    fields.append(field)
+        return fields, deferred_fields
+
+    def _processes_smart_fields_on_commit(self, using: str) -> bool:
+        # Provider calls must not hold the connection and row locks of an open
+        # transaction, e.g. of ATOMIC_REQUESTS or the admin
+        return (
+            getattr(settings, "AI_API_SETTINGS", {})
+            .get("transactions", {})
+            .get("on_commit", False)
+            and transaction.get_connection(using).in_atomic_block
+        )
+
+    def process_smart_fields(
+        self, force_smart: bool = False, update_fields: list[str] = None
+    ) -> None:
+        """
+        Processes the smart fields the next save() would process, so that the provider
+        calls are made before a transaction starts and save() only writes the row
+        """
+        smart_fields = self._get_saved_smart_fields(update_fields)
+        fields, deferred_fields = self._split_smart_fields(smart_fields, force_smart)
+        if len(fields) != 0:
+            with smart_span(self):
+                for field in fields:
+                    with smart_span(self, field):
+                        self._process_smart_field(field)
+        self._smart_deferred_fields = deferred_fields
+
+    def save(self, *args, force_smart: bool = False, **kwargs) -> None:
+        """
+        Smart fields are only (re)processed when the values of their data_fields changed
+        since the instance was loaded or last saved. Pass force_smart=True to always process.
+        With AI_API_SETTINGS["transactions"]["on_commit"], they are processed after the
+        transaction commits when saved inside transaction.atomic().
+        """
+        smart_fields = self._get_saved_smart_fields(kwargs.get("update_fields"))
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        # Set by process_smart_fields() and asave() when smart fields were processed
+        deferred_fields = self.__dict__.pop("_smart_deferred_fields", None)
+        commit_fields = []
+        if deferred_fields is None:
+            fields, deferred_fields = self._split_smart_fields(
+                smart_fields, force_smart
+            )
+            if len(fields) != 0 and self._processes_smart_fields_on_commit(using):
+                fields, commit_fields = [], fields
+            if len(fields) != 0:
+                with smart_span(self):
+                    for field in fields:
+                        with smart_span(self, field):
+                            self._process_smart_field(field)
+
+        # Reference counts change in the transaction writing the row, so a failed save
+        # leaves them untouched
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            self._update_smart_references()
+        self._snapshot_smart_inputs(smart_fields)
+        if len(deferred_fields) != 0:
+            self._enqueue_smart_jobs(deferred_fields)
+        if len(commit_fields) != 0:
+            transaction.on_commit(
+                partial(
+                    self._process_smart_fields_on_commit,
+                    commit_fields,
+                    self._get_smart_write_inputs(commit_fields),
+                    using,
+                ),
+                using=using,
+            )
+
+    def _process_smart_fields_on_commit(
+        self, fields: list[models.Field], inputs: dict, using: str
+    ) -> None:
+        # A later save() of changed inputs registered its own callback
+        if self._get_smart_write_inputs(fields) != inputs:
+            return
+        # The row is committed already, errors are logged instead of raised out of the
+        # atomic block, which would skip the callbacks registered after this one
+        try:
+            with smart_span(self):
+                for field in fields:
+                    with smart_span(self, field):
+                        self._process_smart_field(field)
+            written = self._write_smart_fields(fields, inputs, using=using)
+        except Exception:
+            logger.exception(
+                "Processing %s of %s(%s) after commit failed",
+                ", ".join(field.name for field in fields),
+                self._meta.label,
+                self.pk,
+            )
+            return
+        if not written:
+            self._log_unwritten_smart_fields(fields)
+
+    def _update_smart_references(self) -> None:
+        # Extended by ImageAIModel, called in the transaction writing the row
+        pass
+
+    async def _aprocess_smart_field(self, field: models.Field) -> None:
+        # Extended by TextAIModel, ImageAIModel & AudioAIModel
+        await sync_to_async(self._process_smart_field)(field)
+
+    async def aprocess_smart_fields(
+        self, force_smart: bool = False, update_fields: list[str] = None
+    ) -> None:
+        """
+        Async counterpart of process_smart_fields(), independent smart fields are
+        processed concurrently
+        """
+        smart_fields = self._get_saved_smart_fields(update_fields)
+        fields, deferred_fields = self._split_smart_fields(smart_fields, force_smart)
+        # Fields reading the output of another smart field have to wait for it
+        field_names = {field.name for field in fields}
+        dependencies = self._get_smart_plan().dependencies
+        independent_fields = [
+            field for field in fields if not dependencies[field.name] & field_names
+        ]
+
+        async def process_field(field: models.Field) -> None:
+            async with asmart_span(self, field):
+                await self._aprocess_smart_field(field)
+
+        if len(fields) != 0:
+            async with asmart_span(self):
+                await asyncio.gather(
+                    *[process_field(field) for field in independent_fields]
+                )
+                for field in fields:
+                    if field not in independent_fields:
+                        await process_field(field)
+
+        self._smart_deferred_fields = deferred_fields
+
+    async def asave(self, *args, force_smart: bool = False, **kwargs) -> None:
+        """
+        Async counterpart of save(), independent smart fields are processed concurrently
+        """
+        await self.aprocess_smart_fields(force_smart, kwargs.get("update_fields"))
+        await sync_to_async(self.save)(*args, **kwargs)
+
+    def _enqueue_smart_jobs(self, fields: list[models.Field]) -> None:
+        model_label = self._meta.label
+        pending_fields = set(
+            SmartJob.objects.filter(
+                model=model_label,
+                object_pk=str(self.pk),
+                field_name__in=[field.name for field in fields],
+                status=JobStatus.PENDING,
+            ).values_list("field_name", flat=True)
+        )
+        SmartJob.objects.bulk_create(
+            [
+                SmartJob(
+                    model=model_label, object_pk=str(self.pk), field_name=field.name
+                )
+                for field in fields
+                if field.name not in pending_fields
+            ]
+        )
+
+    def run_smart_field(self, field_name: str) -> bool:
+        """
+        Processes a single smart field and writes only its column, used by smart_models_worker.
+        Returns False when the row was not written because its data_fields changed meanwhile.
+        """
+        field = self._get_field(field_name)
+        inputs = self._get_smart_write_inputs([field])
+        with smart_span(self, field):
+            self._process_smart_field(field)
+        written = self._write_smart_fields([field], inputs)
+        if not written:
+            self._log_unwritten_smart_fields([field])
+        return written
+
+    def _log_unwritten_smart_fields(self, fields: list[models.Field]) -> None:
+        logger.warning(
+            "%s of %s(%s) not written, the row was deleted or its data fields changed "
+            "while they were processed",
+            ", ".join(field.name for field in fields),
+            self._meta.label,
+            self.pk,
+        )
+
+    def _get_smart_write_inputs(self, fields: list[models.Field]) -> dict:
+        # Values of the data_fields the fields are processed from, by attname. Smart
+        # fields written together are left out.
+        deferred_fields = self.get_deferred_fields()
+        field_names = {field.name for field in fields}
+        inputs = {}
+        for field in fields:
+            for data_field in self._get_smart_plan().data_fields[field.name]:
+                if (
+                    data_field.name in field_names
+                    or data_field.attname in deferred_fields
+                ):
+                    continue
+                value = getattr(self, data_field.attname)
+                if isinstance(value, FieldFile):
+                    value = value.name
+                inputs[data_field.attname] = value
+        return inputs
+
+    def _write_smart_fields(
+        self, fields: list[models.Field], inputs: dict = None, using: str = None
+    ) -> bool:
+        """
+        Writes only the columns of fields. With inputs, the row is only updated while
+        its data_fields still hold these values (an optimistic version check), so that
+        results of stale inputs never overwrite a concurrent edit. Returns whether the
+        row was written.
+        """
+        # Unsaved instances keep the values until they are saved
+        if not self._state.adding:
+            condition = Q()
+            for attname, value in (inputs or {}).items():
+                if value in ("", None) and isinstance(
+                    self._meta.get_field(attname), models.FileField
+                ):
+                    # Empty files are stored as "" or NULL
+                    condition &= Q(**{attname: ""}) | Q(**{f"{attname}__isnull": True})
+                else:
+                    condition &= Q(**{attname: value})
+            using = using or self._state.db
+            with transaction.atomic(using=using, savepoint=False):
+                updated = (
+                    type(self)
+                    ._default_manager.db_manager(using)
+                    .filter(condition, pk=self.pk)
+                    .update(
+                        **{
+                            field.attname: getattr(self, field.attname)
+                            for field in fields
+                        }
+                    )
+                )
+                if updated == 0:
+                    return False
+                self._update_smart_references()
+        self._snapshot_smart_inputs(fields)
+        return True
+
 
 class TextAIModel(BaseAIModelMixin):
     class Meta:
         abstract = True
 
     def get_smart_text_field(self) -> Union[SmartTextField, None]:
-        for field in self._meta.fields:
+        for field in self._get_smart_fields():
             if isinstance(field, SmartTextField):
                 return field
 
         return None
 
-    def save(self, *args, **kwargs) -> None:
-        smart_text_field = self.get_smart_text_field()
+    @classmethod
+    def _get_smart_field_types(cls) -> tuple:
+        return (SmartTextField,) + super()._get_smart_field_types()
+
+    @classmethod
+    def _check_smart_field(
+        cls, field: models.Field, data_fields: list[models.Field]
+    ) -> list[checks.CheckMessage]:
+        if not isinstance(field, SmartTextField):
+            return super()._check_smart_field(field, data_fields)
+
+        return [
+            checks.Error(
+                "Only fields of type models.TextField and models.CharField can be passed to 'data_fields'.",
+                obj=field,
+                id="smart_models.E003",
+            )
+            for data_field in data_fields
+            if not isinstance(data_field, (models.TextField, models.CharField))
+        ]
+
+    def _get_smart_text_input(
+        self, smart_text_field: SmartTextField
+    ) -> Union[str, None]:
         processed_text = None
-        if smart_text_field is not None and len(smart_text_field.data_fields) != 0:
-            for data_field in smart_text_field.data_fields:
-                if not isinstance(data_field, str) and not (
-                    isinstance(self._get_field(data_field), models.TextField)
-                    or isinstance(self._get_field(data_field), models.CharField)
-                ):
-                    raise Exception(
-                        "Only fields of type models.TextField and models.CharField can be passed to 'data_fields'"
-                    )
+        if len(smart_text_field.data_fields) != 0:
+            for value in self._get_smart_data_values(smart_text_field):
                 if processed_text is None:
-                    processed_text = getattr(self, data_field)
+                    processed_text = value
                 else:
                     # TODO: Validate if this is correct way to go forward and if not find a better solution
                     # for combining multiple data fields
-                    processed_text += "\n" + getattr(self, data_field)
-        elif smart_text_field is not None:
+                    processed_text += "\n" + value
+        else:
             # len(smart_text_field.data_fields) = 0
             processed_text = getattr(self, smart_text_field.attname)
-        else:
-            pass
 
+        return processed_text
+
+    def _process_smart_field(self, field: models.Field) -> None:
+        if not isinstance(field, SmartTextField):
+            return super()._process_smart_field(field)
+
+        smart_text_field = field
+        processed_text = self._get_smart_text_input(smart_text_field)
         if processed_text is not None:
-            api_provider = smart_text_field.api_provider
-            if smart_text_field.spell_correct:
-                processed_text = spell_correct_text(
-                    processed_text, api_provider=api_provider
-                )
-            if smart_text_field.generate_title:
-                processed_text = generate_title(
-                    processed_text, max_title_length=smart_text_field.max_title_length
-                )
-            if smart_text_field.summarize:
-                processed_text = summarize_text(
-                    processed_text, api_provider=api_provider
-                )
-            if smart_text_field.translate:
-                processed_text = translate_text(
-                    processed_text,
-                    target_language=smart_text_field.target_lang,
-                    api_provider=api_provider,
-                )
-            if smart_text_field.emojify:
-                processed_text = emojify_text(processed_text, api_provider=api_provider)
+            processed_text = process_text_pipeline(
+                processed_text,
+                smart_text_field.tasks,
+                api_provider=smart_text_field.api_provider,
+                target_language=smart_text_field.target_lang,
+                max_title_length=smart_text_field.max_title_length,
+                fused=smart_text_field.fused,
+            )
             self.__dict__[smart_text_field.attname] = processed_text
-        return super().save(*args, **kwargs)
+
+    async def _aprocess_smart_field(self, field: models.Field) -> None:
+        if not isinstance(field, SmartTextField):
+            return await super()._aprocess_smart_field(field)
+
+        smart_text_field = field
+        processed_text = self._get_smart_text_input(smart_text_field)
+        if processed_text is not None:
+            processed_text = await aprocess_text_pipeline(
+                processed_text,
+                smart_text_field.tasks,
+                api_provider=smart_text_field.api_provider,
+                target_language=smart_text_field.target_lang,
+                max_title_length=smart_text_field.max_title_length,
+                fused=smart_text_field.fused,
+            )
+            self.__dict__[smart_text_field.attname] = processed_text
+
+    def stream_smart_field(self, field_name: str) -> Iterator[str]:
+        """
+        Yields the text of a smart text field while it is generated, e.g. as the content
+        of a StreamingHttpResponse. Only the last task of the field is streamed. Once
+        complete, the text is set and written like run_smart_field() does.
+        """
+        smart_text_field = self._get_field(field_name)
+        processed_text = self._get_smart_text_input(smart_text_field)
+        if processed_text is None:
+            return
+
+        segments = []
+        for segment in stream_text_pipeline(
+            processed_text,
+            smart_text_field.tasks,
+            api_provider=smart_text_field.api_provider,
+            target_language=smart_text_field.target_lang,
+            max_title_length=smart_text_field.max_title_length,
+        ):
+            segments.append(segment)
+            yield segment
+        self.__dict__[smart_text_field.attname] = (
+            "".join(segments) if len(segments) != 0 else None
+        )
+        self._write_smart_fields([smart_text_field])
+
+    async def astream_smart_field(self, field_name: str) -> AsyncIterator[str]:
+        """
+        Async counterpart of stream_smart_field()
+        """
+        smart_text_field = self._get_field(field_name)
+        processed_text = self._get_smart_text_input(smart_text_field)
+        if processed_text is None:
+            return
+
+        segments = []
+        async for segment in astream_text_pipeline(
+            processed_text,
+            smart_text_field.tasks,
+            api_provider=smart_text_field.api_provider,
+            target_language=smart_text_field.target_lang,
+            max_title_length=smart_text_field.max_title_length,
+        ):
+            segments.append(segment)
+            yield segment
+        self.__dict__[smart_text_field.attname] = (
+            "".join(segments) if len(segments) != 0 else None
+        )
+        await sync_to_async(self._write_smart_fields)([smart_text_field])
+
+    @classmethod
+    def _process_smart_field_batch(
+        cls, instances: list[models.Model], field: models.Field
+    ) -> None:
+        if not isinstance(field, SmartTextField):
+            return super()._process_smart_field_batch(instances, field)
+
+        smart_text_field = field
+        texts = [
+            instance._get_smart_text_input(smart_text_field) for instance in instances
+        ]
+        text_idx = [i for i, text in enumerate(texts) if text is not None]
+        processed_texts = [texts[i] for i in text_idx]
+        if len(processed_texts) == 0:
+            return
+
+        for task in smart_text_field.tasks:
+            processed_texts = process_texts(
+                processed_texts,
+                task,
+                api_provider=smart_text_field.api_provider,
+                target_language=smart_text_field.target_lang,
+                max_title_length=smart_text_field.max_title_length,
+            )
+
+        for i, processed_text in zip(text_idx, processed_texts):
+            instances[i].__dict__[smart_text_field.attname] = processed_text
 
 
 class ImageAIModel(BaseAIModelMixin):
@@ -106,55 +874,383 @@ class ImageAIModel(BaseAIModelMixin):
         abstract = True
 
     def get_smart_image_field(self) -> Union[SmartImageField, None]:
-        for field in self._meta.fields:
+        for field in self._get_smart_fields():
             if isinstance(field, SmartImageField):
                 return field
 
         return None
 
-    def save(self, *args, **kwargs) -> None:
-        smart_image_field = self.get_smart_image_field()
+    @classmethod
+    def _get_smart_field_types(cls) -> tuple:
+        return (SmartImageField,) + super()._get_smart_field_types()
+
+    @classmethod
+    def _check_smart_field(
+        cls, field: models.Field, data_fields: list[models.Field]
+    ) -> list[checks.CheckMessage]:
+        if not isinstance(field, SmartImageField):
+            return super()._check_smart_field(field, data_fields)
+
+        errors = [
+            checks.Error(
+                f"Rendition '{rendition}' has a format which the installed Pillow cannot write.",
+                hint="AVIF needs Pillow 11.2 or the pillow-avif-plugin package.",
+                obj=field,
+                id="smart_models.E005",
+            )
+            for rendition, options in field.renditions.items()
+            if not is_rendition_format_supported(
+                options.get("format") or field.image_extension
+            )
+        ]
+        if not field.thumbnail:
+            return errors
+        return errors + [
+            checks.Error(
+                "Only fields of type models.TextField and models.CharField can be passed to 'data_fields' when thumbnail=True.",
+                obj=field,
+                id="smart_models.E003",
+            )
+            for data_field in data_fields
+            if not isinstance(data_field, (models.TextField, models.CharField))
+        ]
+
+    def _get_smart_image_input(
+        self, smart_image_field: SmartImageField
+    ) -> Union[str, None]:
         processed_text = None
-        if (
-            smart_image_field is not None
-            and len(smart_image_field.data_fields) != 0
-            and smart_image_field.thumbnail
-        ):
-            for data_field in smart_image_field.data_fields:
-                if not isinstance(data_field, str) and not (
-                    isinstance(self._get_field(data_field), models.TextField)
-                    or isinstance(self._get_field(data_field), models.CharField)
-                ):
-                    raise Exception(
-                        "Only fields of type models.TextField and models.CharField can be passed to 'data_fields' when thumbnail=True"
-                    )
+        if len(smart_image_field.data_fields) != 0 and smart_image_field.thumbnail:
+            for value in self._get_smart_data_values(smart_image_field):
                 if processed_text is None:
-                    processed_text = getattr(self, data_field)
+                    processed_text = value
                 else:
                     # TODO: Validate if this is correct way to go forward and if not find a better solution
                     # for combining multiple data fields
-                    processed_text += "\n" + getattr(self, data_field)
-        else:
-            pass
+                    processed_text += "\n" + value
+
+        return processed_text
+
+    def _get_smart_image_key(
+        self, smart_image_field: SmartImageField, processed_text: str
+    ) -> Union[str, None]:
+        return get_thumbnail_key(
+            processed_text,
+            smart_image_field.image_width,
+            smart_image_field.image_height,
+            smart_image_field.image_extension,
+            api_provider=smart_image_field.api_provider,
+        )
+
+    def _set_generated_image(
+        self, smart_image_field: SmartImageField, generated_image: GeneratedImage
+    ) -> None:
+        previous_name = getattr(self, smart_image_field.attname).name
+        if previous_name == generated_image.name:
+            return
+
+        # Counted once the row is written, by _update_smart_references(). The first
+        # name is the one stored in the row.
+        self.__dict__.setdefault("_smart_image_references", {}).setdefault(
+            smart_image_field.name, previous_name
+        )
+        setattr(self, smart_image_field.attname, generated_image.name)
+
+    def _update_smart_references(self) -> None:
+        super()._update_smart_references()
+        previous_names = self.__dict__.get("_smart_image_references")
+        if not previous_names:
+            return
+
+        now = timezone.now()
+        for field_name, previous_name in previous_names.items():
+            field_label = f"{self._meta.label}.{field_name}"
+            name = getattr(self, self._meta.get_field(field_name).attname).name
+            if name == previous_name:
+                continue
+            if name:
+                GeneratedImage.objects.filter(field=field_label, name=name).update(
+                    references=F("references") + 1, updated_at=now
+                )
+            if previous_name:
+                GeneratedImage.objects.filter(
+                    field=field_label, name=previous_name
+                ).update(references=F("references") - 1, updated_at=now)
+        del self.__dict__["_smart_image_references"]
+
+    def _get_generated_image(
+        self, smart_image_field: SmartImageField, image_key: str
+    ) -> Union[GeneratedImage, None]:
+        generated_image = GeneratedImage.objects.filter(
+            key=image_key, field=f"{self._meta.label}.{smart_image_field.name}"
+        ).first()
+        if generated_image is None or not smart_image_field.storage.exists(
+            generated_image.name
+        ):
+            return None
+        if generated_image.references <= 0:
+            # Keeps smart_models_collect_images from deleting it before the row is written
+            GeneratedImage.objects.filter(pk=generated_image.pk).update(
+                updated_at=timezone.now()
+            )
+        return generated_image
+
+    def _reuse_generated_image(
+        self, smart_image_field: SmartImageField, image_key: str
+    ) -> bool:
+        generated_image = self._get_generated_image(smart_image_field, image_key)
+        if generated_image is None:
+            return False
+
+        self._set_generated_image(smart_image_field, generated_image)
+        return True
+
+    def _store_generated_image(
+        self, smart_image_field: SmartImageField, generated_image: Any, image_key: str
+    ) -> Union[GeneratedImage, None]:
+        if generated_image is None:
+            return None
+
+        name = smart_image_field.storage.save(
+            smart_image_field.generate_filename(
+                self, f"{image_key}.{smart_image_field.image_extension}"
+            ),
+            File(generated_image),
+        )
+        generated_image, created = GeneratedImage.objects.get_or_create(
+            key=image_key,
+            field=f"{self._meta.label}.{smart_image_field.name}",
+            defaults={"name": name},
+        )
+        if not created and generated_image.name != name:
+            # The stored file of an earlier generation was missing
+            GeneratedImage.objects.filter(pk=generated_image.pk).update(
+                name=name, updated_at=timezone.now()
+            )
+            generated_image.name = name
+        return generated_image
+
+    def _save_smart_image(
+        self,
+        smart_image_field: SmartImageField,
+        generated_image: Any,
+        image_key: str = None,
+    ) -> None:
+        if generated_image is None:
+            return
+
+        if image_key is None:
+            self.__dict__[smart_image_field.attname].save(
+                f"{str(uuid.uuid4())}.{smart_image_field.image_extension}",
+                File(generated_image),
+                save=False,
+            )
+            return
+
+        self._set_generated_image(
+            smart_image_field,
+            self._store_generated_image(smart_image_field, generated_image, image_key),
+        )
+
+    def _save_smart_image_renditions(self, smart_image_field: SmartImageField) -> None:
+        # Shared images share their renditions, only missing ones are derived, e.g.
+        # after a rendition was added to the field
+        name = getattr(self, smart_image_field.attname).name
+        if len(smart_image_field.renditions) == 0 or not name:
+            return
+
+        storage = smart_image_field.storage
+        missing_renditions = {
+            rendition: options
+            for rendition, options in smart_image_field.renditions.items()
+            if not storage.exists(smart_image_field.get_rendition_name(name, rendition))
+        }
+        if len(missing_renditions) == 0:
+            return
+
+        with storage.open(name, "rb") as f:
+            master = f.read()
+        for rendition, content in derive_renditions(
+            master, missing_renditions, smart_image_field.image_extension
+        ).items():
+            rendition_name = smart_image_field.get_rendition_name(name, rendition)
+            if not storage.exists(rendition_name):
+                storage.save(rendition_name, ContentFile(content))
+
+    def _get_image_flight_key(
+        self, smart_image_field: SmartImageField, image_key: str
+    ) -> str:
+        return make_flight_key(
+            "generate_thumbnail",
+            smart_image_field.api_provider,
+            "",
+            f"{self._meta.label}.{smart_image_field.name}",
+            image_key,
+        )
+
+    def _generate_smart_image(
+        self, smart_image_field: SmartImageField, processed_text: str, image_key: str
+    ) -> Union[GeneratedImage, None]:
+        """
+        Identical thumbnails requested concurrently, by threads of this process or by
+        other processes sharing the cache lock, are generated and stored only once
+        """
+
+        def generate() -> Union[GeneratedImage, None]:
+            return self._store_generated_image(
+                smart_image_field,
+                generate_thumbnail(
+                    processed_text,
+                    smart_image_field.image_width,
+                    smart_image_field.image_height,
+                    api_provider=smart_image_field.api_provider,
+                ),
+                image_key,
+            )
+
+        def lookup() -> Any:
+            generated_image = self._get_generated_image(smart_image_field, image_key)
+            return cache_miss() if generated_image is None else generated_image
+
+        return single_flight(
+            self._get_image_flight_key(smart_image_field, image_key), generate, lookup
+        )
+
+    async def _agenerate_smart_image(
+        self, smart_image_field: SmartImageField, processed_text: str, image_key: str
+    ) -> Union[GeneratedImage, None]:
+        async def generate() -> Union[GeneratedImage, None]:
+            generated_image = await agenerate_thumbnail(
+                processed_text,
+                smart_image_field.image_width,
+                smart_image_field.image_height,
+                api_provider=smart_image_field.api_provider,
+            )
+            return await sync_to_async(self._store_generated_image)(
+                smart_image_field, generated_image, image_key
+            )
+
+        async def lookup() -> Any:
+            generated_image = await sync_to_async(self._get_generated_image)(
+                smart_image_field, image_key
+            )
+            return cache_miss() if generated_image is None else generated_image
+
+        return await asingle_flight(
+            self._get_image_flight_key(smart_image_field, image_key), generate, lookup
+        )
+
+    @classmethod
+    def _process_smart_field_batch(
+        cls, instances: list[models.Model], field: models.Field
+    ) -> None:
+        if not isinstance(field, SmartImageField) or not field.thumbnail:
+            return super()._process_smart_field_batch(instances, field)
+
+        smart_image_field = field
+        # image key -> prompt text and the rows waiting for the image
+        pending_images = {}
+        for instance in instances:
+            processed_text = instance._get_smart_image_input(smart_image_field)
+            if processed_text is None:
+                continue
+            image_key = instance._get_smart_image_key(smart_image_field, processed_text)
+            if image_key is None:
+                instance._process_smart_field(smart_image_field)
+            elif not instance._reuse_generated_image(smart_image_field, image_key):
+                pending_images.setdefault(image_key, (processed_text, []))[1].append(
+                    instance
+                )
+
+        if len(pending_images) != 0:
+            thumbnails = generate_thumbnails(
+                [processed_text for processed_text, _ in pending_images.values()],
+                smart_image_field.image_width,
+                smart_image_field.image_height,
+                api_provider=smart_image_field.api_provider,
+            )
+            for (image_key, (_, key_instances)), thumbnail in zip(
+                pending_images.items(), thumbnails
+            ):
+                generated_image = key_instances[0]._store_generated_image(
+                    smart_image_field, thumbnail, image_key
+                )
+                if generated_image is None:
+                    continue
+                for instance in key_instances:
+                    instance._set_generated_image(smart_image_field, generated_image)
+
+        for instance in instances:
+            instance._save_smart_image_renditions(smart_image_field)
 
+    def _process_smart_field(self, field: models.Field) -> None:
+        if not isinstance(field, SmartImageField):
+            return super()._process_smart_field(field)
+
+        smart_image_field = field
+        processed_text = self._get_smart_image_input(smart_image_field)
         if processed_text is not None:
             generated_image = None
-            api_provider = smart_image_field.api_provider
+            image_key = None
             if smart_image_field.thumbnail:
+                image_key = self._get_smart_image_key(smart_image_field, processed_text)
+                if image_key is not None:
+                    if not self._reuse_generated_image(smart_image_field, image_key):
+                        generated_image = self._generate_smart_image(
+                            smart_image_field, processed_text, image_key
+                        )
+                        if generated_image is not None:
+                            self._set_generated_image(
+                                smart_image_field, generated_image
+                            )
+                    self._save_smart_image_renditions(smart_image_field)
+                    return
                 generated_image = generate_thumbnail(
                     processed_text,
                     smart_image_field.image_width,
                     smart_image_field.image_height,
-                    api_provider=api_provider,
+                    api_provider=smart_image_field.api_provider,
                 )
+            self._save_smart_image(smart_image_field, generated_image, image_key)
+            self._save_smart_image_renditions(smart_image_field)
+
+    async def _aprocess_smart_field(self, field: models.Field) -> None:
+        if not isinstance(field, SmartImageField):
+            return await super()._aprocess_smart_field(field)
 
-            if generated_image is not None:
-                self.__dict__[smart_image_field.attname].save(
-                    f"{str(uuid.uuid4())}.{smart_image_field.image_extension}",
-                    File(generated_image),
-                    save=False,
+        smart_image_field = field
+        processed_text = self._get_smart_image_input(smart_image_field)
+        if processed_text is not None:
+            generated_image = None
+            image_key = None
+            if smart_image_field.thumbnail:
+                image_key = await sync_to_async(self._get_smart_image_key)(
+                    smart_image_field, processed_text
                 )
-        return super().save(*args, **kwargs)
+                if image_key is not None:
+                    if not await sync_to_async(self._reuse_generated_image)(
+                        smart_image_field, image_key
+                    ):
+                        generated_image = await self._agenerate_smart_image(
+                            smart_image_field, processed_text, image_key
+                        )
+                        if generated_image is not None:
+                            await sync_to_async(self._set_generated_image)(
+                                smart_image_field, generated_image
+                            )
+                    await sync_to_async(self._save_smart_image_renditions)(
+                        smart_image_field
+                    )
+                    return
+                generated_image = await agenerate_thumbnail(
+                    processed_text,
+                    smart_image_field.image_width,
+                    smart_image_field.image_height,
+                    api_provider=smart_image_field.api_provider,
+                )
+            await sync_to_async(self._save_smart_image)(
+                smart_image_field, generated_image, image_key
+            )
+            await sync_to_async(self._save_smart_image_renditions)(smart_image_field)
 
 
 class AudioAIModel(BaseAIModelMixin):
@@ -162,71 +1258,148 @@ class AudioAIModel(BaseAIModelMixin):
         abstract = True
 
     def get_audio_to_text_field(self) -> Union[AudioToTextField, None]:
-        for field in self._meta.fields:
+        for field in self._get_smart_fields():
             if isinstance(field, AudioToTextField):
                 return field
 
         return None
 
-    def save(self, *args, **kwargs) -> None:
-        smart_audio_text_field = self.get_audio_to_text_field()
+    @classmethod
+    def _get_smart_field_types(cls) -> tuple:
+        return (AudioToTextField,) + super()._get_smart_field_types()
 
+    @classmethod
+    def _check_smart_field(
+        cls, field: models.Field, data_fields: list[models.Field]
+    ) -> list[checks.CheckMessage]:
+        if not isinstance(field, AudioToTextField):
+            return super()._check_smart_field(field, data_fields)
+
+        return [
+            checks.Error(
+                "Only fields of type models.FileField can be passed to 'data_fields'.",
+                obj=field,
+                id="smart_models.E004",
+            )
+            for data_field in data_fields
+            if not isinstance(data_field, models.FileField)
+        ]
+
+    def _get_smart_audio_paths(
+        self, smart_audio_text_field: AudioToTextField
+    ) -> tuple[list, list]:
         audio_paths = []
         delete_temp_idx = []
-        if (
-            smart_audio_text_field is not None
-            and len(smart_audio_text_field.data_fields) != 0
-            and (smart_audio_text_field)
-        ):
-            for i, data_field in enumerate(smart_audio_text_field.data_fields):
-                if not isinstance(data_field, str) and not (
-                    isinstance(self._get_field(data_field), models.FileField)
-                ):
-                    raise Exception(
-                        "Only fields of type models.FileField can be passed to 'data_fields'"
-                    )
-                audio_field = getattr(self, data_field)
-                # TODO: Better way to handle files
-                if isinstance(audio_field.file, uploadedfile.InMemoryUploadedFile):
-                    temp_path = os.path.join(
-                        settings.MEDIA_ROOT,
-                        str(uuid.uuid4()) + os.path.splitext(audio_field.file.name)[-1],
-                    )
-                    storage.default_storage.save(
-                        temp_path, ContentFile(audio_field.file.read())
-                    )
-                    audio_paths.append(temp_path)
-                    delete_temp_idx.append(i)
-                elif isinstance(audio_field.file, uploadedfile.TemporaryUploadedFile):
-                    audio_paths.append(audio_field.file.temporary_file_path())
-        else:
-            pass
+        for audio_field in self._get_smart_data_values(smart_audio_text_field):
+            if not audio_field:
+                continue
+            # TODO: Better way to handle files
+            if isinstance(audio_field.file, uploadedfile.InMemoryUploadedFile):
+                temp_path = os.path.join(
+                    settings.MEDIA_ROOT,
+                    str(uuid.uuid4()) + os.path.splitext(audio_field.file.name)[-1],
+                )
+                storage.default_storage.save(
+                    temp_path, ContentFile(audio_field.file.read())
+                )
+                audio_paths.append(temp_path)
+                delete_temp_idx.append(len(audio_paths) - 1)
+            elif isinstance(audio_field.file, uploadedfile.TemporaryUploadedFile):
+                audio_paths.append(audio_field.file.temporary_file_path())
+            else:
+                # Already stored file, e.g. when processed by smart_models_worker
+                try:
+                    audio_paths.append(audio_field.path)
+                except NotImplementedError:
+                    with tempfile.NamedTemporaryFile(
+                        suffix=os.path.splitext(audio_field.name)[-1], delete=False
+                    ) as temp_file:
+                        for chunk in audio_field.chunks():
+                            temp_file.write(chunk)
+                    audio_paths.append(temp_file.name)
+                    delete_temp_idx.append(len(audio_paths) - 1)
+
+        return audio_paths, delete_temp_idx
+
+    @staticmethod
+    def _join_audio_texts(generated_texts: list[str]) -> Union[str, None]:
+        generated_text = None
+        for i, _generated_text in enumerate(generated_texts):
+            if _generated_text is not None:
+                if len(generated_texts) == 1:
+                    generated_text = _generated_text
+                else:
+                    if generated_text is None:
+                        generated_text = f"Audio {i+1}: " + _generated_text
+                    else:
+                        generated_text += f"\nAudio {i+1}: " + _generated_text
+
+        return generated_text
+
+    def _process_smart_field(self, field: models.Field) -> None:
+        if not isinstance(field, AudioToTextField):
+            return super()._process_smart_field(field)
 
+        smart_audio_text_field = field
+        audio_paths, delete_temp_idx = self._get_smart_audio_paths(
+            smart_audio_text_field
+        )
         if len(audio_paths) != 0:
-            generated_text = None
+            generated_texts = []
             api_provider = smart_audio_text_field.api_provider
-            for i, audio_path in enumerate(audio_paths):
-                _generated_text = None
+            try:
+                for audio_path in audio_paths:
+                    _generated_text = None
+                    if smart_audio_text_field.transcribe:
+                        _generated_text = transcribe_audio(
+                            audio_path,
+                            api_provider=api_provider,
+                        )
+                    elif smart_audio_text_field.translate:
+                        _generated_text = translate_audio(
+                            audio_path, api_provider=api_provider
+                        )
+                    generated_texts.append(_generated_text)
+            finally:
+                for i in delete_temp_idx:
+                    os.remove(audio_paths[i])
+            self.__dict__[smart_audio_text_field.attname] = self._join_audio_texts(
+                generated_texts
+            )
+
+    async def _aprocess_smart_field(self, field: models.Field) -> None:
+        if not isinstance(field, AudioToTextField):
+            return await super()._aprocess_smart_field(field)
+
+        smart_audio_text_field = field
+        audio_paths, delete_temp_idx = await sync_to_async(self._get_smart_audio_paths)(
+            smart_audio_text_field
+        )
+        if len(audio_paths) != 0:
+            api_provider = smart_audio_text_field.api_provider
+
+            async def convert_audio(audio_path: str) -> Union[str, None]:
                 if smart_audio_text_field.transcribe:
-                    _generated_text = transcribe_audio(
-                        audio_path,
-                        api_provider=api_provider,
-                    )
-                elif smart_audio_text_field.translate:
-                    _generated_text = translate_audio(
+                    return await atranscribe_audio(
                         audio_path, api_provider=api_provider
                     )
+                elif smart_audio_text_field.translate:
+                    return await atranslate_audio(audio_path, api_provider=api_provider)
+                return None
 
-                if _generated_text is not None:
-                    if len(audio_paths) == 1:
-                        generated_text = _generated_text
-                    else:
-                        if generated_text is None:
-                            generated_text = f"Audio {i+1}: " + _generated_text
-                        else:
-                            generated_text += f"\nAudio {i+1}: " + _generated_text
-
-                if i in delete_temp_idx:
-                    os.remove(audio_path)
-            self.__dict__[smart_audio_text_field.attname] = generated_text
-        return super().save(*args, **kwargs)
+            try:
+                generated_texts = await asyncio.gather(
+                    *[convert_audio(audio_path) for audio_path in audio_paths]
+                )
+            finally:
+                for i in delete_temp_idx:
+                    os.remove(audio_paths[i])
+            self.__dict__[smart_audio_text_field.attname] = self._join_audio_texts(
+                generated_texts
+            )
+
+
+@receiver(class_prepared)
+def compile_smart_plan(sender, **kwargs) -> None:
+    if issubclass(sender, BaseAIModelMixin):
+        sender._smart_plan = sender._compile_smart_plan()
@@ -0,0 +1,32 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .apis._configs import invalidate_task_configs
+from .apis._metrics import provider_call_finished  # noqa: F401
+from .apis._metrics import result_cache_lookup  # noqa: F401
+from .apis._metrics import smart_span_finished  # noqa: F401
+from .fields import SmartImageField
+from .models import AIAPI, GeneratedImage, ImageAIModel
+
+
+@receiver(post_save, sender=AIAPI)
+@receiver(post_delete, sender=AIAPI)
+def aiapi_changed(sender, **kwargs) -> None:
+    invalidate_task_configs()
+
+
+@receiver(post_delete)
+def release_generated_images(sender, instance, **kwargs) -> None:
+    # Files are left in storage, unreferenced images are removed by
+    # `python manage.py smart_models_collect_images`
+    if not isinstance(instance, ImageAIModel):
+        return
+
+    for field in instance._meta.concrete_fields:
+        name = getattr(instance, field.attname)
+        if isinstance(field, SmartImageField) and name:
+            GeneratedImage.objects.filter(
+                field=f"{instance._meta.label}.{field.name}", name=str(name)
+            ).update(references=F("references") - 1, updated_at=timezone.now())
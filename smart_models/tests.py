@@ -1,3 +1,455 @@
-from django.test import TestCase
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import openai
+from django.core.cache import caches
+from django.db import connection, models
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import isolate_apps
+
+from .apis import _limits
+from .apis._language import (detect_language, is_target_language,
+                             normalize_language)
+from .apis._limits import (CircuitOpenError, RateLimiter, call_with_limits,
+                           get_retry_after)
+from .apis._singleflight import asingle_flight, single_flight
+from .apis._spelling import (SpellingIndex, build_spelling_index,
+                             correct_spelling)
+from .fields import SmartTextField
+from .models import TextAIModel
+
+# Counters of the rate limiters live in a process local cache without an alias
+LIMITS_SETTINGS = {
+    "rate_limiter": {"max_retries": 3, "backoff_base": 1.0, "backoff_max": 60.0}
+}
+NOW = 1_699_999_990.0  # 10 seconds into a rate limit window
+
+
+def get_counter(rate_limiter: RateLimiter, kind: str) -> int:
+    window = int(NOW // _limits.WINDOW)
+    return _limits._get_state_cache().get(
+        f"{rate_limiter.key_prefix}:{kind}:{window}", 0
+    )
+
+
+@override_settings(AI_API_SETTINGS=LIMITS_SETTINGS)
+@mock.patch("time.time", return_value=NOW)
+class RateLimiterTests(SimpleTestCase):
+    def setUp(self):
+        _limits._get_state_cache().clear()
+
+    def test_reserve_within_budget(self, _):
+        rate_limiter = RateLimiter("openai", "reserve", rpm=2, tpm=100)
+        self.assertEqual(rate_limiter.reserve(10), 0)
+        self.assertEqual(rate_limiter.reserve(10), 0)
+        self.assertEqual(get_counter(rate_limiter, "rpm"), 2)
+        self.assertEqual(get_counter(rate_limiter, "tpm"), 20)
+
+    def test_reserve_over_budget_rolls_back(self, _):
+        rate_limiter = RateLimiter("openai", "rollback", rpm=10, tpm=15)
+        self.assertEqual(rate_limiter.reserve(10), 0)
+        # The requests budget is left but the tokens budget is not
+        self.assertEqual(rate_limiter.reserve(10), _limits.WINDOW - 10)
+        self.assertEqual(get_counter(rate_limiter, "rpm"), 1)
+        self.assertEqual(get_counter(rate_limiter, "tpm"), 10)
+        self.assertEqual(rate_limiter.reserve(5), 0)
+
+    def test_reserve_call_larger_than_budget(self, _):
+        rate_limiter = RateLimiter("openai", "large", tpm=100)
+        self.assertEqual(rate_limiter.reserve(150), 0)
+        self.assertGreater(rate_limiter.reserve(1), 0)
+
+    def test_adjust(self, _):
+        rate_limiter = RateLimiter("openai", "adjust", tpm=100)
+        rate_limiter.reserve(10)
+        rate_limiter.adjust(30)
+        self.assertEqual(get_counter(rate_limiter, "tpm"), 40)
+
+
+@override_settings(AI_API_SETTINGS=LIMITS_SETTINGS)
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        _limits._get_state_cache().clear()
+        self.rate_limiter = RateLimiter(
+            "openai", "circuit", failure_threshold=2, recovery_timeout=30
+        )
+
+    def open_circuit(self):
+        self.rate_limiter.record_failure()
+        self.rate_limiter.record_failure()
+
+    def test_opens_after_threshold(self):
+        self.rate_limiter.record_failure()
+        self.assertFalse(self.rate_limiter.check_circuit())
+        self.rate_limiter.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            self.rate_limiter.check_circuit()
+
+    def test_half_open_lets_one_probe_through(self):
+        self.open_circuit()
+        with mock.patch("time.time", return_value=time.time() + 31):
+            self.assertTrue(self.rate_limiter.check_circuit())
+            with self.assertRaises(CircuitOpenError):
+                self.rate_limiter.check_circuit()
+            self.rate_limiter.record_success()
+            self.assertFalse(self.rate_limiter.check_circuit())
+
+    def test_failed_probe_reopens(self):
+        self.open_circuit()
+        later = time.time() + 31
+        with mock.patch("time.time", return_value=later):
+            self.assertTrue(self.rate_limiter.check_circuit())
+            self.rate_limiter.record_failure()
+            with self.assertRaises(CircuitOpenError):
+                self.rate_limiter.check_circuit()
+        with mock.patch("time.time", return_value=later + 31):
+            self.assertTrue(self.rate_limiter.check_circuit())
+
+
+def make_error(error_class: type, headers: dict = None) -> Exception:
+    return error_class("Try again", headers=headers)
+
+
+@override_settings(AI_API_SETTINGS=LIMITS_SETTINGS)
+@mock.patch("smart_models.apis._limits.time.sleep")
+class CallWithLimitsTests(SimpleTestCase):
+    def setUp(self):
+        _limits._get_state_cache().clear()
+        _limits._rate_limiters.clear()
+
+    def test_retries_transient_errors(self, sleep):
+        fn = mock.Mock(
+            side_effect=[
+                make_error(openai.error.ServiceUnavailableError),
+                make_error(openai.error.RateLimitError),
+                "response",
+            ]
+        )
+        self.assertEqual(call_with_limits("openai", "retry", fn), "response")
+        self.assertEqual(fn.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_raises_after_max_retries(self, sleep):
+        fn = mock.Mock(side_effect=make_error(openai.error.ServiceUnavailableError))
+        with self.assertRaises(openai.error.ServiceUnavailableError):
+            call_with_limits("openai", "max_retries", fn)
+        self.assertEqual(fn.call_count, 4)
+
+    def test_does_not_retry_other_errors(self, sleep):
+        fn = mock.Mock(side_effect=openai.error.InvalidRequestError("Bad", None))
+        with self.assertRaises(openai.error.InvalidRequestError):
+            call_with_limits("openai", "invalid", fn)
+        self.assertEqual(fn.call_count, 1)
+        sleep.assert_not_called()
+
+    def test_honours_retry_after(self, sleep):
+        fn = mock.Mock(
+            side_effect=[
+                make_error(openai.error.RateLimitError, {"retry-after": "7"}),
+                "response",
+            ]
+        )
+        self.assertEqual(call_with_limits("openai", "retry_after", fn), "response")
+        (backoff,), _ = sleep.call_args
+        # Retry-After plus half of the jittered backoff of the first attempt
+        self.assertGreaterEqual(backoff, 7)
+        self.assertLessEqual(backoff, 7.5)
+
+    def test_get_retry_after(self, _):
+        self.assertEqual(
+            get_retry_after(
+                make_error(openai.error.RateLimitError, {"Retry-After": "3"})
+            ),
+            3.0,
+        )
+        with mock.patch("time.time", return_value=1_700_000_000.0):
+            self.assertEqual(
+                get_retry_after(
+                    make_error(
+                        openai.error.RateLimitError,
+                        {"retry-after": "Tue, 14 Nov 2023 22:13:40 GMT"},
+                    )
+                ),
+                20.0,
+            )
+        self.assertIsNone(get_retry_after(make_error(openai.error.RateLimitError)))
+
+
+@override_settings(AI_API_SETTINGS={})
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_calls_share_one_call(self):
+        calls, results = [], []
+        release = threading.Event()
+
+        def fn():
+            calls.append(1)
+            release.wait(5)
+            return "result"
+
+        threads = [
+            threading.Thread(target=lambda: results.append(single_flight("shared", fn)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        # Let the followers join the flight of the leader
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["result"] * 5)
+
+    def test_errors_are_shared(self):
+        errors = []
+        release = threading.Event()
+
+        def fn():
+            release.wait(5)
+            raise ValueError("failed")
+
+        def call():
+            try:
+                single_flight("failing", fn)
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 3)
+
+    def test_sequential_calls_are_not_shared(self):
+        fn = mock.Mock(return_value="result")
+        single_flight("sequential", fn)
+        single_flight("sequential", fn)
+        self.assertEqual(fn.call_count, 2)
+
+    def test_async_calls_share_one_call(self):
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def main():
+            return await asyncio.gather(
+                *(asingle_flight("shared", fn) for _ in range(5))
+            )
+
+        self.assertEqual(asyncio.run(main()), ["result"] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_async_waiters_retry_cancelled_call(self):
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def main():
+            leader = asyncio.create_task(asingle_flight("cancelled", fn))
+            await asyncio.sleep(0)
+            waiters = [
+                asyncio.create_task(asingle_flight("cancelled", fn)) for _ in range(3)
+            ]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await asyncio.gather(*waiters)
+
+        self.assertEqual(asyncio.run(main()), ["result"] * 3)
+        self.assertEqual(len(calls), 2)
+
+
+SHARED_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "flights": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "flights",
+    },
+}
+
+
+@override_settings(
+    CACHES=SHARED_CACHES,
+    AI_API_SETTINGS={"single_flight": {"alias": "flights", "poll_interval": 0.01}},
+)
+class SharedSingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.shared_cache = caches["flights"]
+        self.shared_cache.clear()
+
+    def test_holder_reads_result_published_meanwhile(self):
+        fn = mock.Mock(return_value="called")
+        self.assertEqual(
+            single_flight("published", fn, lookup=lambda: "published"), "published"
+        )
+        fn.assert_not_called()
+
+    def test_result_is_published_without_lookup(self):
+        self.assertIsNone(single_flight("none", mock.Mock(return_value=None)))
+        # Another process waiting on the lock reads it instead of calling fn
+        fn = mock.Mock(return_value="called")
+        self.assertIsNone(single_flight("none", fn))
+        fn.assert_not_called()
+
+    def test_waits_for_lock_of_other_process(self):
+        self.shared_cache.add("smart_models:single_flight:locked", "other", 60)
+        threading.Timer(
+            0.05,
+            lambda: self.shared_cache.set(
+                "smart_models:single_flight:result:locked", ("other result",)
+            ),
+        ).start()
+        fn = mock.Mock(return_value="called")
+        self.assertEqual(single_flight("locked", fn), "other result")
+        fn.assert_not_called()
+
+
+class CorrectSpellingTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        dictionary_path = os.path.join(directory.name, "dictionary.txt")
+        with open(dictionary_path, "w", encoding="utf-8") as f:
+            f.write("the 100\nquick 50\nbrown 40\nfox 30\nend 20\nis 90\n")
+        build_spelling_index(dictionary_path, dictionary_path + ".idx")
+        cls.index = SpellingIndex(dictionary_path + ".idx")
+
+    def test_corrects_unknown_words(self):
+        self.assertEqual(
+            correct_spelling(self.index, "the quick brwon fox"),
+            ("the quick brown fox", ["brwon"], []),
+        )
+
+    def test_capitalized_words_are_suspicious(self):
+        self.assertEqual(
+            correct_spelling(self.index, "Paris is the end. Teh end"),
+            ("Paris is the end. Teh end", ["Paris", "Teh"], []),
+        )
+        self.assertEqual(
+            correct_spelling(self.index, "Teh end", ignore_capitalized=False),
+            ("The end", ["Teh"], []),
+        )
+
+
+@override_settings(AI_API_SETTINGS={})
+class LanguageDetectionTests(SimpleTestCase):
+    def test_detects_profiled_languages(self):
+        self.assertEqual(
+            detect_language(
+                "Der Ausschuss traf sich am Dienstag, um den neuen Haushalt zu "
+                "besprechen, und die meisten Mitglieder waren sich einig."
+            ),
+            "german",
+        )
+        self.assertEqual(
+            detect_language("東京は日本の首都です。とても大きな都市です。"), "japanese"
+        )
+
+    def test_does_not_detect_other_languages(self):
+        for text in (
+            # Romanian, closest to Portuguese
+            "Comitetul s-a reunit marți pentru a discuta noul buget, iar majoritatea "
+            "membrilor au fost de acord că orașul ar trebui să cheltuiască mai mulți bani.",
+            # Indonesian
+            "Komite bertemu pada hari Selasa untuk membahas anggaran baru, dan sebagian "
+            "besar anggota sepakat bahwa kota harus menghabiskan lebih banyak uang.",
+            # Ukrainian, closest to Russian
+            "Я йшов додому з роботи, коли почався дощ, тому я зайшов у маленьке кафе і "
+            "чекав, поки мине гроза.",
+        ):
+            with self.subTest(text=text):
+                self.assertIsNone(detect_language(text))
+
+    def test_normalize_language(self):
+        for language in ("French", "français", "Francais", "fr", "fr-CA"):
+            with self.subTest(language=language):
+                self.assertEqual(normalize_language(language), "french")
+        self.assertEqual(normalize_language("Русский"), "russian")
+        self.assertEqual(normalize_language("日本語"), "japanese")
+
+    def test_is_target_language(self):
+        text = (
+            "Le comité s'est réuni mardi pour discuter du nouveau budget, et la "
+            "plupart des membres ont convenu que la ville devrait dépenser davantage."
+        )
+        self.assertTrue(is_target_language(text, "Français"))
+        self.assertFalse(is_target_language(text, "english"))
+        # Catalan, closest to Spanish
+        self.assertFalse(
+            is_target_language(
+                "El comitè es va reunir dimarts per discutir el nou pressupost, i la "
+                "majoria dels membres van acordar que la ciutat hauria de gastar més.",
+                "spanish",
+            )
+        )
+
+
+class WriteSmartFieldsTests(TransactionTestCase):
+    available_apps = ["smart_models"]
+
+    def setUp(self):
+        isolated_apps = isolate_apps("smart_models")
+        isolated_apps.enable()
+        self.addCleanup(isolated_apps.disable)
+
+        class Note(TextAIModel):
+            body = models.TextField()
+            attachment = models.FileField(null=True, blank=True)
+            summary = SmartTextField(data_fields=["body"], summarize=True, null=True)
+
+            class Meta:
+                app_label = "smart_models"
+
+        self.Note = Note
+        with connection.schema_editor() as editor:
+            editor.create_model(Note)
+
+        def drop_table():
+            with connection.schema_editor() as editor:
+                editor.delete_model(Note)
+
+        self.addCleanup(drop_table)
+        patcher = mock.patch(
+            "smart_models.models.process_text_pipeline",
+            side_effect=lambda text, *args, **kwargs: f"summary of {text}",
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_writes_unchanged_row(self):
+        note = self.Note.objects.create(body="first")
+        self.assertTrue(note.run_smart_field("summary"))
+        self.assertEqual(self.Note.objects.get(pk=note.pk).summary, "summary of first")
+
+    def test_skips_row_changed_meanwhile(self):
+        note = self.Note.objects.create(body="first")
+        self.Note.objects.filter(pk=note.pk).update(body="second", summary="kept")
+        with self.assertLogs("smart_models.models", "WARNING"):
+            self.assertFalse(note.run_smart_field("summary"))
+        self.assertEqual(self.Note.objects.get(pk=note.pk).summary, "kept")
+
+    def test_skips_deleted_row(self):
+        note = self.Note.objects.create(body="first")
+        self.Note.objects.filter(pk=note.pk).delete()
+        with self.assertLogs("smart_models.models", "WARNING"):
+            self.assertFalse(note.run_smart_field("summary"))
+
+    def test_empty_file_matches_null(self):
+        note = self.Note.objects.create(body="first")
+        self.Note.objects.filter(pk=note.pk).update(attachment=None)
+        field = self.Note._meta.get_field("summary")
+        self.assertTrue(note._write_smart_fields([field], {"attachment": ""}))